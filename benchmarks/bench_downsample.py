@@ -0,0 +1,92 @@
+# benchmarks/bench_downsample.py
+"""
+比较体素栅格降采样与原先按固定间隔取点 (points[::N]) 的耗时和点密度均匀性。
+
+用法（在项目根目录下运行）:
+    python benchmarks/bench_downsample.py --voxel-size 5 --synthetic 2000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+import config
+from utils import image_utils
+from processing.stereo_matcher import StereoMatcher
+from processing.reconstructor import Reconstructor
+from processing.point_cloud import voxel_downsample, stride_downsample
+
+
+def time_call(function, repeats):
+    """返回多次运行的平均耗时（秒）和最后一次的结果。"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    return (time.perf_counter() - start) / repeats, result
+
+
+def density_spread(points, cell_size):
+    """
+    用粗网格统计每个非空格子中的点数，返回 (最大值 / 中位数)。
+    数值越接近 1，说明点在空间上分布越均匀。
+    """
+    cells = np.floor((points - points.min(axis=0)) / cell_size).astype(np.int64)
+    _, counts = np.unique(cells, axis=0, return_counts=True)
+    return float(counts.max() / np.median(counts))
+
+
+def load_test_cloud():
+    """重建随项目提供的测试图像，返回过滤后的点云。"""
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    left, right, Q = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH).rectify(left_img, right_img)
+    disparity = StereoMatcher().compute_disparity(left, right)
+    return Reconstructor().reconstruct_lazy(disparity, left, Q).filtered_cloud()
+
+
+def synthetic_cloud(count, seed=0):
+    """生成 count 个点的合成点云：几个不同距离的平面，近处的点更密集，和双目重建的分布类似。"""
+    rng = np.random.default_rng(seed)
+    depth = rng.choice([300.0, 600.0, 900.0], size=count, p=[0.6, 0.3, 0.1])
+    xy = rng.uniform(-0.5, 0.5, size=(count, 2)) * depth[:, np.newaxis]
+    points = np.column_stack([xy, depth + rng.normal(0, 2.0, count)]).astype(np.float32)
+    colors = rng.integers(0, 256, size=(count, 3), dtype=np.uint8)
+    return points, colors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark voxel-grid downsampling against stride slicing.")
+    parser.add_argument('--voxel-size', type=float, default=config.POINT_CLOUD_VOXEL_SIZE or 5.0,
+                        help="Voxel edge length in mm.")
+    parser.add_argument('--stride', type=int, default=config.POINT_CLOUD_DOWNSAMPLE_FACTOR,
+                        help="Stride used by the slicing baseline.")
+    parser.add_argument('--synthetic', type=int, default=2_000_000,
+                        help="Number of points in the synthetic cloud (0 to skip).")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs per method.")
+    args = parser.parse_args()
+
+    clouds = [("test pair", *load_test_cloud())]
+    if args.synthetic:
+        clouds.append(("synthetic", *synthetic_cloud(args.synthetic)))
+
+    print(f"\n--- Point cloud downsampling: voxel {args.voxel_size} mm vs stride {args.stride} ---")
+    print(f"{'cloud':<12}{'method':<9}{'in':>10}{'out':>10}{'ms':>10}{'spread':>9}")
+    for name, points, colors in clouds:
+        stride_time, (stride_points, _) = time_call(
+            lambda: stride_downsample(points, colors, args.stride), args.repeats)
+        voxel_time, (voxel_points, _) = time_call(
+            lambda: voxel_downsample(points, colors, args.voxel_size), args.repeats)
+        # 用 10 倍体素大小的粗网格衡量均匀性
+        cell_size = args.voxel_size * 10
+        for method, elapsed, result in (("stride", stride_time, stride_points), ("voxel", voxel_time, voxel_points)):
+            print(f"{name:<12}{method:<9}{len(points):>10}{len(result):>10}{elapsed * 1000:>10.1f}"
+                  f"{density_spread(result, cell_size):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# benchmarks/bench_frame_archive.py
+"""
+比较视差图序列的几种存储方式：每帧一个 16 位 PNG、每帧一个 .npy，以及分块压缩归档
+(utils/frame_archive.py)。报告写入吞吐量、占用空间、顺序读取和随机读取的速度。
+
+另外模拟长时间的流式运行：向同一个归档持续追加 --append-frames 帧，
+比较开头和结尾各 10% 的分块落盘 (flush) 耗时，落盘开销不应随归档长度增长。
+
+用法（在项目根目录下运行）:
+    python benchmarks/bench_frame_archive.py --frames 64 --append-frames 4096
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+import config
+from utils import image_utils
+from utils.frame_archive import DisparityArchive
+from processing.stereo_matcher import StereoMatcher
+
+
+def make_sequence(frame_count):
+    """用测试图像对生成一段视差图序列：每帧把左右图像一起平移几个像素，模拟相机缓慢移动。"""
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    left, right, Q = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH).rectify(left_img, right_img)
+    matcher = StereoMatcher()
+    height, width = left.shape[:2]
+    frames = []
+    for index in range(frame_count):
+        shift = np.float32([[1, 0, index % 8], [0, 1, index // 8 % 8]])
+        frames.append(matcher.compute_disparity(cv2.warpAffine(left, shift, (width, height)),
+                                                cv2.warpAffine(right, shift, (width, height))))
+    return frames, Q
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+class PngStore:
+    name = "png"
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path)
+
+    def write(self, frames, Q):
+        for index, frame in enumerate(frames):
+            cv2.imwrite(os.path.join(self.path, f"{index:06d}.png"), frame.view(np.uint16))
+
+    def read(self, index):
+        return cv2.imread(os.path.join(self.path, f"{index:06d}.png"), cv2.IMREAD_UNCHANGED).view(np.int16)
+
+
+class NpyStore:
+    name = "npy"
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path)
+
+    def write(self, frames, Q):
+        for index, frame in enumerate(frames):
+            np.save(os.path.join(self.path, f"{index:06d}.npy"), frame)
+
+    def read(self, index):
+        return np.load(os.path.join(self.path, f"{index:06d}.npy"))
+
+
+class ArchiveStore:
+    def __init__(self, path, codec):
+        self.path = path
+        self.codec = codec
+        self.name = f"archive/{codec}"
+        self.archive = None
+
+    def write(self, frames, Q):
+        with DisparityArchive(self.path, mode="w", codec=self.codec) as archive:
+            for index, frame in enumerate(frames):
+                archive.append(frame, index / 30.0, Q)
+        self.archive = DisparityArchive(self.path)
+
+    def read(self, index):
+        return self.archive[index]
+
+
+def measure_append(frames, Q, total, chunk_frames, path):
+    """
+    循环使用 frames 向归档追加 total 帧，每 chunk_frames 帧手动落盘一次并计时（不含压缩）。
+    :return: (每次落盘的耗时列表（秒）, 最终 index.json 的字节数)
+    """
+    flush_times = []
+    # 关闭自动落盘，只测量 flush() 本身
+    with DisparityArchive(path, mode="w", chunk_frames=total + 1) as archive:
+        for index in range(total):
+            archive.append(frames[index % len(frames)], index / 30.0, Q)
+            if (index + 1) % chunk_frames == 0:
+                start = time.perf_counter()
+                archive.flush()
+                flush_times.append(time.perf_counter() - start)
+    return flush_times, os.path.getsize(os.path.join(path, "index.json"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the disparity archive against per-frame PNG/NPY files.")
+    parser.add_argument('--frames', type=int, default=64, help="Number of disparity maps in the sequence.")
+    parser.add_argument('--append-frames', type=int, default=4096,
+                        help="Frames appended to one archive in the long streaming case (0 to skip).")
+    parser.add_argument('--chunk-frames', type=int, default=config.ARCHIVE_CHUNK_FRAMES,
+                        help="Frames per chunk in the long streaming case.")
+    args = parser.parse_args()
+
+    frames, Q = make_sequence(args.frames)
+    raw_mb = sum(frame.nbytes for frame in frames) / 1e6
+    random_order = np.random.default_rng(0).permutation(len(frames))
+
+    codecs = ["zlib"]
+    try:
+        import zstandard  # noqa: F401
+        codecs.append("zstd")
+    except ImportError:
+        print("zstandard is not installed, only the zlib archive is measured.")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = [PngStore(os.path.join(tmp, "png")), NpyStore(os.path.join(tmp, "npy"))]
+        stores += [ArchiveStore(os.path.join(tmp, f"archive_{codec}"), codec) for codec in codecs]
+        for store in stores:
+            start = time.perf_counter()
+            store.write(frames, Q)
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for index in range(len(frames)):
+                assert np.array_equal(store.read(index), frames[index])
+            sequential_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for index in random_order:
+                store.read(int(index))
+            random_time = time.perf_counter() - start
+
+            rows.append((store.name, write_time, directory_size(store.path) / 1e6, sequential_time, random_time))
+
+    count = len(frames)
+    height, width = frames[0].shape
+    print(f"\n--- Disparity storage benchmark: {count} frames of {width}x{height} CV_16S ({raw_mb:.1f} MB raw) ---")
+    print(f"{'format':<14}{'write MB/s':>11}{'size MB':>9}{'ratio':>7}{'seq fps':>9}{'random ms':>11}")
+    for name, write_time, size_mb, sequential_time, random_time in rows:
+        print(f"{name:<14}{raw_mb / write_time:>11.1f}{size_mb:>9.2f}{raw_mb / size_mb:>7.1f}"
+              f"{count / sequential_time:>9.1f}{random_time / count * 1000:>11.2f}")
+
+    if args.append_frames > 0:
+        with tempfile.TemporaryDirectory() as tmp:
+            flush_times, index_size = measure_append(frames, Q, args.append_frames, args.chunk_frames,
+                                                     os.path.join(tmp, "archive"))
+        flush_ms = np.asarray(flush_times) * 1000.0
+        tenth = max(len(flush_ms) // 10, 1)
+        print(f"\n--- Long append: {args.append_frames} frames in {len(flush_ms)} chunks of {args.chunk_frames} ---")
+        print(f"median flush ms: first 10% {np.median(flush_ms[:tenth]):.2f}, "
+              f"last 10% {np.median(flush_ms[-tenth:]):.2f}; index.json {index_size / 1e3:.1f} kB")
+
+
+if __name__ == "__main__":
+    main()
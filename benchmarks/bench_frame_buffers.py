@@ -0,0 +1,94 @@
+# benchmarks/bench_frame_buffers.py
+"""
+比较逐帧处理（校正 -> 匹配 -> 重建）时使用和不使用复用缓冲区 (utils.frame_context.FrameContext) 的
+每帧内存分配和耗时。
+
+内存由 tracemalloc 统计（NumPy 数组和 OpenCV 返回的数组都计入，OpenCV 内部的临时缓冲区不计入），
+打印预热之后每帧的分配峰值，以及 FrameContext 的稳态占用、峰值和预热之后的分配次数。
+耗时单独测量（不开启 tracemalloc）。
+
+用法（在项目根目录下运行）:
+    python benchmarks/bench_frame_buffers.py --resolutions 640x480,1280x720 --frames 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils import file_utils, image_utils, profiling
+from utils.frame_context import FrameContext, format_memory_report
+from processing.stereo_matcher import StereoMatcher
+from processing.reconstructor import Reconstructor
+from benchmarks.run_suite import load_bundled_pair, parse_resolutions
+
+
+def process_frame(preprocessor, matcher, reconstructor, left, right, context, depth_only):
+    """处理一帧；context 为 None 时每个阶段都分配新的输出数组。"""
+    if context is not None:
+        context.begin_frame()
+    left_gray, right_gray, left_color, Q = preprocessor.process(left, right, context=context)
+    disparity = matcher.compute_disparity(left_gray, right_gray, context=context)
+    if depth_only:
+        return reconstructor.reconstruct_depth(disparity, Q, context=context)
+    return reconstructor.reconstruct(disparity, left_color, Q, context=context)
+
+
+def run(rectifier, resolution, frames, mode, reconstruction_mode, depth_only):
+    """
+    交替处理不使用和使用复用缓冲区的帧（减少机器负载波动的影响），
+    返回 {False/True: (每帧耗时毫秒列表, 预热之后每帧的 tracemalloc 峰值字节列表)} 和使用的上下文。
+    """
+    left, right = load_bundled_pair(*resolution)
+    preprocessor = image_utils.StereoPreprocessor(rectifier, with_color=not depth_only, reuse_buffers=False)
+    matcher = StereoMatcher(mode=mode)
+    reconstructor = Reconstructor(mode=reconstruction_mode)
+    context = FrameContext()
+    contexts = {False: None, True: context}
+
+    def frame(use_context):
+        return process_frame(preprocessor, matcher, reconstructor, left, right, contexts[use_context], depth_only)
+
+    results = {use_context: ([], []) for use_context in contexts}
+    for use_context in contexts:
+        frame(use_context)  # 预热：映射表、查找表和缓冲区
+    for _ in range(frames):
+        for use_context, (times, _) in results.items():
+            start = time.perf_counter()
+            frame(use_context)
+            times.append((time.perf_counter() - start) * 1000.0)
+    for _ in range(min(frames, 5)):
+        for use_context, (_, peaks) in results.items():
+            with profiling.traced_allocations() as allocations:
+                frame(use_context)
+            peaks.append(allocations["peak_bytes"])
+    return results, context
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-frame allocations with and without reused buffers.")
+    parser.add_argument('--resolutions', default="640x480,1280x720", help="Comma separated WxH list.")
+    parser.add_argument('--frames', type=int, default=20, help="Timed frames per configuration.")
+    parser.add_argument('--matcher-mode', default="full", help="Matcher mode (full, pyramid or tiled).")
+    parser.add_argument('--reconstruction-mode', default=None, help="reproject or lut (default from config.py).")
+    parser.add_argument('--depth-only', action='store_true', help="Reconstruct only the depth map.")
+    args = parser.parse_args()
+
+    rectifier = image_utils.Rectifier(stereo_params=file_utils.load_stereo_params(file_utils.find_stereo_params()),
+                                      persist=False)
+    print(f"{'resolution':<12}{'buffers':>9}{'median ms':>11}{'alloc MB/frame':>16}")
+    for resolution in parse_resolutions(args.resolutions):
+        label = f"{resolution[0]}x{resolution[1]}"
+        results, context = run(rectifier, resolution, args.frames, args.matcher_mode, args.reconstruction_mode,
+                                args.depth_only)
+        for use_context, (times, peaks) in results.items():
+            print(f"{label:<12}{'reused' if use_context else 'new':>9}{np.median(times):>11.2f}"
+                  f"{np.median(peaks) / 2**20:>16.2f}")
+        print(f"{'':<12}{format_memory_report(context.memory_report())}")
+
+
+if __name__ == "__main__":
+    main()
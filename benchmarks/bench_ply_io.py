@@ -0,0 +1,76 @@
+# benchmarks/bench_ply_io.py
+"""
+比较原生二进制 PLY 读写 (utils/ply_io.py) 与 Open3D 的耗时。未安装 Open3D 时只测试原生实现。
+
+用法（在项目根目录下运行）:
+    python benchmarks/bench_ply_io.py --points 5000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from utils import ply_io
+
+
+def time_call(function, repeats):
+    """返回多次运行的平均耗时（秒）。"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+def open3d_write(o3d, path, points, colors):
+    """即原先 file_utils.save_point_cloud 的实现。"""
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points)
+    pcd.colors = o3d.utility.Vector3dVector(colors / 255.0)
+    o3d.io.write_point_cloud(path, pcd)
+
+
+def native_read(path):
+    points, colors = ply_io.read_ply(path)
+    # memmap 是惰性的，这里求和以保证数据真正被读入
+    return float(points.sum()) + int(colors.sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the native binary PLY writer/reader against Open3D.")
+    parser.add_argument('--points', type=int, default=5_000_000, help="Number of points in the test cloud.")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs per method.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    points = rng.normal(0, 500, size=(args.points, 3)).astype(np.float32)
+    colors = rng.integers(0, 256, size=(args.points, 3), dtype=np.uint8)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        native_path = os.path.join(tmp, "native.ply")
+        rows.append(("native write", time_call(lambda: ply_io.write_ply(native_path, points, colors), args.repeats)))
+        rows.append(("native read", time_call(lambda: native_read(native_path), args.repeats)))
+        size = os.path.getsize(native_path)
+
+        try:
+            import open3d as o3d
+        except ImportError:
+            o3d = None
+            print("Open3D is not installed, only the native implementation is measured.")
+        if o3d is not None:
+            o3d_path = os.path.join(tmp, "open3d.ply")
+            rows.append(("open3d write", time_call(lambda: open3d_write(o3d, o3d_path, points, colors), args.repeats)))
+            rows.append(("open3d read", time_call(lambda: o3d.io.read_point_cloud(o3d_path), args.repeats)))
+
+    print(f"\n--- PLY I/O benchmark: {args.points} points, native file {size / 1e6:.1f} MB ---")
+    for name, elapsed in rows:
+        print(f"{name:<14}{elapsed * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
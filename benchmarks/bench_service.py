@@ -0,0 +1,162 @@
+# benchmarks/bench_service.py
+"""
+本地双目处理服务 (python main.py serve, processing/stereo_service.py) 的负载测试客户端。
+
+用 --concurrency 条 keep-alive 连接并发发送 --requests 个请求（随项目提供的测试图像对），
+统计吞吐量、端到端延迟的分位数（p50/p90/p99/max）、被拒绝 (503) 和失败的请求数，
+以及服务端报告的平均排队和处理时间 (X-Queue-Ms / X-Process-Ms)。
+被拒绝的请求按 Retry-After 之前的短暂退避后重试，不计入延迟统计。
+
+用法（在项目根目录下运行）:
+    python main.py serve --port 8765 &
+    python benchmarks/bench_service.py --port 8765 --requests 200 --concurrency 8
+    # 或者由脚本启动和停止服务（使用空闲端口）:
+    python benchmarks/bench_service.py --spawn --workers 4 --requests 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import config
+from processing.stereo_service import encode_compressed_pair, encode_raw_pair, send_request
+from benchmarks.run_suite import load_bundled_pair, parse_resolutions
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 被拒绝后重试之前的等待时间（秒），比 Retry-After 短，避免负载测试大部分时间在空等
+RETRY_DELAY = 0.05
+
+
+async def open_connection(host, port, unix_path):
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def client(args, headers, body, counter, results):
+    """一条连接：不断领取请求编号并发送，直到发送完 --requests 个请求。"""
+    reader, writer = await open_connection(args.host, args.port, args.unix)
+    try:
+        while counter["next"] < args.requests:
+            counter["next"] += 1
+            while True:
+                start = time.perf_counter()
+                status, response_headers, _ = await send_request(reader, writer, "POST", f"/{args.output}",
+                                                                 headers, body)
+                if status != 503:
+                    break
+                results["rejected"] += 1
+                await asyncio.sleep(RETRY_DELAY)
+            if status != 200:
+                results["failed"] += 1
+                continue
+            results["latency"].append(time.perf_counter() - start)
+            results["queue"].append(float(response_headers.get("x-queue-ms", 0.0)))
+            results["process"].append(float(response_headers.get("x-process-ms", 0.0)))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run_load(args, headers, body):
+    results = {"rejected": 0, "failed": 0, "latency": [], "queue": [], "process": []}
+    # 预热一个请求：服务端线程的初始化和第一帧的缓冲区分配不计入统计
+    reader, writer = await open_connection(args.host, args.port, args.unix)
+    status, _, payload = await send_request(reader, writer, "POST", f"/{args.output}", headers, body)
+    writer.close()
+    await writer.wait_closed()
+    if status != 200:
+        raise RuntimeError(f"Warm-up request failed with HTTP {status}: {payload.decode(errors='replace')}")
+
+    counter = {"next": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args, headers, body, counter, results) for _ in range(args.concurrency)))
+    results["elapsed"] = time.perf_counter() - start
+    return results
+
+
+def print_results(args, body, results):
+    latency_ms = np.asarray(results["latency"]) * 1000.0
+    served = len(latency_ms)
+    print(f"\n--- Stereo Service Load Test ({args.output}, {len(body) / 2**20:.2f} MB per request, "
+          f"concurrency {args.concurrency}) ---")
+    print(f"Requests: {served} ok, {results['rejected']} rejected (503, retried), {results['failed']} failed")
+    if not served:
+        return
+    print(f"Throughput: {served / results['elapsed']:.2f} requests/s over {results['elapsed']:.2f} s")
+    p50, p90, p99 = np.percentile(latency_ms, [50, 90, 99])
+    print(f"Latency (ms): p50 {p50:.1f}  p90 {p90:.1f}  p99 {p99:.1f}  max {latency_ms.max():.1f}")
+    print(f"Server side (mean ms): queue {np.mean(results['queue']):.1f}  process {np.mean(results['process']):.1f}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((config.SERVICE_HOST, 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(args):
+    """在子进程中启动 main.py serve，等待端口可以连接。"""
+    command = [sys.executable, os.path.join(PROJECT_ROOT, "main.py"), "-q", "serve",
+               "--host", args.host, "--port", str(args.port)]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    if args.matcher_mode:
+        command += ["--matcher-mode", args.matcher_mode]
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT)
+    deadline = time.monotonic() + 60.0
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The stereo service exited with code {process.returncode}.")
+        try:
+            socket.create_connection((args.host, args.port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("The stereo service did not start within 60 s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the local stereo processing service.")
+    parser.add_argument('--host', default=config.SERVICE_HOST, help="Service address.")
+    parser.add_argument('--port', type=int, default=config.SERVICE_PORT, help="Service TCP port.")
+    parser.add_argument('--unix', default=None, metavar='PATH', help="Connect to a Unix domain socket instead.")
+    parser.add_argument('--requests', type=int, default=100, help="Number of requests to send.")
+    parser.add_argument('--concurrency', type=int, default=4, help="Number of concurrent connections.")
+    parser.add_argument('--resolution', default="640x480", help="WxH to resize the bundled test pair to.")
+    parser.add_argument('--output', choices=("disparity", "depth"), default="disparity", help="Requested result.")
+    parser.add_argument('--encoded', action='store_true', help="Send PNG-encoded images instead of raw BGR.")
+    parser.add_argument('--spawn', action='store_true',
+                        help="Start 'main.py serve' on a free port for the test and stop it afterwards.")
+    parser.add_argument('--workers', type=int, default=None, help="[--spawn] Service worker threads.")
+    parser.add_argument('--matcher-mode', default=None, help="[--spawn] Service matcher mode.")
+    args = parser.parse_args()
+
+    left, right = load_bundled_pair(*parse_resolutions(args.resolution)[0])
+    headers, body = (encode_compressed_pair if args.encoded else encode_raw_pair)(left, right)
+
+    process = None
+    if args.spawn:
+        args.unix = None
+        args.port = free_port()
+        process = spawn_server(args)
+    try:
+        results = asyncio.run(run_load(args, headers, body))
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGINT)
+            process.wait(timeout=30)
+    print_results(args, body, results)
+
+
+if __name__ == "__main__":
+    main()
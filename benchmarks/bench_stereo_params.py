@@ -0,0 +1,99 @@
+# benchmarks/bench_stereo_params.py
+"""
+比较 YAML 与二进制标定文件 (utils/file_utils.py) 的加载耗时。
+
+用随项目提供的标定参数（补上 --image-size 以便二进制文件带上预先计算的校正结果）在临时目录中
+生成两种文件，分别测量两个阶段:
+- load: find_stereo_params + load_stereo_params（二进制文件还要校验预先计算的校正结果）；
+- ready: load 之后得到校正所需的 R1/R2/P1/P2/Q/ROI，YAML 需要再调用一次 stereoRectify，
+         即 Rectifier 在生成映射表之前实际付出的代价。
+cold 是新启动的 Python 进程中第一次执行的耗时（不含模块导入，即每个 worker 进程启动时的代价），
+warm 是同一进程中重复执行的中位数。
+
+用法（在项目根目录下运行）:
+    python benchmarks/bench_stereo_params.py --repeats 200 --cold-runs 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import config
+from utils import file_utils
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 在子进程中测量第一次加载：导入完成后才开始计时
+COLD_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+from utils import file_utils
+start = time.perf_counter()
+params = file_utils.load_stereo_params(file_utils.find_stereo_params({yaml!r}, {binary!r}))
+loaded = time.perf_counter()
+if "R1" not in params:
+    file_utils.compute_rectification(params, params["image_size"], {alpha!r})
+print((loaded - start) * 1000.0, (time.perf_counter() - start) * 1000.0)
+"""
+
+
+def load_ready(yaml_path, binary_path):
+    """执行一次 find + load + (必要时) stereoRectify，返回两个阶段结束时的累计耗时（秒）。"""
+    start = time.perf_counter()
+    params = file_utils.load_stereo_params(file_utils.find_stereo_params(yaml_path, binary_path))
+    loaded = time.perf_counter()
+    if "R1" not in params:
+        file_utils.compute_rectification(params, params["image_size"], config.RECTIFY_ALPHA)
+    return loaded - start, time.perf_counter() - start
+
+
+def warm_ms(yaml_path, binary_path, repeats):
+    """同一进程中 (load, ready) 的中位耗时（毫秒）。"""
+    timings = [load_ready(yaml_path, binary_path) for _ in range(repeats)]
+    return np.median(timings, axis=0) * 1000.0
+
+
+def cold_ms(yaml_path, binary_path, runs):
+    """新进程中第一次 (load, ready) 的中位耗时（毫秒）。"""
+    script = COLD_SCRIPT.format(root=PROJECT_ROOT, yaml=yaml_path, binary=binary_path, alpha=config.RECTIFY_ALPHA)
+    timings = [[float(v) for v in subprocess.run([sys.executable, "-c", script], check=True, capture_output=True,
+                                                 text=True).stdout.split()] for _ in range(runs)]
+    return np.median(timings, axis=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading YAML vs binary stereo parameter files.")
+    parser.add_argument('--params', default=config.CAMERA_PARAMS_PATH, help="Source calibration file.")
+    parser.add_argument('--image-size', default="640x480", help="WxH recorded for precomputed rectification.")
+    parser.add_argument('--repeats', type=int, default=200, help="Warm loads per format.")
+    parser.add_argument('--cold-runs', type=int, default=10, help="Fresh processes per format.")
+    args = parser.parse_args()
+
+    params = file_utils.load_stereo_params(args.params)
+    params["image_size"] = tuple(int(v) for v in args.image_size.lower().split("x"))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yaml_path = os.path.join(tmp_dir, "stereo_params.yml")
+        binary_path = os.path.join(tmp_dir, "stereo_params.bin")
+        missing_path = os.path.join(tmp_dir, "missing.bin")
+        file_utils.save_stereo_params(yaml_path, params)
+        file_utils.save_stereo_params(binary_path, params, source_path=yaml_path)
+        # YAML: 不存在二进制文件；binary: 二进制文件与 YAML 一致（含对 YAML 的哈希校验）
+        cases = {"yaml": (yaml_path, missing_path), "binary": (yaml_path, binary_path)}
+        assert file_utils.find_stereo_params(*cases["binary"]) == binary_path
+
+        print(f"\n--- Stereo Parameter Loading ({os.path.getsize(yaml_path)} B YAML, "
+              f"{os.path.getsize(binary_path)} B binary) ---")
+        print(f"{'format':<8} {'cold load':>10} {'cold ready':>11} {'warm load':>10} {'warm ready':>11}  (ms)")
+        for name, paths in cases.items():
+            cold, warm = cold_ms(*paths, args.cold_runs), warm_ms(*paths, args.repeats)
+            print(f"{name:<8} {cold[0]:>10.3f} {cold[1]:>11.3f} {warm[0]:>10.3f} {warm[1]:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_tiled_matcher.py
+"""
+比较 "tiled" 多线程分带匹配在不同线程数下的吞吐量，以及与整图 SGBM 结果的差异。
+
+用法（在项目根目录下运行）:
+    python benchmarks/bench_tiled_matcher.py --scale 2 --max-workers 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+import config
+from utils import image_utils
+from processing.stereo_matcher import StereoMatcher, compare_disparity_maps
+
+
+def time_matcher(matcher, left, right, repeats):
+    """返回多次运行的平均耗时（秒）和最后一次的视差图。"""
+    matcher.compute_disparity(left, right)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeats):
+        disparity = matcher.compute_disparity(left, right)
+    return (time.perf_counter() - start) / repeats, disparity
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tiled SGBM throughput against the number of worker threads.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Upscale the bundled test pair by this factor.")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1, help="Largest thread count to test.")
+    parser.add_argument('--overlap', type=int, default=None, help="Rows of overlap per band (default from config.py).")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs per configuration.")
+    args = parser.parse_args()
+
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH)
+    left, right, _ = rectifier.rectify(left_img, right_img)
+    if args.scale != 1.0:
+        left = cv2.resize(left, None, fx=args.scale, fy=args.scale, interpolation=cv2.INTER_LINEAR)
+        right = cv2.resize(right, None, fx=args.scale, fy=args.scale, interpolation=cv2.INTER_LINEAR)
+
+    full_time, full = time_matcher(StereoMatcher(mode="full"), left, right, args.repeats)
+
+    rows = []
+    for workers in range(1, args.max_workers + 1):
+        matcher = StereoMatcher(mode="tiled", workers=workers, band_count=workers, band_overlap=args.overlap)
+        tiled_time, tiled = time_matcher(matcher, left, right, args.repeats)
+        matcher.close()
+        report = compare_disparity_maps(full, tiled, config.SGBM_MIN_DISPARITY)
+        rows.append((workers, tiled_time, report["bad_pixel_rate"], report["mean_abs_diff_px"]))
+
+    height, width = left.shape[:2]
+    print(f"\n--- Tiled SGBM benchmark: {width}x{height}, {config.SGBM_NUM_DISPARITIES} disparities, "
+          f"{os.cpu_count()} CPU cores ---")
+    print(f"full frame: {full_time * 1000:.1f} ms ({1 / full_time:.2f} FPS)")
+    print(f"{'workers':>8}{'ms/frame':>11}{'FPS':>8}{'speedup':>9}{'bad >1px':>10}{'mean |d|':>10}")
+    for workers, tiled_time, bad_rate, mean_diff in rows:
+        print(f"{workers:>8}{tiled_time * 1000:>11.1f}{1 / tiled_time:>8.2f}{full_time / tiled_time:>9.2f}"
+              f"{bad_rate:>10.2%}{mean_diff:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/eval_matcher.py
+"""
+在带真值视差的合成场景上评估匹配器配置的精度（坏点率、EPE）和速度，用于调整 config.SGBM_* 等参数。
+
+默认按 output/ 中的标定参数把合成场景渲染成原始相机图像，评估时先校正再匹配，与实际使用流程一致；
+加 --rectified 时直接使用校正后的合成图像。--set 可以重复使用，给出的多个取值会组合成参数扫描。
+
+用法（在项目根目录下运行）:
+    python benchmarks/eval_matcher.py --backends sgbm,bm --modes full,pyramid
+    python benchmarks/eval_matcher.py --set SGBM_BLOCK_SIZE=3,5,7 --set SGBM_UNIQUENESS_RATIO=5,10
+"""
+import argparse
+import ast
+import itertools
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from utils import file_utils
+from processing.stereo_matcher import StereoMatcher
+from processing.matcher_evaluation import make_scenes, evaluate_matcher, config_overrides
+
+
+def parse_override(text):
+    """把 "NAME=V1,V2" 解析为 (NAME, [V1, V2])，取值按 Python 字面量解析，解析失败时作为字符串。"""
+    name, _, values = text.partition("=")
+    if not name or not values:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUE[,VALUE...], got '{text}'")
+    try:
+        parsed = ast.literal_eval(f"[{values}]")
+    except (ValueError, SyntaxError):
+        parsed = values.split(",")
+    return name.strip(), parsed
+
+
+def sweep(overrides):
+    """按 --set 的取值生成所有参数组合。只修改块大小时，P1/P2 按 config.py 中的公式同步更新。"""
+    names = [name for name, _ in overrides]
+    for values in itertools.product(*(values for _, values in overrides)):
+        combination = dict(zip(names, values))
+        if "SGBM_BLOCK_SIZE" in combination:
+            block_size = combination["SGBM_BLOCK_SIZE"]
+            combination.setdefault("SGBM_P1", 8 * 3 * block_size ** 2)
+            combination.setdefault("SGBM_P2", 32 * 3 * block_size ** 2)
+        yield combination
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate matcher accuracy and speed on synthetic ground truth.")
+    parser.add_argument('--resolution', default="640x480", help="Scene size WxH.")
+    parser.add_argument('--scenes', type=int, default=3, help="Number of random scenes.")
+    parser.add_argument('--num-disparities', type=int, default=None,
+                        help=f"Disparity search range (default from config.py: {config.SGBM_NUM_DISPARITIES}).")
+    parser.add_argument('--backends', default=config.MATCHER_BACKEND, help="Comma separated matcher backends.")
+    parser.add_argument('--modes', default="full", help="Comma separated matcher modes (full, pyramid, tiled).")
+    parser.add_argument('--set', dest='overrides', action='append', type=parse_override, default=[],
+                        metavar='NAME=V1[,V2...]', help="Override a config.py parameter; several values form a sweep.")
+    parser.add_argument('--rectified', action='store_true',
+                        help="Feed rectified synthetic pairs directly instead of rendering through the calibration.")
+    parser.add_argument('--repeats', type=int, default=2, help="Timed runs per scene (the fastest is kept).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the first scene.")
+    parser.add_argument('--output', default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args()
+
+    image_size = tuple(int(v) for v in args.resolution.lower().split("x"))
+    stereo_params = None
+    if not args.rectified:
+        stereo_params = file_utils.load_stereo_params(file_utils.find_stereo_params())
+    num_disparities = args.num_disparities or config.SGBM_NUM_DISPARITIES
+    scenes = make_scenes(args.scenes, image_size, num_disparities, stereo_params=stereo_params, seed=args.seed)
+
+    print(f"\n--- Matcher evaluation: {args.scenes} scene(s) at {args.resolution}, {num_disparities} disparities, "
+          f"{'rectified input' if args.rectified else 'rendered through calibration'} ---")
+    print(f"{'configuration':<52}{'density':>9}{'EPE px':>8}{'bad 1':>8}{'bad 2':>8}{'match ms':>10}{'FPS':>7}")
+    results = []
+    for backend in args.backends.split(","):
+        for mode in args.modes.split(","):
+            for combination in sweep(args.overrides):
+                with config_overrides(**combination):
+                    matcher = StereoMatcher(mode=mode, backend=backend, num_disparities=num_disparities)
+                    summary = evaluate_matcher(matcher, scenes, stereo_params, repeats=args.repeats)
+                    matcher.close()
+                label = " ".join([f"{backend}/{mode}"] + [f"{name}={value}" for name, value in combination.items()
+                                                          if name not in ("SGBM_P1", "SGBM_P2")])
+                results.append({"backend": backend, "mode": mode, "overrides": combination, **summary})
+                print(f"{label:<52}{summary['density']:>9.1%}{summary['epe_px']:>8.3f}{summary['bad_1']:>8.1%}"
+                      f"{summary['bad_2']:>8.1%}{summary['match_ms']:>10.1f}{1000.0 / summary['match_ms']:>7.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"resolution": args.resolution, "num_disparities": num_disparities,
+                       "rectified": args.rectified, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
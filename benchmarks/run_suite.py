@@ -0,0 +1,237 @@
+# benchmarks/run_suite.py
+"""
+可复现的性能基准套件：校正（包括先转灰度再校正的融合预处理）、立体匹配、三维重建（包括复用输出缓冲区的重建）、
+点云降采样和点云保存。
+
+输入数据完全离线生成：随项目提供的 data/test_images 测试图像对（缩放到各个分辨率），
+以及 utils/synthetic_stereo.py 生成的合成校正图像对（固定随机种子）。
+结果保存为 JSON（包含 git 提交、Python/NumPy/OpenCV 版本和 CPU 信息），
+可以用 --compare 与另一次运行的结果逐项比较，发现提交之间的性能回退。
+
+用法（在项目根目录下运行）:
+    python benchmarks/run_suite.py --output output/benchmarks/baseline.json
+    python benchmarks/run_suite.py --quick --compare output/benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+import config
+from utils import file_utils, image_utils
+from utils.frame_context import FrameContext
+from utils.synthetic_stereo import make_rectified_pair
+from processing.stereo_matcher import StereoMatcher
+from processing.reconstructor import Reconstructor
+from processing.point_cloud import voxel_downsample, stride_downsample
+
+DEFAULT_RESOLUTIONS = "640x480,1280x720,1920x1080"
+QUICK_RESOLUTIONS = "640x480"
+DEFAULT_DISPARITIES = "64,128"
+QUICK_DISPARITIES = "64"
+
+
+def measure(function, repeats, warmup=1):
+    """运行 warmup 次预热后再计时 repeats 次，返回每次耗时（毫秒）的统计和最后一次的结果。"""
+    for _ in range(warmup):
+        result = function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000.0)
+    times = np.asarray(times)
+    stats = {"repeats": repeats, "min_ms": float(times.min()), "median_ms": float(np.median(times)),
+             "mean_ms": float(times.mean()), "max_ms": float(times.max())}
+    return stats, result
+
+
+def environment_info():
+    """记录运行环境，比较不同机器上的结果时作为参考。"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=config.PROJECT_ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(),
+    }
+
+
+def parse_resolutions(text):
+    return [tuple(int(v) for v in item.lower().split("x")) for item in text.split(",") if item]
+
+
+def load_bundled_pair(width, height):
+    """读取随项目提供的测试图像对，并缩放到指定分辨率。"""
+    left = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    if left is None or right is None:
+        raise FileNotFoundError("Could not load the bundled test images in data/test_images/.")
+    if left.shape[1::-1] != (width, height):
+        left = cv2.resize(left, (width, height), interpolation=cv2.INTER_LINEAR)
+        right = cv2.resize(right, (width, height), interpolation=cv2.INTER_LINEAR)
+    return left, right
+
+
+def run_suite(resolutions, disparities, backends, repeats, output_dir):
+    """运行全部基准，返回结果列表。每一项为 {"name", "params", 以及 measure 给出的统计}。"""
+    results = []
+
+    def record(name, params, stats):
+        results.append({"name": name, "params": params, **stats})
+        label = ", ".join(f"{key}={value}" for key, value in params.items())
+        print(f"  {name:<18}{label:<64}{stats['median_ms']:>10.2f} ms (min {stats['min_ms']:.2f})")
+
+    stereo_params = file_utils.load_stereo_params(file_utils.find_stereo_params())
+    rectifier = image_utils.Rectifier(stereo_params=stereo_params, persist=False)
+
+    for width, height in resolutions:
+        resolution = f"{width}x{height}"
+        print(f"\n--- {resolution} ---")
+
+        # 校正：真实图像，映射表只计算一次（预热时）
+        left_raw, right_raw = load_bundled_pair(width, height)
+        stats, (left_bundled, right_bundled, Q) = measure(lambda: rectifier.rectify(left_raw, right_raw), repeats)
+        record("rectify", {"resolution": resolution, "source": "bundled"}, stats)
+        for with_color in (False, True):
+            preprocessor = image_utils.StereoPreprocessor(rectifier, with_color=with_color)
+            stats, _ = measure(lambda: preprocessor.process(left_raw, right_raw), repeats)
+            record("preprocess", {"resolution": resolution, "source": "bundled", "color": with_color}, stats)
+
+        for num_disparities in disparities:
+            pair = make_rectified_pair(width, height, num_disparities=num_disparities, seed=0)
+            for backend in backends:
+                matcher = StereoMatcher(mode="full", backend=backend, num_disparities=num_disparities)
+                params = {"resolution": resolution, "num_disparities": num_disparities, "backend": backend}
+                stats, _ = measure(lambda: matcher.compute_disparity(pair.left, pair.right), repeats)
+                record("match", {**params, "source": "synthetic"}, stats)
+                stats, _ = measure(lambda: matcher.compute_disparity(left_bundled, right_bundled), repeats)
+                record("match", {**params, "source": "bundled"}, stats)
+
+        # 重建和点云处理使用真实图像的视差图，点的空间分布与实际使用时一致
+        disparity = StereoMatcher(mode="full").compute_disparity(left_bundled, right_bundled)
+        for mode in Reconstructor.MODES:
+            reconstructor = Reconstructor(mode=mode)
+            stats, _ = measure(lambda: reconstructor.reconstruct(disparity, left_bundled, Q), repeats)
+            record("reconstruct", {"resolution": resolution, "mode": mode}, stats)
+            # 输出写入复用的缓冲区（预热时分配），见 utils/frame_context.py
+            context = FrameContext()
+            stats, _ = measure(lambda: reconstructor.reconstruct(disparity, left_bundled, Q, context=context), repeats)
+            record("reconstruct", {"resolution": resolution, "mode": mode, "buffers": "reused"}, stats)
+            stats, _ = measure(lambda: reconstructor.reconstruct_depth(disparity, Q), repeats)
+            record("reconstruct_depth", {"resolution": resolution, "mode": mode}, stats)
+
+        points, colors = Reconstructor().reconstruct_lazy(disparity, left_bundled, Q).filtered_cloud()
+        cloud = {"resolution": resolution, "points": int(len(points))}
+        stats, _ = measure(lambda: voxel_downsample(points, colors, 5.0), repeats)
+        record("voxel_downsample", {**cloud, "voxel_size": 5.0}, stats)
+        stats, _ = measure(lambda: stride_downsample(points, colors, config.POINT_CLOUD_DOWNSAMPLE_FACTOR), repeats)
+        record("stride_downsample", {**cloud, "stride": config.POINT_CLOUD_DOWNSAMPLE_FACTOR}, stats)
+
+        ply_path = os.path.join(output_dir, "bench_cloud.ply")
+        stats, _ = measure(lambda: file_utils.save_point_cloud(ply_path, points, colors), repeats)
+        record("save_point_cloud", cloud, stats)
+    return results
+
+
+def compare(results, baseline, threshold, metric="min_ms", noise_floor_ms=1.0):
+    """
+    按 (name, params) 把本次结果与基准结果逐项比较，打印耗时之比。
+    默认比较最短耗时，它受机器上其他负载的影响比中位数小；两次耗时都低于 noise_floor_ms 的项只打印不判断。
+    返回比基准慢超过 threshold（相对值）的项数。
+    """
+    key = lambda item: (item["name"], json.dumps(item["params"], sort_keys=True))
+    previous = {key(item): item for item in baseline["results"]}
+    print(f"\n--- Comparison with {baseline['environment'].get('commit') or 'baseline'} "
+          f"(regression threshold {threshold:.0%}) ---")
+    print(f"{'benchmark':<64}{'base ms':>10}{'new ms':>10}{'ratio':>8}  ({metric})")
+    regressions = 0
+    for item in results:
+        old = previous.get(key(item))
+        if old is None:
+            continue
+        ratio = item[metric] / old[metric] if old[metric] > 0 else float("inf")
+        flag = ""
+        if max(item[metric], old[metric]) < noise_floor_ms:
+            flag = "  (below noise floor)"
+        elif ratio > 1.0 + threshold:
+            flag, regressions = "  REGRESSION", regressions + 1
+        elif ratio < 1.0 - threshold:
+            flag = "  faster"
+        label = item["name"] + " " + ",".join(str(value) for value in item["params"].values())
+        print(f"{label:<64}{old[metric]:>10.2f}{item[metric]:>10.2f}{ratio:>8.2f}{flag}")
+    print(f"{regressions} regression(s) found.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and store the results as JSON.")
+    parser.add_argument('--output', default=None,
+                        help="Result file (default: output/benchmarks/bench_<commit>.json).")
+    parser.add_argument('--compare', default=None, metavar='BASELINE',
+                        help="Compare against a previous result file and report regressions.")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative slowdown of the median time reported as a regression.")
+    parser.add_argument('--metric', choices=("min", "median"), default="min",
+                        help="Statistic compared by --compare. The minimum is less sensitive to background load.")
+    parser.add_argument('--noise-floor', type=float, default=1.0,
+                        help="Benchmarks faster than this (ms) in both runs are not reported as regressions.")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="Exit with status 1 when --compare finds a regression.")
+    parser.add_argument('--quick', action='store_true',
+                        help=f"Only run {QUICK_RESOLUTIONS} with {QUICK_DISPARITIES} disparities.")
+    parser.add_argument('--resolutions', default=None, help=f"Comma separated WxH list (default {DEFAULT_RESOLUTIONS}).")
+    parser.add_argument('--disparities', default=None,
+                        help=f"Comma separated disparity ranges for matching (default {DEFAULT_DISPARITIES}).")
+    parser.add_argument('--backends', default="sgbm,bm", help="Comma separated matcher backends.")
+    parser.add_argument('--repeats', type=int, default=5, help="Timed runs per benchmark.")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Fix the number of OpenCV threads (cv2.setNumThreads) for comparable results.")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+    resolutions = parse_resolutions(args.resolutions or (QUICK_RESOLUTIONS if args.quick else DEFAULT_RESOLUTIONS))
+    disparities = [int(v) for v in (args.disparities or (QUICK_DISPARITIES if args.quick else DEFAULT_DISPARITIES))
+                   .split(",")]
+    backends = [backend for backend in args.backends.split(",") if backend]
+
+    environment = environment_info()
+    print(f"Benchmark suite at commit {environment['commit']} "
+          f"(OpenCV {environment['opencv']}, {environment['opencv_threads']} threads, {args.repeats} repeats)")
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        results = run_suite(resolutions, disparities, backends, args.repeats, scratch_dir)
+
+    output = args.output or os.path.join(config.OUTPUT_DIR, "benchmarks", f"bench_{environment['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment, "settings": vars(args), "results": results}, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold, f"{args.metric}_ms", args.noise_floor)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
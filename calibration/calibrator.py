@@ -1,16 +1,35 @@
-import glob
 import config
+import logging
 import os
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import numpy as np
-from visualization import visualizer
-from utils import file_utils
+from utils import file_utils, profiling
+from calibration.corner_cache import CornerCache
+
+logger = logging.getLogger(__name__)
 
 
 class StereoCalibrator:
-    def __init__(self, chessboard_size: tuple, square_size: float):
-        self.chessboard_size = chessboard_size
-        self.square_size = square_size
+    def __init__(self, chessboard_size: tuple = None, square_size: float = None, workers: int = None,
+                 use_cache: bool = None, cache_dir: str = None):
+        """
+        :param chessboard_size: 棋盘格内角点数量，默认使用 config.CHESSBOARD_SIZE。
+        :param square_size: 棋盘格边长（毫米），默认使用 config.SQUARE_SIZE_MM。
+        :param workers: 角点检测的进程数，默认使用 config.CALIBRATION_WORKERS（None 表示 CPU 核数）。
+        :param use_cache: 是否使用角点检测的磁盘缓存，默认使用 config.CORNER_CACHE_ENABLED。
+        :param cache_dir: 角点缓存目录，默认使用 config.CORNER_CACHE_DIR。
+        """
+        self.chessboard_size = tuple(chessboard_size or config.CHESSBOARD_SIZE)
+        self.square_size = square_size if square_size is not None else config.SQUARE_SIZE_MM
+        if workers is None:
+            workers = config.CALIBRATION_WORKERS or os.cpu_count() or 1
+        self.workers = max(int(workers), 1)
+        self.use_cache = config.CORNER_CACHE_ENABLED if use_cache is None else use_cache
+        self.cache_dir = cache_dir
+        self.last_cache_stats = None
 
         """准备 objectPoints"""
         self.objp = np.zeros((self.chessboard_size[0] * self.chessboard_size[1], 3), np.float32)
@@ -18,6 +37,7 @@ class StereoCalibrator:
         self.objp = self.objp * self.square_size
 
     @staticmethod
+    @profiling.timed("calibrate.single_camera")
     def _calibrate_single_camera(obj_points, img_points, img_size, camera_name: str):
         """
         单目标定函数
@@ -27,7 +47,7 @@ class StereoCalibrator:
         :param camera_name: 用于打印日志的相机名字 (e.g., "Left" or "Right")。
         :return:一个包含 K, D, 和重投影误差的元组。
         """
-        print(f"\nPerforming monocular calibration for {camera_name} camera...")
+        logger.info("Performing monocular calibration for %s camera...", camera_name)
 
         ret, K, D, rvecs, tvecs = cv2.calibrateCamera(
             obj_points,
@@ -40,11 +60,12 @@ class StereoCalibrator:
 
         # 检查单目标定的质量
         assert ret < 1.0, f"{camera_name} camera reprojection error is too high: {ret}"
-        print(f"  - {camera_name} camera calibrated with reprojection error: {ret}")
+        logger.info("  - %s camera calibrated with reprojection error: %s", camera_name, ret)
 
         return K, D, ret
 
     @staticmethod
+    @profiling.timed("calibrate.stereo")
     def _calibrate_stereo_relationship(obj_points, img_points_l, img_points_r, K1, D1, K2, D2, img_size):
         """
         在已知各自内参的情况下，计算双目相机之间的旋转和平移。
@@ -58,7 +79,7 @@ class StereoCalibrator:
         :param img_size: 图像尺寸（width, height）
         :return:
         """
-        print("\nPerforming stereo calibration to find the relationship between cameras...")
+        logger.info("Performing stereo calibration to find the relationship between cameras...")
 
         flags = config.STEREO_CALIB_FLAGS
 
@@ -72,7 +93,7 @@ class StereoCalibrator:
         )
 
         assert ret < 1.0, f"Stereo calibration reprojection error is too high: {ret}"
-        print(f"  - Stereo relationship calibrated with reprojection error: {ret}")
+        logger.info("  - Stereo relationship calibrated with reprojection error: %s", ret)
 
         # 将所有最终参数打包
         stereo_params = {
@@ -81,59 +102,45 @@ class StereoCalibrator:
         }
         return stereo_params
 
+    @profiling.timed("calibrate.detect_corners")
     def _find_corners_in_all_images(self, image_pairs: list):
-        """ 存储检测到的角点"""
+        """
+        在所有图像对中检测棋盘格角点。
+        每一对图像作为一个任务分发到进程池中，结果按输入顺序收集，保证标定结果与顺序执行一致。
+        """
         object_points = []  # 存储世界坐标
         image_points_left = []  # 存储左相机图像点
         image_points_right = []  # 存储右相机图像点
         image_size = None  # 将在第一张有效图片中获取
 
-        """遍历图像找角点"""
-        for left_image_path, right_image_path in image_pairs:
-            image_left = cv2.imread(left_image_path)
-            image_right = cv2.imread(right_image_path)
-            # 转换为灰度图
-            gray_left = cv2.cvtColor(image_left, cv2.COLOR_BGR2GRAY)
-            gray_right = cv2.cvtColor(image_right, cv2.COLOR_BGR2GRAY)
+        results = self._detect_corners_parallel(image_pairs)
+
+        """遍历检测结果"""
+        for (left_image_path, right_image_path), result in zip(image_pairs, results):
             """获取image_size并判断所有图片尺寸"""
             if image_size is None:
-                image_size = gray_left.shape[::-1]
-
-            assert gray_left.shape[::-1] == image_size, \
-                f"Image size mismatch! Expected {image_size}, but got {gray_left.shape[::-1]} in {image_left}"
-
-            assert gray_right.shape[::-1] == image_size, \
-                f"Image size mismatch! Expected {image_size}, but got {gray_right.shape[::-1]} in {image_right}"
-
-            # 查找棋盘格角点
-            # --- 为左图添加 NORMALIZE_IMAGE 标志 ---
-            find_flags_l = cv2.CALIB_CB_NORMALIZE_IMAGE
-            ret_left, corners_left = cv2.findChessboardCorners(gray_left, self.chessboard_size, flags=find_flags_l)
-            ret_right, corners_right = cv2.findChessboardCorners(gray_right, self.chessboard_size, None)
-
-            if config.VERBOSE_MODE:
-                key = visualizer.display_chessboard_corners(
-                    image_left, ret_left, corners_left,
-                    image_right, ret_right, corners_right,
-                    self.chessboard_size
-                )
-                # 如果用户按了 'q'，则退出标定
-                if key == ord('q'):
-                    print("Calibration cancelled by user.")
-                    return None  # 或者抛出异常
+                image_size = result["size_left"]
 
-            # 如果左右图像都成功找到了角点
-            if ret_left and ret_right:
-                # 亚像素精度优化
-                corners_left_subpix = cv2.cornerSubPix(gray_left, corners_left, (3, 3), (-1, -1), criteria=config.SUBPIX_CRITERIA)
-                corners_right_subpix = cv2.cornerSubPix(gray_right, corners_right, (3, 3), (-1, -1), criteria=config.SUBPIX_CRITERIA)
+            assert result["size_left"] == image_size, \
+                f"Image size mismatch! Expected {image_size}, but got {result['size_left']} in {left_image_path}"
+
+            assert result["size_right"] == image_size, \
+                f"Image size mismatch! Expected {image_size}, but got {result['size_right']} in {right_image_path}"
 
+            # 如果左右图像都成功找到了角点
+            if result["ret_left"] and result["ret_right"]:
                 object_points.append(self.objp)
-                image_points_left.append(corners_left_subpix)
-                image_points_right.append(corners_right_subpix)
+                image_points_left.append(result["corners_left"])
+                image_points_right.append(result["corners_right"])
             else:
-                print(f"  - Skipped pair: {os.path.basename(left_image_path)} & {os.path.basename(right_image_path)} "
-                      f"(Left found: {ret_left}, Right found: {ret_right})")
+                logger.info("  - Skipped pair: %s & %s (Left found: %s, Right found: %s)",
+                            os.path.basename(left_image_path), os.path.basename(right_image_path),
+                            result['ret_left'], result['ret_right'])
+
+        # 交互式显示只能在主进程中顺序进行
+        if config.VERBOSE_MODE:
+            if not self._display_detected_corners(image_pairs, results):
+                return None
 
         if not object_points:
             raise ValueError("Could not find chessboard corners in any of the image pairs.")
@@ -141,6 +148,58 @@ class StereoCalibrator:
             raise ValueError("Could not determine image size. No valid images found.")
         return object_points, image_points_left, image_points_right, image_size
 
+    def _detect_corners_parallel(self, image_pairs: list):
+        """
+        把每一对图像的角点检测分发到进程池，返回与 image_pairs 顺序一致的结果列表。
+        启用缓存时，只有新增或内容发生变化的图像对才会真正检测。
+        """
+        results = [None] * len(image_pairs)
+        cache = CornerCache(self.cache_dir) if self.use_cache else None
+        keys = [None] * len(image_pairs)
+        if cache is not None:
+            for i, (left, right) in enumerate(image_pairs):
+                keys[i] = cache.make_key(left, right, self.chessboard_size, config.SUBPIX_CRITERIA)
+                results[i] = cache.get(keys[i])
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        tasks = [(image_pairs[i][0], image_pairs[i][1], self.chessboard_size, config.SUBPIX_CRITERIA) for i in pending]
+        workers = min(self.workers, len(tasks))
+        if workers <= 1:
+            detected = [_detect_corners_in_pair(task) for task in tasks]
+        else:
+            logger.info("Detecting corners with %d worker processes...", workers)
+            # 使用 spawn 启动子进程，避免 fork 继承 OpenCV 内部线程池的状态
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                # executor.map 按任务提交顺序返回结果
+                detected = list(executor.map(_detect_corners_in_pair, tasks))
+
+        for i, result in zip(pending, detected):
+            results[i] = result
+            if cache is not None:
+                cache.put(keys[i], result)
+
+        if cache is not None:
+            cache.print_summary()
+            self.last_cache_stats = {"hits": cache.hits, "misses": cache.misses, "time_saved": cache.time_saved}
+        return results
+
+    def _display_detected_corners(self, image_pairs: list, results: list):
+        """顺序显示每一对图像的角点检测结果。用户按 'q' 时返回 False。"""
+        # 只有需要打开窗口时才导入可视化模块
+        from visualization import visualizer
+        for (left_image_path, right_image_path), result in zip(image_pairs, results):
+            key = visualizer.display_chessboard_corners(
+                cv2.imread(left_image_path), result["ret_left"], result["corners_left"],
+                cv2.imread(right_image_path), result["ret_right"], result["corners_right"],
+                self.chessboard_size
+            )
+            # 如果用户按了 'q'，则退出标定
+            if key == ord('q'):
+                logger.info("Calibration cancelled by user.")
+                return False
+        return True
+
     @staticmethod
     def _perform_calibration(object_points, image_points_left, image_points_right, image_size):
         """双目标定"""
@@ -149,7 +208,7 @@ class StereoCalibrator:
         cameraMatrix2 = np.eye(3, dtype=np.float64)
         distCoeffs2 = np.zeros(5, dtype=np.float64)
 
-        print("Starting stereo calibration... This may take a while.")
+        logger.info("Starting stereo calibration... This may take a while.")
         ret, K1, D1, K2, D2, R, T, E, F = cv2.stereoCalibrate(
             object_points, image_points_left, image_points_right,
             cameraMatrix1, distCoeffs1, cameraMatrix2, distCoeffs2,
@@ -178,26 +237,27 @@ class StereoCalibrator:
         try:
             if isinstance(image_source, str): # 传入的是目录
                 """加载图片"""
-                images_left = sorted(glob.glob(os.path.join(image_source, 'leftPic*.jpg')), key=file_utils.natural_sort_key)
-                images_right = sorted(glob.glob(os.path.join(image_source, 'rightPic*.jpg')), key=file_utils.natural_sort_key)
-                assert len(images_left) == len(images_right), "Number of left and right images must be equal"
-                image_pairs = list(zip(images_left, images_right))
+                image_pairs = file_utils.find_image_pairs(image_source)
             elif isinstance(image_source, list): # 传入的是列表
                 image_pairs = image_source
             else:
                 raise TypeError("image_source must be a directory path (str) or a list of pairs.")
+            # 标定的迭代优化对视图的顺序敏感（打乱顺序时内参的相对差异约 1e-4 量级），
+            # 统一按文件名的自然顺序排列，同一组图片无论以什么顺序传入，结果都完全相同
+            image_pairs = sorted(image_pairs, key=lambda pair: (file_utils.natural_sort_key(pair[0]),
+                                                                file_utils.natural_sort_key(pair[1])))
 
             # --- 第零步：寻找所有角 ---
-            print("Step 0: Finding chessboard corners in all images...")
+            logger.info("Step 0: Finding chessboard corners in all images...")
             obj_points, img_points_l, img_points_r, img_size = self._find_corners_in_all_images(image_pairs)
 
             # --- 第一步：分别标定左右相机 ---
-            print("\nStep 1: Calibrating each camera individually...")
+            logger.info("Step 1: Calibrating each camera individually...")
             K1, D1, reproj_error_L = self._calibrate_single_camera(obj_points, img_points_l, img_size, "Left")
             K2, D2, reproj_error_R = self._calibrate_single_camera(obj_points, img_points_r, img_size, "Right")
 
             # --- 第二步：标定双目关系 ---
-            print("\nStep 2: Calibrating the stereo rig relationship...")
+            logger.info("Step 2: Calibrating the stereo rig relationship...")
             stereo_params = self._calibrate_stereo_relationship(
                 obj_points, img_points_l, img_points_r, K1, D1, K2, D2, img_size
             )
@@ -206,13 +266,58 @@ class StereoCalibrator:
             # 把单目标定的误差也加进去，便于诊断
             stereo_params['reprojection_error_L'] = reproj_error_L
             stereo_params['reprojection_error_R'] = reproj_error_R
+            stereo_params['image_size'] = tuple(int(v) for v in img_size)
 
-            print("\nCalibration process completed successfully!")
+            logger.info("Calibration process completed successfully!")
             file_utils.save_stereo_params(config.CAMERA_PARAMS_PATH, stereo_params)
+            # 同时保存二进制格式，其中包含预先计算的校正结果，运行时加载更快；
+            # 文件头记录 YAML 的哈希，YAML 之后被修改时运行时会改用 YAML
+            file_utils.save_stereo_params(config.CAMERA_PARAMS_BINARY_PATH, stereo_params,
+                                          source_path=config.CAMERA_PARAMS_PATH)
 
             return stereo_params
 
         except (FileNotFoundError, ValueError, InterruptedError, AssertionError) as e:
-            print(f"\nAn error occurred during calibration: {e}")
-            print("Calibration process failed.")
+            logger.error("An error occurred during calibration: %s", e)
+            logger.error("Calibration process failed.")
             return None
+
+
+def _detect_corners_in_pair(task):
+    """
+    [进程池任务] 读取一对图像，检测棋盘格角点并做亚像素优化。
+    必须定义在模块顶层，才能被子进程 pickle 调用。
+    :param task: (left_image_path, right_image_path, chessboard_size, subpix_criteria)
+    :return: 包含图像尺寸、是否找到角点以及角点坐标的字典。
+    """
+    left_image_path, right_image_path, chessboard_size, subpix_criteria = task
+    start_time = time.perf_counter()
+    image_left = cv2.imread(left_image_path)
+    image_right = cv2.imread(right_image_path)
+    if image_left is None or image_right is None:
+        raise FileNotFoundError(f"Could not read image pair: {left_image_path} & {right_image_path}")
+
+    # 转换为灰度图
+    gray_left = cv2.cvtColor(image_left, cv2.COLOR_BGR2GRAY)
+    gray_right = cv2.cvtColor(image_right, cv2.COLOR_BGR2GRAY)
+
+    # 查找棋盘格角点
+    # --- 为左图添加 NORMALIZE_IMAGE 标志 ---
+    find_flags_l = cv2.CALIB_CB_NORMALIZE_IMAGE
+    ret_left, corners_left = cv2.findChessboardCorners(gray_left, chessboard_size, flags=find_flags_l)
+    ret_right, corners_right = cv2.findChessboardCorners(gray_right, chessboard_size, None)
+
+    # 如果左右图像都成功找到了角点，进行亚像素精度优化
+    if ret_left and ret_right:
+        corners_left = cv2.cornerSubPix(gray_left, corners_left, (3, 3), (-1, -1), criteria=subpix_criteria)
+        corners_right = cv2.cornerSubPix(gray_right, corners_right, (3, 3), (-1, -1), criteria=subpix_criteria)
+
+    return {
+        "size_left": gray_left.shape[::-1],
+        "size_right": gray_right.shape[::-1],
+        "ret_left": ret_left,
+        "corners_left": corners_left,
+        "ret_right": ret_right,
+        "corners_right": corners_right,
+        "elapsed": time.perf_counter() - start_time,
+    }
@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+import config
+from utils import file_utils
+
+logger = logging.getLogger(__name__)
+
+# 角点检测逻辑（查找标志、亚像素窗口）发生变化时需要修改这个版本号，使旧缓存失效
+_CACHE_VERSION = "1"
+
+
+class CornerCache:
+    """
+    棋盘格角点检测结果的磁盘缓存。
+
+    每一对图像的检测结果保存为一个 .npz 文件，缓存键由左右图像文件内容的哈希、
+    棋盘格尺寸和亚像素优化的终止条件共同决定，任何一项变化都会重新检测。
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or config.CORNER_CACHE_DIR
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+
+    @staticmethod
+    def make_key(left_image_path, right_image_path, chessboard_size, subpix_criteria):
+        """计算一对图像的缓存键。"""
+        digest = hashlib.sha1()
+        digest.update(_CACHE_VERSION.encode())
+        for path in (left_image_path, right_image_path):
+            digest.update(file_utils.hash_file(path).encode())
+        digest.update(repr(tuple(chessboard_size)).encode())
+        digest.update(repr(tuple(subpix_criteria)).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """读取缓存的检测结果，未命中时返回 None。"""
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with np.load(path) as data:
+                result = {
+                    "size_left": tuple(int(v) for v in data["size_left"]),
+                    "size_right": tuple(int(v) for v in data["size_right"]),
+                    "ret_left": bool(data["ret_left"]),
+                    "ret_right": bool(data["ret_right"]),
+                    "corners_left": data["corners_left"] if data["ret_left"] else None,
+                    "corners_right": data["corners_right"] if data["ret_right"] else None,
+                    "elapsed": float(data["elapsed"]),
+                }
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable corner cache entry %s: %s", path, e)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.time_saved += result["elapsed"]
+        return result
+
+    def put(self, key, result):
+        """保存一对图像的检测结果。"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # 先写临时文件再改名，避免中断时留下损坏的缓存
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".npz")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    size_left=np.asarray(result["size_left"]),
+                    size_right=np.asarray(result["size_right"]),
+                    ret_left=bool(result["ret_left"]),
+                    ret_right=bool(result["ret_right"]),
+                    corners_left=_corners_or_empty(result["corners_left"]),
+                    corners_right=_corners_or_empty(result["corners_right"]),
+                    elapsed=float(result["elapsed"]),
+                )
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning("Could not write corner cache to %s: %s", self.cache_dir, e)
+
+    def print_summary(self):
+        total = self.hits + self.misses
+        logger.info("Corner cache: %d/%d hits, %d misses, ~%.2f s of detection time saved.",
+                    self.hits, total, self.misses, self.time_saved)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+
+# --- Internal Helper Functions ---
+def _corners_or_empty(corners):
+    """[内部辅助函数] 未找到角点时 OpenCV 返回 None，保存为空数组。"""
+    if corners is None:
+        return np.zeros((0, 1, 2), dtype=np.float32)
+    return corners
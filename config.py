@@ -1,11 +1,13 @@
 import os
-import cv2
 
 # --- Path configurations ---
 # project root directory, determined by the location of this config file.
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 
 CALIBRATION_IMAGE_DIR = os.path.join(PROJECT_ROOT, "data/calibration_images/")
+# 目录中左右图像的命名规则（标定图片和图片序列都使用这一规则配对）
+LEFT_IMAGE_PATTERN = "leftPic*.jpg"
+RIGHT_IMAGE_PATTERN = "rightPic*.jpg"
 
 # 定义测试图片路径
 TEST_IMAGE_DIR = os.path.join(PROJECT_ROOT, "data/test_images/")
@@ -14,28 +16,85 @@ TEST_IMAGE_RIGHT_PATH = os.path.join(TEST_IMAGE_DIR,"rightPic.jpg")
 
 OUTPUT_DIR = os.path.join(PROJECT_ROOT, "output/")
 CAMERA_PARAMS_PATH = os.path.join(OUTPUT_DIR, "stereo_params.yml")
+# 二进制格式的标定参数（固定布局的 float64，包含预先计算的校正结果），标定时与 YAML 一起生成。
+# 只有与当前 YAML 的内容一致时才会被加载，见 file_utils.find_stereo_params
+CAMERA_PARAMS_BINARY_PATH = os.path.join(OUTPUT_DIR, "stereo_params.bin")
 
 POINT_CLOUD_PATH = os.path.join(OUTPUT_DIR, "point_cloud.ply")
+# 无界面模式 (run --headless) 的输出：伪彩色视差图和 float32 深度图（毫米，无效像素为 inf/nan）
+DISPARITY_COLOR_PATH = os.path.join(OUTPUT_DIR, "disparity_color.png")
+DEPTH_MAP_PATH = os.path.join(OUTPUT_DIR, "depth.npy")
+# 流式处理 (run --stream) 的默认输出目录
+STREAM_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "stream/")
+# 批处理 (batch) 的默认输出目录
+BATCH_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "batch/")
+# 棋盘格角点检测结果的缓存目录
+CORNER_CACHE_DIR = os.path.join(OUTPUT_DIR, "corner_cache/")
+# 校正映射表的持久化目录（与标定文件放在一起）
+RECTIFY_CACHE_DIR = os.path.join(os.path.dirname(CAMERA_PARAMS_PATH), "rectify_cache/")
 
 
 # ---Calibration Target Parameters---
 # Image_Number = 13
 CHESSBOARD_SIZE = (8, 11)  # (内角点数量 a, 内角点数量 b)
 SQUARE_SIZE_MM = 12        # 棋盘格尺寸（毫米）
+CALIBRATION_WORKERS = None # 角点检测的并行进程数，None 表示使用全部 CPU 核
+CORNER_CACHE_ENABLED = True # 缓存角点检测结果，重复标定时只检测新增或变化的图片
 # IMAGE_SIZE = (640, 480)    # 图片分辨率
 
 # --- Runtime Control Flags ---
 # 显示详细过程内容，设置为True表示显示
 VERBOSE_MODE = False
+# 日志级别: "DEBUG" 会输出每一步的细节（初始化、逐帧的进度等），"WARNING" 只输出警告、错误和最终报告
+LOG_LEVEL = "INFO"
+# 交互式深度图窗口等待按键/鼠标事件的间隔（毫秒）。窗口只在鼠标移动时重绘，间隔越大空闲时 CPU 占用越低
+VIEWER_POLL_INTERVAL_MS = 30
+
+# --- OpenCV Constants ---
+# 与 cv2 中同名常量的数值相同。配置文件不导入 cv2，这样 --help 等不需要 OpenCV 的命令可以快速启动
+TERM_CRITERIA_EPS = 2                   # cv2.TERM_CRITERIA_EPS
+TERM_CRITERIA_MAX_ITER = 1              # cv2.TERM_CRITERIA_MAX_ITER
+CALIB_USE_INTRINSIC_GUESS = 1           # cv2.CALIB_USE_INTRINSIC_GUESS
+STEREO_SGBM_MODE_SGBM = 0               # cv2.STEREO_SGBM_MODE_SGBM
+STEREO_SGBM_MODE_HH = 1                 # cv2.STEREO_SGBM_MODE_HH
+STEREO_SGBM_MODE_SGBM_3WAY = 2          # cv2.STEREO_SGBM_MODE_SGBM_3WAY
 
 # --- Algorithm Hyperparameters ---
-SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 0.1)
-MONO_CALIB_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-STEREO_CALIB_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 1e-5)
-STEREO_CALIB_FLAGS = cv2.CALIB_USE_INTRINSIC_GUESS
+SUBPIX_CRITERIA = (TERM_CRITERIA_EPS + TERM_CRITERIA_MAX_ITER, 20, 0.1)
+MONO_CALIB_CRITERIA = (TERM_CRITERIA_EPS + TERM_CRITERIA_MAX_ITER, 30, 0.001)
+STEREO_CALIB_CRITERIA = (TERM_CRITERIA_EPS + TERM_CRITERIA_MAX_ITER, 100, 1e-5)
+STEREO_CALIB_FLAGS = CALIB_USE_INTRINSIC_GUESS
+# 立体校正：映射表只与标定参数、图像尺寸和 alpha 有关，计算一次后缓存复用
+RECTIFY_ALPHA = 0               # stereoRectify 的 alpha: 0 无黑边，1 保留所有像素
+RECTIFY_CACHE_SIZE = 4          # 进程内缓存的映射表组数 (LRU)
+RECTIFY_PERSIST_MAPS = True     # 是否把映射表以 .npy 保存到磁盘，供新进程 mmap 复用
+# 流式处理：各阶段之间队列的最大长度，队列满时上游阶段会阻塞等待
+STREAM_QUEUE_SIZE = 4
+# 流式处理复用输出缓冲区时，同时在流水线中的最大帧数（每帧一组缓冲区），所有缓冲区都在使用时解码阶段等待
+# 每组缓冲区约为 80 字节/像素（完整点云）或 20 字节/像素（--depth-only）；None 表示阶段数 + 队列长度
+STREAM_BUFFER_POOL_SIZE = None
+# 批处理：处理图像对的进程数，None 表示使用全部 CPU 核
+BATCH_WORKERS = None
+# 本地处理服务 (python main.py serve，processing/stereo_service.py)
+SERVICE_HOST = "127.0.0.1"      # 只监听本机
+SERVICE_PORT = 8765
+SERVICE_WORKERS = None          # 处理线程数，None 表示使用全部 CPU 核
+SERVICE_QUEUE_SIZE = 8          # 所有处理线程都忙时最多排队的请求数，再多的请求直接返回 503
+SERVICE_MAX_REQUEST_MB = 64     # 单个请求体的最大大小
+# 视差图归档 (utils/frame_archive.py)：每个分块文件包含的帧数（也是意外中断时最多丢失的帧数）、压缩编码和压缩级别
+# ARCHIVE_CODEC 可选 "zlib"、"zstd"（需要 pip install zstandard）或 "auto"（已安装 zstandard 时使用 zstd）
+ARCHIVE_CHUNK_FRAMES = 16
+ARCHIVE_CODEC = "auto"
+ARCHIVE_COMPRESSION_LEVEL = 1   # 视差图差分后大部分为零，低压缩级别的压缩率已接近高级别，速度快得多
+# 三维重建模式: "reproject" 使用 cv2.reprojectImageTo3D；"lut" 使用按 Q 预计算的视差→深度查找表（更快、更省内存）
+RECONSTRUCTION_MODE = "lut"
+POINT_CLOUD_MAX_DEPTH = 1000.0  # 点云中保留的最大深度（毫米），更远的点视为噪声被过滤
 # 点云后处理：为了加快显示和处理，可以对点云进行降采样
 # 例如 DOWNSAMPLE_FACTOR = 4 表示每 4x4 的像素区域只取一个点
 POINT_CLOUD_DOWNSAMPLE_FACTOR = 4
+# 体素栅格降采样的体素边长（毫米）。大于 0 时每个体素输出一个质心点（颜色取平均），点密度在空间上均匀，
+# 但需要先重投影全分辨率的点云（640x480 时约 100 ms）；None 或 0 时使用上面的按像素步长降采样（在重投影之前完成）
+POINT_CLOUD_VOXEL_SIZE = None
 
 # SGBM (Semi-Global Block Matching) Parameters
 SGBM_MIN_DISPARITY = 0
@@ -48,4 +107,28 @@ SGBM_PRE_FILTER_CAP = 63        # 预处理滤波器的截断值
 SGBM_UNIQUENESS_RATIO = 10      # 唯一性检查的裕量
 SGBM_SPECKLE_WINDOW_SIZE = 100  # 视差图后处理的散斑窗口大小
 SGBM_SPECKLE_RANGE = 32         # 散斑窗口内的最大视差变化
-SGBM_MODE = cv2.STEREO_SGBM_MODE_SGBM_3WAY # SGBM模式
+SGBM_MODE = STEREO_SGBM_MODE_SGBM_3WAY # SGBM模式
+
+# 匹配后端: "bm" (StereoBM，最快的实时方案)、"sgbm" (使用上面的 SGBM_MODE)、"sgbm_5dir"、"sgbm_hh"、"sgbm_3way"、
+# "sgbm_wls" (左右一致性 + WLS 滤波，需要 opencv-contrib-python)。所有后端都输出相同格式的 CV_16S 视差图
+MATCHER_BACKEND = "sgbm"
+BM_BLOCK_SIZE = 15              # StereoBM 的匹配块大小，必须是 5~255 之间的奇数
+WLS_LAMBDA = 8000.0             # WLS 滤波的平滑强度
+WLS_SIGMA_COLOR = 1.5           # WLS 滤波对图像边缘的敏感度
+
+# 匹配模式: "full" 全分辨率 SGBM；"pyramid" 由粗到精，先在低分辨率上估计视差，再按块收窄全分辨率的搜索范围；
+# "tiled" 把图像切成带重叠的水平条带，在线程池中并行计算后拼接；"incremental" 用于固定机位的视频流，
+# 只重新计算相邻帧之间发生变化的区域，其余区域沿用上一帧的视差
+MATCHER_MODE = "full"
+PYRAMID_LEVELS = 1              # 粗匹配的下采样层数，每层宽高各缩小一半
+PYRAMID_TILE_SIZE = (320, 160)  # 全分辨率下每一块的 (宽, 高)，宽为 0 表示使用整行宽的水平条带
+PYRAMID_DISPARITY_MARGIN = 8    # 粗视差范围向两侧扩展的余量（全分辨率像素）
+PYRAMID_MIN_VALID_RATIO = 0.05  # 块内粗视差的有效比例低于该值时，退回完整搜索范围
+TILED_WORKERS = None            # 分带计算的线程数，None 表示使用全部 CPU 核
+TILED_BAND_COUNT = None         # 水平条带数，None 表示与线程数相同
+TILED_BAND_OVERLAP = 32         # 每个条带上下额外计算的行数，越大拼接结果越接近整图计算
+INCREMENTAL_BLOCK_SIZE = 16     # "incremental" 模式帧差检测的块大小（像素）
+INCREMENTAL_DIFF_THRESHOLD = 4.0   # 块内平均灰度差超过该值视为变化，应高于相机噪声引起的帧间差异
+INCREMENTAL_MARGIN = 16         # 变化区域向四周扩展的像素数，覆盖匹配窗口和代价聚合的影响范围
+INCREMENTAL_REFRESH_INTERVAL = 30  # 每隔多少帧整幅重新计算一次，限制误差累积；0 表示不强制刷新
+INCREMENTAL_MAX_DIRTY_RATIO = 0.5  # 需要重新计算的像素比例超过该值时直接整幅计算
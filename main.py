@@ -1,121 +1,321 @@
 import config
 import os
-from calibration.calibrator import StereoCalibrator
 import argparse
-from utils import file_utils, image_utils
-import cv2
-from visualization import visualizer
-from processing.stereo_matcher import StereoMatcher
-from processing.reconstructor import Reconstructor
+import logging
+import sys
+
+# 注意：OpenCV、NumPy 以及各处理模块都在各个子命令的处理函数中按需导入，
+# 这样 --help 和不需要它们的子命令可以快速启动（见 test/test_startup.py）
+
+logger = logging.getLogger(__name__)
 
 
 def setup_environment():
     """负责程序运行前所有的环境准备工作，比如创建输出文件夹。"""
-    print("Setting up environment...")
+    logger.debug("Setting up environment...")
     os.makedirs(config.OUTPUT_DIR, exist_ok=True)
-    print("Output directory ensured.")
+    logger.debug("Output directory ensured.")
 
 # --- 创建不同的函数来处理不同的任务 ---
 
 def handle_calibration(args):
     """处理标定任务的函数"""
-    print("\n--- Running Calibration Task ---")
+    from calibration.calibrator import StereoCalibrator
+
+    logger.info("--- Running Calibration Task ---")
     if args.corners:
-        print("Using chessboard size from command line.")
+        logger.info("Using chessboard size from command line.")
         try:
             corners_width, corners_height = map(int, args.corners.split(','))
             chessboard_size = (corners_width, corners_height)
         except ValueError:
-            print(f"Error: Invalid format for --corners: '{args.corners}'. Please use 'width,height'.")
+            logger.error("Invalid format for --corners: '%s'. Please use 'width,height'.", args.corners)
             return
     else:
-        print("Using default chessboard size from config.py.")
+        logger.info("Using default chessboard size from config.py.")
         chessboard_size = config.CHESSBOARD_SIZE
 
     if args.size is not None:
-        print("Using square size from command line.")
+        logger.info("Using square size from command line.")
         square_size_mm = args.size
     else:
-        print("Using default square size from config.py.")
+        logger.info("Using default square size from config.py.")
         square_size_mm = config.SQUARE_SIZE_MM
 
-    calibrator = StereoCalibrator(chessboard_size=chessboard_size, square_size=square_size_mm)
+    calibrator = StereoCalibrator(chessboard_size=chessboard_size, square_size=square_size_mm,
+                                  workers=args.workers, use_cache=not args.no_cache)
     calibrator.run(config.CALIBRATION_IMAGE_DIR)
-    print("\nCalibration task finished.")
+    logger.info("Calibration task finished.")
 
 def handle_run_application(args):
     """处理核心应用（立体匹配等）任务的函数"""
-    print("Loading calibration parameters...")
-    stereo_params = file_utils.load_stereo_params(config.CAMERA_PARAMS_PATH)
-    if stereo_params is None:
-        print(f"Error: Calibration parameters not found at {config.CAMERA_PARAMS_PATH}. Please run the 'calibrate' command first.")
+    if args.stream:
+        handle_stream(args)
+        return
+
+    import time
+    import cv2
+    import numpy as np
+    from utils import file_utils, image_utils
+    from processing.stereo_matcher import StereoMatcher, print_quality_report
+    from processing.reconstructor import Reconstructor
+
+    # 无界面模式下不导入、不调用任何窗口相关的代码
+    show_windows = not args.headless
+    if show_windows:
+        from visualization import visualizer
+
+    logger.info("Loading calibration parameters...")
+    params_path = file_utils.find_stereo_params()
+    try:
+        stereo_params = file_utils.load_stereo_params(params_path)
+    except FileNotFoundError:
+        logger.error("Calibration parameters not found at %s. Please run the 'calibrate' command first.", params_path)
+        return
+    except ValueError as e:
+        logger.error(e)
         return
 
-    print("Loading test images...")
+    logger.info("Loading test images...")
     left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
     right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
     if left_img is None or right_img is None:
-        print("Error: Could not load test images. Please check the paths in config.py.")
+        logger.error("Could not load test images. Please check the paths in config.py.")
+        return
+
+    logger.info("Performing stereo matching...")
+    rectifier = image_utils.Rectifier(stereo_params=stereo_params, params_path=params_path)
+    try:
+        matcher = StereoMatcher(mode=args.matcher_mode, backend=args.backend) # Matcher会从config加载匹配参数
+    except (ImportError, ValueError) as e:
+        logger.error(e)
         return
 
-    print("Performing stereo matching...")
-    left_rectified, right_rectified, Q = image_utils.rectify_stereo_pair(left_img, right_img, stereo_params)
+    # 记录各阶段耗时，无界面模式结束时打印，便于测量吞吐量
+    timings = {}
+    roi = None
+    if args.roi:
+        # 只校正和匹配 ROI 需要的窗口，之后的视差图、左图和重建结果都只覆盖 ROI
+        from processing import roi_pipeline
+        try:
+            roi_result = roi_pipeline.process_roi(rectifier, matcher, left_img, right_img,
+                                                  roi_pipeline.parse_roi(args.roi))
+        except ValueError as e:
+            logger.error(e)
+            return
+        roi, disparity_map, left_rectified, Q, roi_timings = roi_result
+        timings.update(roi_timings)
+        if args.matcher_report:
+            roi_pipeline.print_roi_report(
+                roi_pipeline.compare_with_full_frame(rectifier, matcher, left_img, right_img, roi_result))
+    else:
+        stage_start = time.perf_counter()
+        if config.VERBOSE_MODE and show_windows:
+            # 显示校正效果需要完整的左右彩色校正图
+            left_rectified, right_rectified, Q = rectifier.rectify(left_img, right_img)
+            matcher_inputs = (left_rectified, right_rectified)
+            timings["rectify"] = time.perf_counter() - stage_start
+            visualizer.show_rectified_pair(left_rectified, right_rectified)
+        else:
+            # 先转灰度再校正，匹配器直接使用校正后的灰度图，右图不需要彩色校正结果
+            left_gray, right_gray, left_rectified, Q = image_utils.StereoPreprocessor(rectifier).process(
+                left_img, right_img)
+            matcher_inputs = (left_gray, right_gray)
+            timings["rectify"] = time.perf_counter() - stage_start
 
-    # 增加一个可视化步骤，来检查校正效果
-    if config.VERBOSE_MODE:
-        # 这个函数需要你添加到 visualizer.py 中
-        visualizer.show_rectified_pair(left_rectified, right_rectified)
+        # 计算视差图
+        logger.debug("Computing disparity map...")
+        stage_start = time.perf_counter()
+        disparity_map = matcher.compute_disparity(*matcher_inputs)
+        timings["match"] = time.perf_counter() - stage_start
 
-    # 创建匹配器并计算视差图
-    print("Computing disparity map...")
-    matcher = StereoMatcher() # Matcher会从config加载SGBM参数
-    disparity_map = matcher.compute_disparity(left_rectified, right_rectified)
+        if args.matcher_report:
+            print_quality_report(matcher.quality_report(*matcher_inputs))
 
     # 可视化最终的视差图
-    if config.VERBOSE_MODE:
-        print("Visualizing disparity map...")
+    if config.VERBOSE_MODE and show_windows:
+        logger.info("Visualizing disparity map...")
         visualizer.show_disparity_map(
             disparity_map,
             config.SGBM_MIN_DISPARITY,
             config.SGBM_NUM_DISPARITIES
         )
 
-    print("\nStereo matching application finished successfully.")
+    logger.info("Stereo matching application finished successfully.")
 
     # --- 三维重建 ---
-    print("\n--- Performing 3D Reconstruction ---")
-    reconstructor = Reconstructor()
-    # 接收两种返回结果
-    points_3D_matrix, (points_filtered, colors_filtered) = reconstructor.reconstruct(disparity_map, left_rectified, Q)
-
-    # --- 保存点云 (使用过滤后的数据) ---
-    print("\n--- Saving Point Cloud ---")
-    # (可选) 在这里进行降采样
-    downsample_factor = config.POINT_CLOUD_DOWNSAMPLE_FACTOR
-    if downsample_factor > 1:
-        points_to_save = points_filtered[::downsample_factor]
-        colors_to_save = colors_filtered[::downsample_factor]
+    logger.info("--- Performing 3D Reconstruction ---")
+    try:
+        reconstructor = Reconstructor(mode=args.reconstruction_mode)
+    except ValueError as e:
+        logger.error(e)
+        return
+    # 惰性结果：不预先生成完整的点矩阵，只在需要时计算单点、降采样点云等
+    if roi is None:
+        reconstruction = reconstructor.reconstruct_lazy(disparity_map, left_rectified, Q)
     else:
-        points_to_save = points_filtered
-        colors_to_save = colors_filtered
+        reconstruction = reconstructor.reconstruct_lazy(disparity_map, left_rectified, Q, origin=roi[:2],
+                                                        invalid_disparity=(matcher.min_disparity - 1) * 16)
+
+    if not show_windows:
+        # --- 无界面模式：把结果写入文件 ---
+        logger.info("--- Writing Headless Outputs ---")
+        stage_start = time.perf_counter()
+        depth_map = reconstruction.depth_map()
+        points_to_save, colors_to_save = _build_point_cloud(reconstruction, args.voxel_size)
+        timings["reconstruct"], stage_start = time.perf_counter() - stage_start, time.perf_counter()
 
+        if roi is not None:
+            # 输出文件与整幅处理时的像素坐标一致，ROI 之外为无效视差和 NaN 深度
+            image_size = left_img.shape[1::-1]
+            disparity_map = roi_pipeline.paste_roi(disparity_map, roi, image_size, (matcher.min_disparity - 1) * 16)
+            depth_map = roi_pipeline.paste_roi(depth_map, roi, image_size, np.nan)
+
+        os.makedirs(config.OUTPUT_DIR, exist_ok=True)
+        colorized = image_utils.colorize_disparity(disparity_map, config.SGBM_MIN_DISPARITY, config.SGBM_NUM_DISPARITIES)
+        cv2.imwrite(config.DISPARITY_COLOR_PATH, colorized)
+        logger.info("Colorized disparity map saved to %s", config.DISPARITY_COLOR_PATH)
+        np.save(config.DEPTH_MAP_PATH, depth_map)
+        logger.info("Depth map saved to %s", config.DEPTH_MAP_PATH)
+        file_utils.save_point_cloud(config.POINT_CLOUD_PATH, points_to_save, colors_to_save)
+        timings["write"] = time.perf_counter() - stage_start
+
+        total = sum(timings.values())
+        stages = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items())
+        logger.info("Headless run finished in %.1f ms (%s).", total * 1000, stages)
+        return
 
     # --- 可视化 ---
-    print("\n--- Visualizing Final Output ---")
+    logger.info("--- Visualizing Final Output ---")
     visualizer.show_interactive_depth_map(
         disparity_map,
         left_rectified,
-        points_3D_matrix,
+        reconstruction,
         config.SGBM_MIN_DISPARITY,
         config.SGBM_NUM_DISPARITIES
     )
 
     if args.view_3d:
-        print("\n--- Additionally visualizing 3D Point Cloud ---")
+        logger.info("--- Additionally visualizing 3D Point Cloud ---")
+        points_to_save, colors_to_save = _build_point_cloud(reconstruction, args.voxel_size)
         file_utils.save_point_cloud(config.POINT_CLOUD_PATH, points_to_save, colors_to_save)
         visualizer.show_point_cloud(config.POINT_CLOUD_PATH)
 
-    print("\nFull stereo vision pipeline finished successfully.")
+    logger.info("Full stereo vision pipeline finished successfully.")
+
+
+def _build_point_cloud(reconstruction, voxel_size=None):
+    """从惰性重建结果生成要保存的点云，降采样方式见 processing.point_cloud.reconstruction_cloud。"""
+    from processing.point_cloud import reconstruction_cloud
+
+    voxel_size = config.POINT_CLOUD_VOXEL_SIZE if voxel_size is None else voxel_size
+    points, colors, total = reconstruction_cloud(reconstruction, voxel_size)
+    if voxel_size:
+        logger.info("Voxel downsampling (%s mm): %d -> %d points", voxel_size, total, len(points))
+    return points, colors
+
+
+def handle_stream(args):
+    """处理流式任务：视频或图片序列逐帧通过流水线，无界面运行。"""
+    from utils import file_utils, frame_sources, image_utils
+    from utils.frame_archive import DisparityArchive
+    from processing.stereo_matcher import StereoMatcher
+    from processing.reconstructor import Reconstructor
+    from processing.stream_pipeline import StreamPipeline, DisparityImageSink, ArchiveSink, print_stream_report
+
+    logger.info("--- Running Stream Processing ---")
+    try:
+        rectifier = image_utils.Rectifier.from_file(file_utils.find_stereo_params())
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(e)
+        return
+    try:
+        matcher = StereoMatcher(mode=args.matcher_mode, backend=args.backend)
+        reconstructor = Reconstructor(mode=args.reconstruction_mode)
+    except (ImportError, ValueError) as e:
+        logger.error(e)
+        return
+
+    sink = None
+    archive = None
+    if args.archive:
+        archive = DisparityArchive(args.archive, mode="a")
+        sink = ArchiveSink(archive)
+        logger.info("Appending disparity maps to archive %s (%d frames already stored)", args.archive, len(archive))
+    elif not args.no_write:
+        output_dir = args.stream_output or config.STREAM_OUTPUT_DIR
+        sink = DisparityImageSink(output_dir)
+        logger.info("Writing disparity maps to %s", output_dir)
+
+    # 两种 sink 都在收到帧时立即写出，不持有帧数据，各阶段可以使用复用的输出缓冲区
+    pipeline = StreamPipeline(rectifier, matcher, reconstructor, sink=sink, queue_size=args.queue_size,
+                              depth_only=args.depth_only, reuse_buffers=True)
+    try:
+        # 图片目录由生成器惰性读取，目录为空或左右数量不一致的错误在 run() 中才会抛出
+        frames = frame_sources.open_stereo_source(args.stream, args.right_video, max_frames=args.max_frames)
+        summary = pipeline.run(frames)
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(e)
+        return
+    finally:
+        if archive is not None:
+            archive.close()
+    print_stream_report(summary)
+
+
+def handle_batch(args):
+    """处理批处理任务：用进程池处理目录中的所有图像对，结果写入文件。"""
+    from utils import file_utils
+    from processing.batch_processor import process_directory, print_batch_report
+
+    logger.info("--- Running Batch Processing ---")
+    try:
+        summary = process_directory(
+            args.input_dir,
+            output_dir=args.output,
+            params_path=file_utils.find_stereo_params(),
+            workers=args.workers,
+            backend=args.backend,
+            matcher_mode=args.matcher_mode,
+            reconstruction_mode=args.reconstruction_mode,
+            voxel_size=args.voxel_size,
+            depth_only=args.depth_only,
+        )
+    except (FileNotFoundError, ImportError, ValueError) as e:
+        logger.error(e)
+        return
+    print_batch_report(summary)
+
+
+def handle_serve(args):
+    """运行本地处理服务：标定参数、映射表和匹配器只加载一次，通过 HTTP 端口或 Unix 域套接字接收图像对。"""
+    import asyncio
+    from utils import file_utils, image_utils
+    from processing.stereo_service import StereoService, print_service_report
+
+    logger.info("--- Running Stereo Service ---")
+    try:
+        rectifier = image_utils.Rectifier.from_file(file_utils.find_stereo_params())
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(e)
+        return
+    try:
+        service = StereoService(rectifier, backend=args.backend, matcher_mode=args.matcher_mode,
+                                reconstruction_mode=args.reconstruction_mode, workers=args.workers,
+                                queue_size=args.queue_size)
+    except (ImportError, ValueError) as e:
+        logger.error(e)
+        return
+
+    try:
+        asyncio.run(service.serve_forever(host=args.host, port=args.port, unix_path=args.unix))
+    except KeyboardInterrupt:
+        logger.info("Stopping stereo service...")
+    except OSError as e:
+        logger.error("Could not start the stereo service: %s", e)
+    finally:
+        service.close()
+    print_service_report(service.summary())
 
 
 def main():
@@ -128,6 +328,30 @@ def main():
         action='store_true',
         help="Enable verbose mode to show intermediate visualization steps for any task."
     )
+    parser.add_argument(
+        '--log-level',
+        default=None,
+        choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+        help=f"Minimum level of progress messages to print. Overrides the default in config.py ({config.LOG_LEVEL})."
+    )
+    parser.add_argument(
+        '-q', '--quiet',
+        action='store_true',
+        help="Only print warnings, errors and final reports (same as --log-level WARNING)."
+    )
+    parser.add_argument(
+        '--timings',
+        default=None,
+        metavar='PATH',
+        help="Record wall time, CPU time and peak memory of each pipeline stage and write them to PATH "
+             "(.csv for CSV, otherwise JSON)."
+    )
+    parser.add_argument(
+        '--profile',
+        default=None,
+        metavar='PATH',
+        help="Run the command under cProfile and write the statistics to PATH (view with python -m pstats)."
+    )
 
     # 创建子命令解析器
     subparsers = parser.add_subparsers(dest='command', help='Available commands', required=True)
@@ -146,32 +370,270 @@ def main():
         default=None,
         help=f"Side length of a chessboard square in mm. Overrides the default in config.py ({config.SQUARE_SIZE_MM})."
     )
+    parser_calibrate.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=None,
+        help="Number of processes used for chessboard corner detection. "
+             "Overrides the default in config.py (all CPU cores)."
+    )
+    parser_calibrate.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Ignore the corner detection cache and re-detect corners in every image."
+    )
     parser_calibrate.set_defaults(func=handle_calibration)
 
     # 创建 'run' 命令
     parser_run = subparsers.add_parser('run', help='Run the main stereo matching application using existing calibration.')
     # 添加一个 --view-3d 参数，可以选择为输出点云图
+    parser_run.add_argument(
+        '--headless',
+        action='store_true',
+        help="Run without opening any window. The colorized disparity map, depth map and point cloud "
+             "are written to the output directory instead."
+    )
     parser_run.add_argument(
         '--view-3d',
         action='store_true',
         help="Additionally, visualize the generated point cloud in 3D using Open3D."
     )
+    parser_run.add_argument(
+        '--backend',
+        default=None,
+        help=f"Stereo matching backend: sgbm, sgbm_5dir, sgbm_hh, sgbm_3way, bm or sgbm_wls "
+             f"(see README). Overrides the default in config.py ({config.MATCHER_BACKEND})."
+    )
+    parser_run.add_argument(
+        '--matcher-mode',
+        default=None,
+        help=f"Stereo matching mode: 'full' resolution SGBM, coarse-to-fine 'pyramid', multi-threaded 'tiled' "
+             f"or 'incremental' (video streams: only regions that changed since the previous frame are recomputed). "
+             f"Overrides the default in config.py ({config.MATCHER_MODE})."
+    )
+    parser_run.add_argument(
+        '--matcher-report',
+        action='store_true',
+        help="Print a speed and quality comparison of the selected matcher mode against full-frame matching "
+             "(with --roi: of ROI processing against full-frame rectification and matching)."
+    )
+    parser_run.add_argument(
+        '--roi',
+        default=None,
+        metavar='X,Y,W,H',
+        help="Only rectify, match and reconstruct this region of the rectified left image. "
+             "Outputs keep full-image pixel coordinates."
+    )
+    parser_run.add_argument(
+        '--reconstruction-mode',
+        default=None,
+        help=f"3D reconstruction mode: 'reproject' with cv2.reprojectImageTo3D or the disparity-to-depth 'lut'. "
+             f"Overrides the default in config.py ({config.RECONSTRUCTION_MODE})."
+    )
+    parser_run.add_argument(
+        '--voxel-size',
+        type=float,
+        default=None,
+        help=f"Voxel edge length in mm for point cloud downsampling (e.g. 5); 0 or unset uses pixel-stride "
+             f"downsampling. Overrides the default in config.py ({config.POINT_CLOUD_VOXEL_SIZE})."
+    )
+    parser_run.add_argument(
+        '--stream',
+        type=str,
+        default=None,
+        metavar='SOURCE',
+        help="Headless streaming mode. SOURCE is a side-by-side stereo video, the left video "
+             "(with --right-video), or a directory of numbered leftPic*/rightPic* pairs."
+    )
+    parser_run.add_argument(
+        '--right-video',
+        type=str,
+        default=None,
+        help="Right camera video, synchronized with the left video given to --stream."
+    )
+    parser_run.add_argument(
+        '--max-frames',
+        type=int,
+        default=None,
+        help="Stop streaming after this many frames."
+    )
+    parser_run.add_argument(
+        '--queue-size',
+        type=int,
+        default=None,
+        help=f"Bounded queue length between pipeline stages. Overrides the default in config.py ({config.STREAM_QUEUE_SIZE})."
+    )
+    parser_run.add_argument(
+        '--stream-output',
+        type=str,
+        default=None,
+        help=f"Directory for per-frame disparity maps in streaming mode (default: {config.STREAM_OUTPUT_DIR})."
+    )
+    parser_run.add_argument(
+        '--archive',
+        type=str,
+        default=None,
+        metavar='DIR',
+        help="Append the disparity maps, timestamps and Q matrix of a streaming run to a chunked, "
+             "compressed archive in DIR instead of writing one PNG per frame."
+    )
+    parser_run.add_argument(
+        '--depth-only',
+        action='store_true',
+        help="In streaming mode, compute only the depth map instead of a full point cloud per frame."
+    )
+    parser_run.add_argument(
+        '--no-write',
+        action='store_true',
+        help="In streaming mode, discard results instead of writing them (for throughput measurements)."
+    )
     parser_run.set_defaults(func=handle_run_application)
 
+    # 创建 'batch' 命令
+    parser_batch = subparsers.add_parser('batch', help='Process every stereo pair in a directory with a worker pool.')
+    parser_batch.add_argument(
+        'input_dir',
+        help="Directory of stereo pairs named like the calibration images (leftPic*/rightPic*)."
+    )
+    parser_batch.add_argument(
+        '-o', '--output',
+        default=None,
+        help=f"Output directory for per-pair disparity, depth and point cloud files (default: {config.BATCH_OUTPUT_DIR})."
+    )
+    parser_batch.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=None,
+        help="Number of worker processes. Overrides the default in config.py (all CPU cores)."
+    )
+    parser_batch.add_argument(
+        '--backend',
+        default=None,
+        help=f"Stereo matching backend (see 'run --help'). Overrides the default in config.py ({config.MATCHER_BACKEND})."
+    )
+    parser_batch.add_argument(
+        '--matcher-mode',
+        default=None,
+        help=f"Stereo matching mode: full, pyramid or tiled. Overrides the default in config.py ({config.MATCHER_MODE})."
+    )
+    parser_batch.add_argument(
+        '--reconstruction-mode',
+        default=None,
+        help=f"3D reconstruction mode: reproject or lut. Overrides the default in config.py ({config.RECONSTRUCTION_MODE})."
+    )
+    parser_batch.add_argument(
+        '--voxel-size',
+        type=float,
+        default=None,
+        help=f"Voxel edge length in mm for point cloud downsampling (e.g. 5); 0 or unset uses pixel-stride "
+             f"downsampling. Overrides the default in config.py ({config.POINT_CLOUD_VOXEL_SIZE})."
+    )
+    parser_batch.add_argument(
+        '--depth-only',
+        action='store_true',
+        help="Write only the disparity and depth maps, without a point cloud per pair."
+    )
+    parser_batch.set_defaults(func=handle_batch)
+
+    # 创建 'serve' 命令
+    parser_serve = subparsers.add_parser(
+        'serve', help='Run a long-lived local service that computes disparity/depth for posted stereo pairs.')
+    parser_serve.add_argument(
+        '--host',
+        default=None,
+        help=f"Address to listen on. Overrides the default in config.py ({config.SERVICE_HOST})."
+    )
+    parser_serve.add_argument(
+        '--port',
+        type=int,
+        default=None,
+        help=f"TCP port to listen on. Overrides the default in config.py ({config.SERVICE_PORT})."
+    )
+    parser_serve.add_argument(
+        '--unix',
+        default=None,
+        metavar='PATH',
+        help="Listen on a Unix domain socket at PATH instead of a TCP port."
+    )
+    parser_serve.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=None,
+        help="Number of processing threads. Overrides the default in config.py (all CPU cores)."
+    )
+    parser_serve.add_argument(
+        '--queue-size',
+        type=int,
+        default=None,
+        help=f"Requests that may wait while all workers are busy; further requests get 503. "
+             f"Overrides the default in config.py ({config.SERVICE_QUEUE_SIZE})."
+    )
+    parser_serve.add_argument(
+        '--backend',
+        default=None,
+        help=f"Stereo matching backend (see 'run --help'). Overrides the default in config.py ({config.MATCHER_BACKEND})."
+    )
+    parser_serve.add_argument(
+        '--matcher-mode',
+        default=None,
+        help=f"Stereo matching mode: full, pyramid or tiled. Overrides the default in config.py ({config.MATCHER_MODE})."
+    )
+    parser_serve.add_argument(
+        '--reconstruction-mode',
+        default=None,
+        help=f"3D reconstruction mode for /depth: reproject or lut. Overrides the default in config.py ({config.RECONSTRUCTION_MODE})."
+    )
+    parser_serve.set_defaults(func=handle_serve)
+
     # 解析命令行参数
     args = parser.parse_args()
+    configure_logging('WARNING' if args.quiet else args.log_level)
 
     # --- 根据命令行参数，设置全局的配置状态 ---
     if args.verbose:
         config.VERBOSE_MODE = True
-        print("Verbose mode is enabled.")
+        logger.info("Verbose mode is enabled.")
 
     # --- 根据解析出的命令，调用对应的处理函数 ---
     setup_environment()
-    if args.command == 'run':
-        args.func(args)
-    else:
+    if not (args.timings or args.profile):
         args.func(args)
+        return
+
+    from utils import profiling
+    # 内存跟踪会拖慢内存分配，只在需要输出阶段统计时开启，不影响 cProfile 的结果
+    if args.timings:
+        profiling.start_memory_tracking()
+    try:
+        if args.profile:
+            with profiling.cprofile_to(args.profile):
+                args.func(args)
+        else:
+            args.func(args)
+    finally:
+        profiling.stop_memory_tracking()
+        profiling.REGISTRY.log_report()
+        if args.timings:
+            profiling.REGISTRY.export(args.timings)
+
+
+class _LevelPrefixFormatter(logging.Formatter):
+    """普通信息原样输出，警告和错误加上 [Warning] / [Error] 前缀。"""
+
+    _PREFIXES = {logging.WARNING: "[Warning] ", logging.ERROR: "[Error] ", logging.CRITICAL: "[Error] "}
+
+    def format(self, record):
+        message = super().format(record)
+        return self._PREFIXES.get(record.levelno, "") + message
+
+
+def configure_logging(level=None):
+    """把所有模块的日志输出到标准输出。level 默认使用 config.LOG_LEVEL。"""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(_LevelPrefixFormatter("%(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level or config.LOG_LEVEL)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,202 @@
+# processing/batch_processor.py
+"""
+批量处理一个目录中的所有双目图像对。
+
+图像对按 leftPic*/rightPic* 命名规则以自然顺序配对（与标定图片相同），分发到进程池中处理。
+每个工作进程在启动时只创建一次校正器、匹配器和重建器，之后处理的每一对图像都复用它们，
+校正映射表也只在每个进程第一次遇到某个图像尺寸时计算（或从磁盘缓存 mmap 读取）。
+校正使用 utils.image_utils.StereoPreprocessor：先转灰度再校正，--depth-only 时不校正彩色图。
+校正、匹配和深度图的输出都写入进程内复用的 utils.frame_context.FrameContext，预热之后不再为帧数据分配内存。
+
+每一对图像的结果以输入顺序的序号命名，写入输出目录:
+    disparity_000000.png    原始视差图 (CV_16S 按位保存为 16 位 PNG)
+    depth_000000.npy        float32 深度图（毫米）
+    point_cloud_000000.ply  降采样后的点云（--depth-only 时不生成）
+    summary.json            每一对的输入文件、耗时、点数，以及整体的延迟分位数和吞吐量
+"""
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+from processing.stream_pipeline import StageStats
+
+logger = logging.getLogger(__name__)
+
+# 工作进程内的处理对象，由 _init_worker 创建，同一进程处理的所有图像对共用
+_WORKER = {}
+
+
+def process_directory(input_dir, output_dir=None, params_path=None, workers=None, backend=None,
+                      matcher_mode=None, reconstruction_mode=None, voxel_size=None, depth_only=False):
+    """
+    处理 input_dir 中的所有图像对。
+
+    Args:
+        input_dir (str): 图像对目录。
+        output_dir (str): 输出目录，默认使用 config.BATCH_OUTPUT_DIR。
+        params_path (str): 标定文件路径，默认使用 file_utils.find_stereo_params() 的结果。
+        workers (int): 进程数，默认使用 config.BATCH_WORKERS（None 表示全部 CPU 核）。
+        backend, matcher_mode: 传给 StereoMatcher；"incremental" 模式依赖相邻帧，不能用于相互独立、
+            分散在多个进程中的图像对。
+        reconstruction_mode: 传给 Reconstructor。
+        voxel_size (float): 点云降采样的体素边长，见 processing.point_cloud.reconstruction_cloud。
+        depth_only (bool): 只保存视差图和深度图，不生成点云。
+    Returns:
+        dict: 处理汇总，与写入 summary.json 的内容相同。
+    Raises:
+        ValueError: 匹配器的后端或模式无效，或者使用了 "incremental" 模式。
+    """
+    from utils import file_utils
+    from processing.stereo_matcher import StereoMatcher
+
+    # 先在主进程中创建一次，尽早发现无效的后端和模式，而不是每个工作进程各报一次错
+    if StereoMatcher(mode=matcher_mode, backend=backend).mode == "incremental":
+        raise ValueError("The 'incremental' matcher mode reuses the previous frame and cannot process "
+                         "independent image pairs; use full, pyramid or tiled for batch processing.")
+
+    output_dir = output_dir or config.BATCH_OUTPUT_DIR
+    params_path = params_path or file_utils.find_stereo_params()
+    image_pairs = file_utils.find_image_pairs(input_dir)
+    if not image_pairs:
+        raise FileNotFoundError(f"No stereo image pairs found in {input_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    settings = {
+        "params_path": params_path, "output_dir": output_dir, "backend": backend, "matcher_mode": matcher_mode,
+        "reconstruction_mode": reconstruction_mode, "voxel_size": voxel_size, "depth_only": depth_only,
+    }
+    tasks = [(index, left, right) for index, (left, right) in enumerate(image_pairs)]
+    workers = workers or config.BATCH_WORKERS or os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks)))
+
+    logger.info("Processing %d stereo pairs from %s with %d worker process(es)...", len(tasks), input_dir, workers)
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(settings, single_process=True)
+        results = [_report_progress(_process_pair(task), len(tasks)) for task in tasks]
+    else:
+        # 与角点检测相同，使用 spawn 启动子进程，避免 fork 继承 OpenCV 内部线程池的状态
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(settings,)) as executor:
+            # executor.map 按任务提交顺序返回结果
+            results = [_report_progress(result, len(tasks)) for result in executor.map(_process_pair, tasks)]
+    elapsed = time.perf_counter() - start
+
+    latency = StageStats("pair")
+    for result in results:
+        if result["error"] is None:
+            latency.record(result["latency_s"])
+    processed = latency.summary()["count"]
+    summary = {
+        "input_dir": input_dir,
+        "output_dir": output_dir,
+        "workers": workers,
+        "pairs": len(tasks),
+        "processed": processed,
+        "failed": len(tasks) - processed,
+        "elapsed_s": elapsed,
+        "pairs_per_s": processed / elapsed if elapsed > 0 else 0.0,
+        "latency": latency.summary(),
+        "results": results,
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def print_batch_report(summary):
+    """打印批处理的吞吐量和单对延迟分位数。"""
+    print("\n--- Batch Processing Report ---")
+    print(f"Pairs processed: {summary['processed']}/{summary['pairs']} in {summary['elapsed_s']:.2f} s "
+          f"with {summary['workers']} worker(s) ({summary['pairs_per_s']:.2f} pairs/s)")
+    stats = summary["latency"]
+    print(f"Per-pair latency: mean {stats['mean_ms']:.1f} ms, p50 {stats['p50_ms']:.1f} ms, "
+          f"p95 {stats['p95_ms']:.1f} ms, max {stats['max_ms']:.1f} ms")
+    for result in summary["results"]:
+        if result["error"] is not None:
+            print(f"  - Failed pair {result['index']} ({os.path.basename(result['left'])}): {result['error']}")
+    print(f"Results written to {summary['output_dir']}")
+
+
+# --- Internal Helper Functions ---
+def _init_worker(settings, single_process=False):
+    """
+    [进程池初始化函数] 在每个工作进程中创建一次校正器、匹配器和重建器。
+    必须定义在模块顶层，才能被子进程 pickle 调用。
+    """
+    import cv2
+    from utils import image_utils
+    from utils.frame_context import FrameContext
+    from processing.stereo_matcher import StereoMatcher
+    from processing.reconstructor import Reconstructor
+
+    if not single_process:
+        # 并行已经由多个进程提供，每个进程内的 OpenCV 只用一个线程，避免线程数超过 CPU 核数
+        cv2.setNumThreads(1)
+    _WORKER.clear()
+    _WORKER.update(settings)
+    # 每个进程同一时刻只处理一对图像，各阶段的结果可以写入同一个复用的缓冲区上下文
+    _WORKER["context"] = FrameContext()
+    _WORKER["preprocessor"] = image_utils.StereoPreprocessor(
+        image_utils.Rectifier.from_file(settings["params_path"]), with_color=not settings["depth_only"],
+        reuse_buffers=False)
+    _WORKER["matcher"] = StereoMatcher(mode=settings["matcher_mode"], backend=settings["backend"])
+    _WORKER["reconstructor"] = Reconstructor(mode=settings["reconstruction_mode"])
+
+
+def _process_pair(task):
+    """
+    [进程池任务] 处理一对图像并写出结果。
+    :param task: (序号, 左图路径, 右图路径)
+    :return: 该对图像的处理结果字典；出错时 error 为错误信息，不中断整个批处理。
+    """
+    import cv2
+    import numpy as np
+    from utils import ply_io
+    from processing.point_cloud import reconstruction_cloud
+
+    index, left_path, right_path = task
+    result = {"index": index, "left": left_path, "right": right_path,
+              "latency_s": None, "points": None, "error": None}
+    start = time.perf_counter()
+    try:
+        left_img = cv2.imread(left_path)
+        right_img = cv2.imread(right_path)
+        if left_img is None or right_img is None:
+            raise FileNotFoundError("could not read image pair")
+
+        context = _WORKER["context"]
+        context.begin_frame()
+        left_gray, right_gray, left_color, Q = _WORKER["preprocessor"].process(left_img, right_img, context=context)
+        disparity_map = _WORKER["matcher"].compute_disparity(left_gray, right_gray, context=context)
+        reconstructor = _WORKER["reconstructor"]
+
+        output_dir = _WORKER["output_dir"]
+        # PNG 不支持有符号 16 位，按位重新解释为 uint16 保存，读取后 view(np.int16) 即可还原
+        cv2.imwrite(os.path.join(output_dir, f"disparity_{index:06d}.png"), disparity_map.view(np.uint16))
+        np.save(os.path.join(output_dir, f"depth_{index:06d}.npy"),
+                reconstructor.reconstruct_depth(disparity_map, Q, context=context))
+        if not _WORKER["depth_only"]:
+            reconstruction = reconstructor.reconstruct_lazy(disparity_map, left_color, Q)
+            points, colors, _ = reconstruction_cloud(reconstruction, _WORKER["voxel_size"])
+            ply_io.write_ply(os.path.join(output_dir, f"point_cloud_{index:06d}.ply"), points, colors)
+            result["points"] = len(points)
+    except (OSError, ValueError, cv2.error) as e:
+        result["error"] = str(e)
+    result["latency_s"] = time.perf_counter() - start
+    return result
+
+
+def _report_progress(result, total):
+    """[内部辅助函数] 打印单对图像的处理进度，原样返回结果。"""
+    name = os.path.basename(result["left"])
+    if result["error"] is None:
+        logger.debug("  [%d/%d] %s: %.1f ms", result['index'] + 1, total, name, result['latency_s'] * 1000)
+    else:
+        logger.warning("  [%d/%d] %s: failed (%s)", result['index'] + 1, total, name, result['error'])
+    return result
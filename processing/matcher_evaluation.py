@@ -0,0 +1,118 @@
+# processing/matcher_evaluation.py
+"""
+用带真值视差的合成场景 (utils/synthetic_stereo.py) 评估立体匹配的精度和速度，
+用来在调整 config.SGBM_* 等参数、选择匹配后端和模式时权衡吞吐量与精度损失。
+"""
+import contextlib
+import time
+
+import numpy as np
+
+import config
+from utils import image_utils
+from utils.synthetic_stereo import render_with_calibration, make_rectified_pair
+
+# 坏点率的阈值（像素）
+BAD_PIXEL_THRESHOLDS = (0.5, 1.0, 2.0, 3.0)
+
+
+def evaluate_disparity(disparity_map, ground_truth, valid, min_disparity, thresholds=BAD_PIXEL_THRESHOLDS):
+    """
+    比较一张 CV_16S 视差图与真值视差。
+
+    Args:
+        disparity_map (np.ndarray): 匹配器输出的视差图（真实视差 * 16）。
+        ground_truth (np.ndarray): 真值视差（像素，float）。
+        valid (np.ndarray): 参与评估的像素（在右图中可见的像素）。
+        min_disparity (int): 匹配器的最小视差，小于它的输出视为无效（没有匹配结果）。
+        thresholds (tuple): 计算坏点率的误差阈值（像素）。
+    Returns:
+        dict: density 为有匹配结果的像素比例；epe_px 为这些像素的平均端点误差 (end-point error)；
+              bad_N 为误差大于 N 像素或没有匹配结果的像素比例（没有结果也算坏点，稀疏的结果不会显得更准）。
+    """
+    valid = np.asarray(valid, dtype=bool)
+    total = int(valid.sum())
+    if total == 0:
+        raise ValueError("No valid ground-truth pixels to evaluate.")
+    matched = valid & (disparity_map >= min_disparity * 16)
+    error = np.abs(disparity_map[matched].astype(np.float32) / 16.0 - ground_truth[matched])
+
+    report = {
+        "pixels": total,
+        "density": float(matched.sum()) / total,
+        "epe_px": float(error.mean()) if error.size else float("nan"),
+    }
+    unmatched = total - error.size
+    for threshold in thresholds:
+        report[f"bad_{threshold:g}"] = (float((error > threshold).sum()) + unmatched) / total
+    return report
+
+
+def make_scenes(count, image_size, num_disparities=None, min_disparity=None, stereo_params=None, seed=0):
+    """
+    生成 count 个合成场景。提供 stereo_params 时返回原始（未校正）图像，评估会包含校正过程；
+    否则直接返回校正后的图像对。
+    :return: [utils.synthetic_stereo.SyntheticPair 或 SyntheticCapture]
+    """
+    width, height = image_size
+    if stereo_params is None:
+        return [make_rectified_pair(width, height, num_disparities, min_disparity, seed=seed + i) for i in range(count)]
+    return [render_with_calibration(stereo_params, image_size, num_disparities, min_disparity, seed=seed + i)
+            for i in range(count)]
+
+
+def evaluate_matcher(matcher, scenes, stereo_params=None, repeats=1):
+    """
+    在一组合成场景上运行匹配器，汇总精度和耗时。
+
+    Args:
+        matcher (StereoMatcher): 要评估的匹配器。
+        scenes (list): make_scenes 生成的场景。
+        stereo_params (dict): 场景为原始图像时使用的标定参数，先校正再匹配（校正耗时单独统计）。
+        repeats (int): 每个场景计时的次数，耗时取最短的一次。
+    Returns:
+        dict: 各场景精度指标的平均值，以及 match_ms（每对图像匹配耗时的中位数）和 rectify_ms。
+    """
+    rectifier = None if stereo_params is None else image_utils.Rectifier(stereo_params=stereo_params, persist=False)
+    reports, match_times, rectify_times = [], [], []
+    for scene in scenes:
+        left, right = scene.left, scene.right
+        if rectifier is not None:
+            start = time.perf_counter()
+            left, right, _ = rectifier.rectify(left, right)
+            rectify_times.append(time.perf_counter() - start)
+
+        best = None
+        for _ in range(max(repeats, 1)):
+            start = time.perf_counter()
+            disparity_map = matcher.compute_disparity(left, right)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        match_times.append(best)
+        reports.append(evaluate_disparity(disparity_map, scene.disparity, scene.valid, matcher.min_disparity))
+
+    summary = {key: float(np.mean([report[key] for report in reports])) for key in reports[0]}
+    summary["scenes"] = len(scenes)
+    summary["match_ms"] = float(np.median(match_times)) * 1000.0
+    summary["rectify_ms"] = float(np.median(rectify_times)) * 1000.0 if rectify_times else None
+    return summary
+
+
+@contextlib.contextmanager
+def config_overrides(**overrides):
+    """
+    临时修改 config 中的参数（例如 SGBM_BLOCK_SIZE=7），退出 with 块时恢复原值。
+    匹配器在创建时读取 config，所以要在 with 块内创建匹配器。
+    注意 SGBM_P1 / SGBM_P2 在 config.py 中由 SGBM_BLOCK_SIZE 计算，修改块大小时需要同时给出它们。
+    """
+    unknown = [name for name in overrides if not hasattr(config, name)]
+    if unknown:
+        raise ValueError(f"Unknown config parameter(s): {', '.join(unknown)}")
+    previous = {name: getattr(config, name) for name in overrides}
+    try:
+        for name, value in overrides.items():
+            setattr(config, name, value)
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(config, name, value)
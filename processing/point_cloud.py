@@ -0,0 +1,103 @@
+# processing/point_cloud.py
+import numpy as np
+
+import config
+from utils import profiling
+
+# 稠密计数数组最多允许比点数大这么多倍，超过时改用排序去重
+_DENSE_GRID_FACTOR = 8
+
+
+def reconstruction_cloud(reconstruction, voxel_size=None):
+    """
+    从惰性重建结果生成要保存的点云：按体素栅格降采样，体素大小为 0 或 None 时按像素步长降采样。
+    :param reconstruction: processing.reconstructor.ReconstructionResult。
+    :param voxel_size: 体素边长（毫米），默认使用 config.POINT_CLOUD_VOXEL_SIZE。
+    :return: (points, colors, 降采样前的点数)
+    """
+    voxel_size = config.POINT_CLOUD_VOXEL_SIZE if voxel_size is None else voxel_size
+    if voxel_size:
+        points_filtered, colors_filtered = reconstruction.filtered_cloud()
+        points, colors = voxel_downsample(points_filtered, colors_filtered, voxel_size)
+        return points, colors, len(points_filtered)
+    # 降采样在重投影之前完成，只计算需要保存的点
+    points, colors = reconstruction.filtered_cloud(stride=config.POINT_CLOUD_DOWNSAMPLE_FACTOR)
+    return points, colors, len(points)
+
+
+@profiling.timed("voxel_downsample")
+def voxel_downsample(points, colors, voxel_size):
+    """
+    体素栅格降采样：把空间划分为边长 voxel_size 的立方体，每个非空体素输出一个点，
+    坐标为体素内所有点的质心，颜色为平均颜色。
+
+    完全使用 NumPy 向量化实现，不依赖 Open3D。量化后的整数坐标被编码为一个线性键：
+    占据的包围盒不大时直接用 np.bincount 在稠密数组上累加，整体为 O(N)；
+    包围盒很大且点很稀疏时改用 np.unique 对键去重。
+
+    Args:
+        points (np.ndarray): Nx3 的点坐标。
+        colors (np.ndarray): Nx3 的颜色 (uint8)，可以为 None。
+        voxel_size (float): 体素边长，单位与点坐标相同（毫米）。
+    Returns:
+        tuple: (points, colors)，分别为 Mx3 float32 的质心和 Mx3 的平均颜色（与输入颜色同类型），
+               按体素键排序；colors 为 None 时返回的颜色也为 None。
+    """
+    if voxel_size <= 0:
+        raise ValueError(f"voxel_size must be positive, got {voxel_size}")
+    points = np.asarray(points)
+    # 无穷远点无法量化，先剔除
+    finite = np.isfinite(points).all(axis=1)
+    if not finite.all():
+        points = points[finite]
+        colors = None if colors is None else np.asarray(colors)[finite]
+    if len(points) == 0:
+        empty_colors = None if colors is None else np.asarray(colors)[:0]
+        return points.astype(np.float32).reshape(0, 3), empty_colors
+
+    # --- 量化并编码为线性键 ---
+    origin = points.min(axis=0)
+    voxel_coords = ((points - origin) / voxel_size).astype(np.int64)
+    grid_shape = voxel_coords.max(axis=0) + 1
+    keys = (voxel_coords[:, 0] * grid_shape[1] + voxel_coords[:, 1]) * grid_shape[2] + voxel_coords[:, 2]
+
+    # --- 为每个点分配体素编号 ---
+    cell_count = int(np.prod(grid_shape, dtype=np.float64))
+    if cell_count <= _DENSE_GRID_FACTOR * len(points):
+        counts = np.bincount(keys, minlength=cell_count)
+        occupied = np.flatnonzero(counts)
+        # 把稀疏的键压缩为 0..M-1 的连续编号
+        compact = np.zeros(cell_count, dtype=np.int64)
+        compact[occupied] = np.arange(len(occupied))
+        voxel_index = compact[keys]
+        counts = counts[occupied]
+    else:
+        _, voxel_index, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        voxel_index = voxel_index.ravel()
+
+    # --- 累加求平均 ---
+    voxel_count = len(counts)
+    downsampled_points = _mean_per_voxel(points, voxel_index, counts, voxel_count).astype(np.float32)
+    if colors is None:
+        return downsampled_points, None
+    colors = np.asarray(colors)
+    downsampled_colors = _mean_per_voxel(colors, voxel_index, counts, voxel_count)
+    if np.issubdtype(colors.dtype, np.integer):
+        downsampled_colors = np.rint(downsampled_colors)
+    return downsampled_points, downsampled_colors.astype(colors.dtype)
+
+
+def stride_downsample(points, colors, factor):
+    """按固定间隔取点，即原先 main.py 中使用的降采样方式，保留作为对比。"""
+    if factor <= 1:
+        return points, colors
+    return points[::factor], None if colors is None else colors[::factor]
+
+
+# --- Internal Helper Functions ---
+def _mean_per_voxel(values, voxel_index, counts, voxel_count):
+    """[内部辅助函数] 对每个体素内的 Nx3 数值逐列求平均。"""
+    sums = np.empty((voxel_count, values.shape[1]), dtype=np.float64)
+    for channel in range(values.shape[1]):
+        sums[:, channel] = np.bincount(voxel_index, weights=values[:, channel], minlength=voxel_count)
+    return sums / counts[:, np.newaxis]
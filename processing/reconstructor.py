@@ -1,35 +1,344 @@
 # processing/reconstructor.py
+import logging
 import cv2
 import numpy as np
 import config
+from utils import profiling
+from utils.frame_context import context_buffer
+
+logger = logging.getLogger(__name__)
+
+
+class DisparityLUT:
+    """
+    视差到三维坐标的查找表。
+
+    对于校正后的双目，Q 矩阵的形式为
+        [[1, 0, 0,   -cx],
+         [0, 1, 0,   -cy],
+         [0, 0, 0,     f],
+         [0, 0, a,     b]]
+    因此 W = a * d + b 只与视差有关：Z = f / W，X = (x - cx) / W，Y = (y - cy) / W。
+    CV_16S 视差只有 65536 种取值，预先算好每种取值对应的 1/W 和 Z，
+    再配合按列、按行的 (x - cx)、(y - cy) 向量，就不需要对每个像素做 4x4 矩阵乘法。
+    """
+
+    def __init__(self, Q_matrix):
+        Q = np.asarray(Q_matrix, dtype=np.float64)
+        if not self.is_supported(Q):
+            raise ValueError("Q matrix is not in the rectified form required by the lookup table.")
+
+        # 以 uint16 的位模式作为下标，覆盖所有 int16 视差值（包括无效值）
+        codes = np.arange(1 << 16, dtype=np.uint16).view(np.int16).astype(np.float64)
+        w = Q[3, 2] * (codes / 16.0) + Q[3, 3]
+        with np.errstate(divide='ignore'):
+            inv_w = 1.0 / w
+        self.inv_w = inv_w.astype(np.float32)
+        self.depth = (Q[2, 3] * inv_w).astype(np.float32)
+        self.Q = Q
+
+    @staticmethod
+    def is_supported(Q_matrix):
+        """判断 Q 矩阵是否满足“深度只与视差有关”的校正形式。"""
+        Q = np.asarray(Q_matrix, dtype=np.float64)
+        zero_entries = [(0, 1), (0, 2), (1, 0), (1, 2), (2, 0), (2, 1), (2, 2), (3, 0), (3, 1)]
+        return Q.shape == (4, 4) and all(Q[i, j] == 0 for i, j in zero_entries)
+
+    def depth_map(self, disparity_map, context=None):
+        """只计算深度 Z (HxW float32)，context 不为 None 时写入其中的缓冲区。"""
+        return np.take(self.depth, self._indices(disparity_map, context), mode='clip',
+                       out=context_buffer(context, "reconstruct.depth", disparity_map.shape[:2], np.float32))
+
+    def points(self, disparity_map, origin=(0, 0), stride=1, context=None):
+        """
+        计算 HxWx3 的三维点矩阵，与 cv2.reprojectImageTo3D 的结果一致（在浮点误差范围内）。
+
+        disparity_map 也可以是原视差图的一个子网格：第 (i, j) 个元素对应原图像素
+        (origin[0] + stride * j, origin[1] + stride * i)。
+        context (utils.frame_context.FrameContext) 不为 None 时，中间结果和点矩阵都写入其中的缓冲区。
+        """
+        height, width = disparity_map.shape[:2]
+        shape = (height, width)
+        Q = self.Q
+        x0, y0 = origin
+        # 每个像素只做一次查表，X、Y、Z 都由 1/W 乘以对应的系数得到
+        inv_w = np.take(self.inv_w, self._indices(disparity_map, context), mode='clip',
+                        out=context_buffer(context, "reconstruct.inv_w", shape, np.float32))
+
+        x_coefficients = (Q[0, 0] * (x0 + stride * np.arange(width)) + Q[0, 3]).astype(np.float32)
+        y_coefficients = (Q[1, 1] * (y0 + stride * np.arange(height)) + Q[1, 3]).astype(np.float32)
+
+        # 先按平面连续地计算 X、Y、Z，再用 cv2.merge 交织成 HxWx3，比直接写入跨步的通道视图快得多
+        with np.errstate(invalid='ignore'):
+            x = np.multiply(inv_w, x_coefficients[np.newaxis, :],
+                            out=context_buffer(context, "reconstruct.x", shape, np.float32))
+            y = np.multiply(inv_w, y_coefficients[:, np.newaxis],
+                            out=context_buffer(context, "reconstruct.y", shape, np.float32))
+            z = np.multiply(inv_w, np.float32(Q[2, 3]),
+                            out=context_buffer(context, "reconstruct.z", shape, np.float32))
+        return cv2.merge((x, y, z), dst=context_buffer(context, "reconstruct.points", shape + (3,), np.float32))
+
+    @staticmethod
+    def _indices(disparity_map, context):
+        """
+        [内部辅助函数] 以 uint16 位模式表示的查表下标，总在表的范围内，因此查表使用 mode='clip'
+        （默认的 mode='raise' 即使给了 out 也会先写入临时数组）。np.take 还会把非 intp 类型的下标转换为新数组，
+        使用 context 时预先转换到其中的缓冲区。
+        """
+        indices = disparity_map.view(np.uint16)
+        if context is None:
+            return indices
+        buffer = context.buffer("reconstruct.lut_indices", indices.shape, np.intp)
+        np.copyto(buffer, indices)
+        return buffer
+
+
+class ReconstructionResult:
+    """
+    惰性的重建结果，只在被访问时计算所需的部分。
+
+    reconstruct() 会一次性生成完整的 HxWx3 点矩阵和过滤后的点列表，
+    而大多数调用者只需要其中一小部分：交互式深度图只查询鼠标下的一个像素，
+    保存点云时也会先降采样。这个对象只保存视差图和左图的引用，
+    降采样和 ROI 裁剪在重投影之前完成，因此峰值内存只与实际取出的点数有关。
+
+    像素坐标约定与 OpenCV 一致：x 为列，y 为行；ROI 为 (x, y, width, height)。
+    视差图也可以只覆盖校正后图像中的一个区域（见 StereoMatcher.compute_disparity_roi），此时 origin 为它的左上角，
+    point_at、subset 和 filtered_cloud 的像素坐标和 ROI 仍使用整幅图像的坐标，三维坐标与整幅计算时相同。
+    """
+
+    def __init__(self, disparity_map, left_rectified_img, Q_matrix, lut=None, origin=(0, 0), invalid_disparity=None):
+        self.disparity_map = disparity_map
+        self.left_rectified_img = left_rectified_img
+        self.Q = np.asarray(Q_matrix, dtype=np.float64)
+        self.origin = tuple(int(v) for v in origin)
+        self._lut = lut
+        # 为 None 时取视差图中的最小值；只覆盖一个区域的视差图不一定包含无效值，需要明确给出
+        self._invalid_disparity = invalid_disparity
+
+    @property
+    def shape(self):
+        """与完整点矩阵相同的形状 (H, W, 3)。"""
+        return self.disparity_map.shape[:2] + (3,)
+
+    def __getitem__(self, index):
+        """支持 result[y, x]，返回该像素的 (X, Y, Z)，与完整点矩阵的索引方式相同。"""
+        y, x = index
+        return self.point_at(x, y)
+
+    def point_at(self, x, y):
+        """只计算单个像素的三维坐标，返回长度为 3 的 float32 数组。"""
+        height, width = self.disparity_map.shape[:2]
+        column, row = x - self.origin[0], y - self.origin[1]
+        if not (0 <= column < width and 0 <= row < height):
+            raise IndexError(f"Pixel ({x}, {y}) is outside the {width}x{height} disparity map at {self.origin}.")
+        return self._reproject(self.disparity_map[row:row + 1, column:column + 1], (x, y), 1)[0, 0]
+
+    @profiling.timed("reconstruct.depth_map")
+    def depth_map(self):
+        """HxW 的 float32 深度图 Z。"""
+        if self._lut is not None:
+            return self._lut.depth_map(self.disparity_map)
+        return self.points_matrix()[:, :, 2]
+
+    def points_matrix(self):
+        """完整的 HxWx3 点矩阵，等价于 reconstruct() 返回的第一个结果。"""
+        return self._reproject(self.disparity_map, self.origin, 1)
+
+    def subset(self, stride=1, roi=None):
+        """
+        在 ROI 内按步长取子网格并重投影。
+
+        Args:
+            stride (int): 行和列方向的采样步长，例如 4 表示每 4x4 的像素区域只取一个点。
+            roi (tuple): (x, y, width, height)，None 表示整幅图像。
+        Returns:
+            tuple: (points, colors)，分别为 hxwx3 的 float32 点矩阵和 hxwx3 的 RGB 颜色。
+        """
+        disparity, origin = self._sample(self.disparity_map, stride, roi)
+        points = self._reproject(disparity, origin, stride)
+        # 在通道反序的视图上采样，只有取出的像素被复制，整幅图像不需要转换为 RGB
+        colors, _ = self._sample(self.left_rectified_img[:, :, ::-1], stride, roi)
+        return points, colors
+
+    @profiling.timed("reconstruct.filtered_cloud")
+    def filtered_cloud(self, stride=1, roi=None):
+        """
+        过滤掉无效视差和过远的点，返回 (points, colors) 两个 Nx3 数组，
+        与 reconstruct() 返回的第二个结果的过滤规则相同。
+        """
+        disparity, origin = self._sample(self.disparity_map, stride, roi)
+        mask = disparity > self._get_invalid_disparity()
+        points = self._reproject(disparity, origin, stride)[mask]
+        colors = self.left_rectified_img[:, :, ::-1]
+        if stride > 1 or roi is not None:
+            colors, _ = self._sample(colors, stride, roi)
+        colors = colors[mask]
+
+        near_mask = points[:, 2] < config.POINT_CLOUD_MAX_DEPTH
+        return points[near_mask], colors[near_mask]
+
+    # --- Internal Helper Functions ---
+    def _get_invalid_disparity(self):
+        """[内部辅助函数] 与 reconstruct() 一致，把整幅视差图中的最小值视为无效值。"""
+        if self._invalid_disparity is None:
+            self._invalid_disparity = self.disparity_map.min()
+        return self._invalid_disparity
+
+    def _sample(self, image, stride, roi):
+        """[内部辅助函数] 返回 ROI 内按步长采样的连续数组，以及子网格左上角在原图中的坐标。"""
+        if stride < 1:
+            raise ValueError(f"stride must be >= 1, got {stride}")
+        origin_x, origin_y = self.origin
+        x, y = 0, 0
+        if roi is not None:
+            # ROI 为整幅图像坐标，换算到视差图内并裁剪到视差图覆盖的范围
+            roi_x, roi_y, width, height = roi
+            x, y = max(roi_x - origin_x, 0), max(roi_y - origin_y, 0)
+            image = image[y:max(roi_y - origin_y + height, y), x:max(roi_x - origin_x + width, x)]
+        return np.ascontiguousarray(image[::stride, ::stride]), (origin_x + x, origin_y + y)
+
+    def _reproject(self, disparity, origin, stride):
+        """[内部辅助函数] 重投影子网格视差。子网格坐标到原图坐标的变换被合并进 Q 矩阵。"""
+        if self._lut is not None:
+            return self._lut.points(disparity, origin, stride)
+        x0, y0 = origin
+        grid_to_image = np.array([[stride, 0, 0, x0],
+                                  [0, stride, 0, y0],
+                                  [0, 0, 1, 0],
+                                  [0, 0, 0, 1]], dtype=np.float64)
+        true_disparity = disparity.astype(np.float32) / 16.0
+        return cv2.reprojectImageTo3D(true_disparity, self.Q @ grid_to_image)
+
 
 class Reconstructor:
-    def __init__(self):
-        print("Initializing Reconstructor...")
+    # 支持的重建模式
+    MODES = ("reproject", "lut")
+
+    def __init__(self, mode=None):
+        """
+        Args:
+            mode (str): "reproject" 使用 cv2.reprojectImageTo3D；"lut" 使用按 Q 预计算的查找表，
+                        速度更快、临时内存更少。默认使用 config.RECONSTRUCTION_MODE。
+        """
+        self.mode = mode or config.RECONSTRUCTION_MODE
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown reconstruction mode '{self.mode}'. Available modes: {', '.join(self.MODES)}")
+        logger.debug("Initializing Reconstructor (mode: %s)...", self.mode)
+        self._lut = None
 
-    def reconstruct(self, disparity_map, left_rectified_img, Q_matrix):
+    @profiling.timed("reconstruct")
+    def reconstruct(self, disparity_map, left_rectified_img, Q_matrix, context=None):
         """
         [升级版] 返回两种形式的点云数据：
         1. 原始的、与图像对应的3D矩阵（用于交互式查找）。
         2. 经过过滤和清理的点列表（用于保存和3D可视化）。
+
+        context (utils.frame_context.FrameContext) 不为 None 时，点矩阵、掩码和过滤后的点列表都写入其中的缓冲区
+        （过滤后的点列表是缓冲区前 N 行的视图），下一次使用同一上下文时会被覆盖。
         """
+        height, width = disparity_map.shape[:2]
+        shape = (height, width)
         # --- 生成原始的3D点矩阵 ---
-        true_disparity_map = disparity_map.astype(np.float32) / 16.0
+        lut = self._get_lut(Q_matrix)
+        if lut is not None:
+            points_3D_matrix = lut.points(disparity_map, context=context)
+            # 与 true_disparity_map > true_disparity_map.min() 等价，但不需要转换成浮点视差
+            mask = np.greater(disparity_map, disparity_map.min(),
+                              out=context_buffer(context, "reconstruct.mask", shape, bool))
+        else:
+            true_disparity_map = np.multiply(disparity_map, np.float32(1 / 16.0),
+                                             out=context_buffer(context, "reconstruct.disparity", shape, np.float32))
+            points_3D_matrix = cv2.reprojectImageTo3D(
+                true_disparity_map, Q_matrix,
+                _3dImage=context_buffer(context, "reconstruct.points", shape + (3,), np.float32)
+            )
+            mask = np.greater(true_disparity_map, true_disparity_map.min(),
+                              out=context_buffer(context, "reconstruct.mask", shape, bool))
 
-        points_3D_matrix = cv2.reprojectImageTo3D(true_disparity_map, Q_matrix)
-        colors_matrix = cv2.cvtColor(left_rectified_img, cv2.COLOR_BGR2RGB)
+        # (可选) 同时过滤远点：先合并两个掩码，点和颜色都只需要取一次
+        with np.errstate(invalid='ignore'):
+            near_mask = np.less(points_3D_matrix[:, :, 2], config.POINT_CLOUD_MAX_DEPTH,
+                                out=context_buffer(context, "reconstruct.near_mask", shape, bool))
+        np.logical_and(mask, near_mask, out=mask)
 
         # --- 过滤无效点，生成干净的点列表 ---
-        mask = true_disparity_map > true_disparity_map.min()
-        points_3D_filtered = points_3D_matrix[mask]
-        colors_filtered = colors_matrix[mask]
-
-        # (可选) 进一步过滤远点
-        z_max_threshold = 1000.0
-        far_points_mask = points_3D_filtered[:, 2] < z_max_threshold
-        points_3D_filtered = points_3D_filtered[far_points_mask]
-        colors_filtered = colors_filtered[far_points_mask]
+        if context is None:
+            points_3D_filtered = points_3D_matrix[mask]
+            # 在通道反序 (BGR -> RGB) 的视图上按掩码取值，只复制有效像素，不需要整幅转换颜色
+            colors_filtered = left_rectified_img[:, :, ::-1][mask]
+        else:
+            points_3D_filtered, colors_filtered = _filter_into(context, mask, points_3D_matrix, left_rectified_img)
 
         # --- 返回两种数据 ---
         # 注意：不在这里做降采样，降采样可以移到保存或显示之前，让数据更纯粹
         return points_3D_matrix, (points_3D_filtered, colors_filtered)
+
+    def reconstruct_lazy(self, disparity_map, left_rectified_img, Q_matrix, origin=(0, 0), invalid_disparity=None):
+        """
+        返回惰性的 ReconstructionResult，不预先生成任何点矩阵。
+        适合只需要单点查询、降采样点云或局部区域的场景，可以显著降低大分辨率图像的峰值内存。
+        只计算了 ROI 的视差图时，origin 为 ROI 的左上角，invalid_disparity 为匹配器的无效视差值。
+        """
+        return ReconstructionResult(disparity_map, left_rectified_img, Q_matrix, lut=self._get_lut(Q_matrix),
+                                    origin=origin, invalid_disparity=invalid_disparity)
+
+    @profiling.timed("reconstruct_depth")
+    def reconstruct_depth(self, disparity_map, Q_matrix, context=None):
+        """
+        只计算深度图，供不需要 X/Y 坐标的使用者调用。
+        context (utils.frame_context.FrameContext) 不为 None 时结果写入其中的缓冲区。
+
+        Returns:
+            np.ndarray: HxW 的 float32 深度图 Z（单位与标定时的方格尺寸相同，即毫米）。
+        """
+        shape = disparity_map.shape[:2]
+        lut = self._get_lut(Q_matrix)
+        if lut is not None:
+            return lut.depth_map(disparity_map, context=context)
+        true_disparity_map = np.multiply(disparity_map, np.float32(1 / 16.0),
+                                         out=context_buffer(context, "reconstruct.disparity", shape, np.float32))
+        points = cv2.reprojectImageTo3D(true_disparity_map, Q_matrix,
+                                        _3dImage=context_buffer(context, "reconstruct.points", shape + (3,),
+                                                                np.float32))
+        return points[:, :, 2]
+
+    def _get_lut(self, Q_matrix):
+        """返回与 Q 对应的查找表；"reproject" 模式或 Q 不满足校正形式时返回 None。"""
+        if self.mode != "lut":
+            return None
+        if self._lut is not None and np.array_equal(self._lut.Q, Q_matrix):
+            return self._lut
+        if not DisparityLUT.is_supported(Q_matrix):
+            logger.warning("Q matrix is not in rectified form, falling back to reprojectImageTo3D.")
+            return None
+        self._lut = DisparityLUT(Q_matrix)
+        return self._lut
+
+
+def _filter_into(context, mask, points_3D_matrix, left_rectified_img):
+    """
+    [内部辅助函数] 与 points_3D_matrix[mask] 和 left_rectified_img[:, :, ::-1][mask] 的结果相同，
+    但写入 context 中按整幅图像大小分配的缓冲区，返回前 N 行的视图。
+    布尔索引和 np.compress 每次都会分配结果和下标数组，这里用 cv2.findNonZero 把有效像素的坐标写入缓冲区，
+    再用 np.take 按下标取值；颜色从连续的 BGR 图像中取出后原地转换为 RGB。
+    """
+    height, width = mask.shape
+    size = height * width
+    mask_u8 = mask.view(np.uint8)
+    count = cv2.countNonZero(mask_u8)
+    points = context.buffer("reconstruct.points_filtered", (size, 3), np.float32)[:count]
+    colors = context.buffer("reconstruct.colors_filtered", (size, 3), left_rectified_img.dtype)[:count]
+    coordinates = context.buffer("reconstruct.coordinates", (size, 1, 2), np.int32)[:count]
+    indices = context.buffer("reconstruct.indices", (size,), np.intp)[:count]
+    if count == 0:
+        return points, colors
+
+    cv2.findNonZero(mask_u8, coordinates)
+    np.multiply(coordinates[:, 0, 1], width, out=indices)
+    np.add(indices, coordinates[:, 0, 0], out=indices)
+    # 下标一定在范围内；mode='clip' 时 np.take 直接写入 out，不经过临时数组
+    np.take(points_3D_matrix.reshape(-1, 3), indices, axis=0, out=points, mode='clip')
+    np.take(left_rectified_img.reshape(-1, 3), indices, axis=0, out=colors, mode='clip')
+    cv2.cvtColor(colors.reshape(-1, 1, 3), cv2.COLOR_BGR2RGB, dst=colors.reshape(-1, 1, 3))
+    return points, colors
@@ -0,0 +1,120 @@
+# processing/roi_pipeline.py
+"""
+只处理校正后图像中一个区域（例如检测到的物体的包围框）的双目流程。
+
+StereoMatcher.roi_window 给出计算 ROI 的视差所需的窗口（左侧包含完整的视差搜索范围，上下包含匹配块的余量），
+Rectifier.rectify_region 只校正这个窗口（右图窗口向左平移最小视差），匹配后只保留 ROI 内的视差。
+重建时把 ROI 的左上角作为 origin 传给 Reconstructor.reconstruct_lazy，像素坐标和三维坐标都与整幅处理时一致。
+"""
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from processing.stereo_matcher import compare_disparity_maps
+
+# roi: 裁剪到图像内的 (x, y, width, height)；disparity: ROI 大小的 CV_16S 视差图；
+# left_rectified: ROI 内的校正后左图；timings: 校正和匹配的耗时（秒）
+RoiResult = namedtuple("RoiResult", ["roi", "disparity", "left_rectified", "Q", "timings"])
+
+
+def parse_roi(text):
+    """解析 "x,y,w,h" 形式的 ROI。"""
+    try:
+        roi = tuple(int(value) for value in text.split(","))
+    except ValueError:
+        roi = ()
+    if len(roi) != 4 or roi[2] <= 0 or roi[3] <= 0:
+        raise ValueError(f"Invalid ROI '{text}'. Please use 'x,y,width,height' with a positive width and height.")
+    return roi
+
+
+def clip_roi(roi, image_size):
+    """把 ROI 裁剪到图像范围内，完全在图像外时抛出 ValueError。"""
+    x, y, width, height = roi
+    image_width, image_height = image_size
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, image_width), min(y + height, image_height)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"ROI {roi} does not overlap the {image_width}x{image_height} image.")
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def process_roi(rectifier, matcher, left_img, right_img, roi):
+    """
+    只校正和匹配计算 ROI 所需的窗口。
+
+    Args:
+        rectifier (utils.image_utils.Rectifier): 校正器。
+        matcher (processing.stereo_matcher.StereoMatcher): 匹配器，使用它的后端和视差范围。
+        left_img, right_img (np.ndarray): 原始（未校正）的左右图像。
+        roi (tuple): (x, y, width, height)，校正后左图的坐标。
+    Returns:
+        RoiResult
+    """
+    height, width = left_img.shape[:2]
+    roi = clip_roi(roi, (width, height))
+    timings = {}
+
+    start = time.perf_counter()
+    window = matcher.roi_window(roi, (width, height))
+    left_window, right_window, Q = rectifier.rectify_region(left_img, right_img, window,
+                                                            right_shift=matcher.min_disparity)
+    timings["rectify"], start = time.perf_counter() - start, time.perf_counter()
+    disparity = matcher.compute_disparity_roi(left_window, right_window, window, roi)
+    timings["match"] = time.perf_counter() - start
+
+    x, y, roi_width, roi_height = roi
+    left_rectified = left_window[y - window[1]:y - window[1] + roi_height, x - window[0]:x - window[0] + roi_width]
+    return RoiResult(roi, disparity, np.ascontiguousarray(left_rectified), Q, timings)
+
+
+def paste_roi(values, roi, image_size, fill_value):
+    """把 ROI 大小的数组放回整幅图像大小的数组中，ROI 之外填充 fill_value。"""
+    x, y, width, height = roi
+    image_width, image_height = image_size
+    full = np.full((image_height, image_width) + values.shape[2:], fill_value, dtype=values.dtype)
+    full[y:y + height, x:x + width] = values
+    return full
+
+
+def compare_with_full_frame(rectifier, matcher, left_img, right_img, result):
+    """
+    对同一对图像做整幅校正和匹配，与 ROI 处理比较耗时，并比较 ROI 内两者视差的差异。
+
+    Returns:
+        dict: 两种方式各阶段的耗时、加速比以及 compare_disparity_maps 给出的差异统计。
+    """
+    start = time.perf_counter()
+    left_rectified, right_rectified, _ = rectifier.rectify(left_img, right_img)
+    rectify_time, start = time.perf_counter() - start, time.perf_counter()
+    disparity = matcher.compute_disparity(left_rectified, right_rectified)
+    match_time = time.perf_counter() - start
+
+    x, y, width, height = result.roi
+    report = compare_disparity_maps(disparity[y:y + height, x:x + width], result.disparity, matcher.min_disparity)
+    roi_time = sum(result.timings.values())
+    report.update({
+        "roi": result.roi,
+        "image_size": left_img.shape[1::-1],
+        "full_rectify_ms": rectify_time * 1000.0,
+        "full_match_ms": match_time * 1000.0,
+        "roi_rectify_ms": result.timings["rectify"] * 1000.0,
+        "roi_match_ms": result.timings["match"] * 1000.0,
+        "speedup": (rectify_time + match_time) / roi_time if roi_time > 0 else float("inf"),
+    })
+    return report
+
+
+def print_roi_report(report):
+    """打印 ROI 处理与整幅处理的耗时对比。"""
+    x, y, width, height = report["roi"]
+    image_width, image_height = report["image_size"]
+    print(f"\n--- ROI Report ({width}x{height} at ({x}, {y}) vs full {image_width}x{image_height} frame) ---")
+    print(f"  - Rectify:             full {report['full_rectify_ms']:.1f} ms, ROI {report['roi_rectify_ms']:.1f} ms")
+    print(f"  - Match:               full {report['full_match_ms']:.1f} ms, ROI {report['roi_match_ms']:.1f} ms")
+    print(f"  - Speedup:             x{report['speedup']:.2f}")
+    print(f"  - Valid pixels in ROI: full {report['reference_valid_ratio']:.1%}, "
+          f"ROI {report['candidate_valid_ratio']:.1%}")
+    print(f"  - Mean |diff|:         {report['mean_abs_diff_px']:.3f} px")
+    print(f"  - Bad pixels (>1 px):  {report['bad_pixel_rate']:.2%}")
@@ -1,48 +1,609 @@
 # processing/stereo_matcher.py
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 import config
+from utils import profiling
+from utils.frame_context import context_buffer
+
+logger = logging.getLogger(__name__)
+
+
+# 匹配后端注册表: 名字 -> 工厂函数 factory(min_disparity, num_disparities)
+# 工厂返回任何带有 compute(gray_left, gray_right[, disparity]) 方法、且输出 CV_16S 视差图（真实视差 * 16）的对象，
+# 可选的 disparity 为写入结果的输出数组（同 OpenCV compute 的 dst 参数，只在使用 FrameContext 时传入），
+# 这样 Reconstructor 和可视化模块不需要关心具体使用了哪种算法。
+MATCHER_BACKENDS = {}
+
+
+def register_backend(name):
+    """把一个匹配器工厂函数注册为可选的后端。"""
+    def decorator(factory):
+        MATCHER_BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+def _create_sgbm(min_disparity, num_disparities, mode):
+    """按 config 中的 SGBM 参数创建一个指定视差范围和模式的 SGBM 匹配器。"""
+    return cv2.StereoSGBM_create(
+        minDisparity=min_disparity,
+        numDisparities=num_disparities,
+        blockSize=config.SGBM_BLOCK_SIZE,
+        P1=config.SGBM_P1,
+        P2=config.SGBM_P2,
+        disp12MaxDiff=config.SGBM_DISP12_MAX_DIFF,
+        preFilterCap=config.SGBM_PRE_FILTER_CAP,
+        uniquenessRatio=config.SGBM_UNIQUENESS_RATIO,
+        speckleWindowSize=config.SGBM_SPECKLE_WINDOW_SIZE,
+        speckleRange=config.SGBM_SPECKLE_RANGE,
+        mode=mode
+    )
+
+
+@register_backend("sgbm")
+def _create_configured_sgbm(min_disparity, num_disparities):
+    """使用 config.SGBM_MODE 的 SGBM。"""
+    return _create_sgbm(min_disparity, num_disparities, config.SGBM_MODE)
+
+
+@register_backend("sgbm_5dir")
+def _create_sgbm_5dir(min_disparity, num_disparities):
+    """单遍 5 方向 SGBM (MODE_SGBM)。"""
+    return _create_sgbm(min_disparity, num_disparities, cv2.STEREO_SGBM_MODE_SGBM)
+
+
+@register_backend("sgbm_hh")
+def _create_sgbm_hh(min_disparity, num_disparities):
+    """完整 8 方向的两遍 SGBM (MODE_HH)，最慢、内存占用最大，但结果最平滑。"""
+    return _create_sgbm(min_disparity, num_disparities, cv2.STEREO_SGBM_MODE_HH)
+
+
+@register_backend("sgbm_3way")
+def _create_sgbm_3way(min_disparity, num_disparities):
+    """3 方向的 SGBM (MODE_SGBM_3WAY)，多线程实现，速度和质量比较均衡。"""
+    return _create_sgbm(min_disparity, num_disparities, cv2.STEREO_SGBM_MODE_SGBM_3WAY)
+
+
+@register_backend("bm")
+def _create_bm(min_disparity, num_disparities):
+    """局部块匹配 StereoBM，最便宜的实时方案，弱纹理区域会有较多空洞。"""
+    matcher = cv2.StereoBM_create(numDisparities=num_disparities, blockSize=config.BM_BLOCK_SIZE)
+    matcher.setMinDisparity(min_disparity)
+    # StereoBM 的 preFilterCap 取值范围是 [1, 63]
+    matcher.setPreFilterCap(min(max(config.SGBM_PRE_FILTER_CAP, 1), 63))
+    matcher.setUniquenessRatio(config.SGBM_UNIQUENESS_RATIO)
+    matcher.setSpeckleWindowSize(config.SGBM_SPECKLE_WINDOW_SIZE)
+    matcher.setSpeckleRange(config.SGBM_SPECKLE_RANGE)
+    matcher.setDisp12MaxDiff(config.SGBM_DISP12_MAX_DIFF)
+    return matcher
+
+
+@register_backend("sgbm_wls")
+def _create_sgbm_wls(min_disparity, num_disparities):
+    """左右两次 SGBM 加 WLS 滤波，得到稠密平滑的视差图。需要 opencv-contrib-python。"""
+    return _WLSFilteredMatcher(_create_sgbm(min_disparity, num_disparities, config.SGBM_MODE))
+
+
+class _WLSFilteredMatcher:
+    """
+    [内部辅助类] 用左匹配器和由它派生的右匹配器分别计算左右视差，
+    再用 WLS (Weighted Least Squares) 滤波器结合左右一致性检查得到最终的 CV_16S 视差图。
+    """
+
+    def __init__(self, left_matcher):
+        if not hasattr(cv2, "ximgproc"):
+            raise ImportError(
+                "The 'sgbm_wls' backend requires cv2.ximgproc. "
+                "To install, run: pip install opencv-contrib-python"
+            )
+        self.left_matcher = left_matcher
+        self.right_matcher = cv2.ximgproc.createRightMatcher(left_matcher)
+        self.wls_filter = cv2.ximgproc.createDisparityWLSFilter(left_matcher)
+        self.wls_filter.setLambda(config.WLS_LAMBDA)
+        self.wls_filter.setSigmaColor(config.WLS_SIGMA_COLOR)
+
+    def compute(self, gray_left, gray_right, disparity=None):
+        disparity_left = self.left_matcher.compute(gray_left, gray_right)
+        disparity_right = self.right_matcher.compute(gray_right, gray_left)
+        return self.wls_filter.filter(disparity_left, gray_left, filtered_disparity_map=disparity,
+                                      disparity_map_right=disparity_right)
 
 
 class StereoMatcher:
-    def __init__(self):
-        """
-        初始化SGBM匹配器，并从config加载参数。
-        """
-        print("Initializing Stereo SGBM Matcher...")
-        self.matcher = cv2.StereoSGBM_create(
-            minDisparity=config.SGBM_MIN_DISPARITY,
-            numDisparities=config.SGBM_NUM_DISPARITIES,
-            blockSize=config.SGBM_BLOCK_SIZE,
-            P1=config.SGBM_P1,
-            P2=config.SGBM_P2,
-            disp12MaxDiff=config.SGBM_DISP12_MAX_DIFF,
-            preFilterCap=config.SGBM_PRE_FILTER_CAP,
-            uniquenessRatio=config.SGBM_UNIQUENESS_RATIO,
-            speckleWindowSize=config.SGBM_SPECKLE_WINDOW_SIZE,
-            speckleRange=config.SGBM_SPECKLE_RANGE,
-            mode=config.SGBM_MODE
-        )
-
-    def compute_disparity(self, left_rectified_img, right_rectified_img):
+    # 支持的匹配模式
+    MODES = ("full", "pyramid", "tiled", "incremental")
+
+    def __init__(self, mode=None, band_count=None, band_overlap=None, workers=None, backend=None,
+                 min_disparity=None, num_disparities=None):
+        """
+        初始化立体匹配器，并从config加载参数。
+
+        Args:
+            mode (str): 匹配模式，"full" 为全分辨率匹配，"pyramid" 为由粗到精的快速模式，
+                        "tiled" 为多线程分带计算，"incremental" 为视频流的增量计算（只重新计算相邻帧间变化的区域）。
+                        默认使用 config.MATCHER_MODE。
+            band_count (int): "tiled" 模式下的水平分带数，默认使用 config.TILED_BAND_COUNT。
+            band_overlap (int): "tiled" 模式下每条带上下额外计算的行数，默认使用 config.TILED_BAND_OVERLAP。
+            workers (int): "tiled" 模式下的线程数，默认使用 config.TILED_WORKERS。
+            backend (str): MATCHER_BACKENDS 中注册的匹配后端，默认使用 config.MATCHER_BACKEND。
+            min_disparity (int): 最小视差，默认使用 config.SGBM_MIN_DISPARITY。
+            num_disparities (int): 视差搜索范围（16 的倍数），默认使用 config.SGBM_NUM_DISPARITIES。
+        """
+        self.mode = mode or config.MATCHER_MODE
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown matcher mode '{self.mode}'. Available modes: {', '.join(self.MODES)}")
+        self.backend = backend or config.MATCHER_BACKEND
+        if self.backend not in MATCHER_BACKENDS:
+            raise ValueError(f"Unknown matcher backend '{self.backend}'. "
+                             f"Available backends: {', '.join(MATCHER_BACKENDS)}")
+
+        logger.debug("Initializing Stereo Matcher (backend: %s, mode: %s)...", self.backend, self.mode)
+        self.min_disparity = config.SGBM_MIN_DISPARITY if min_disparity is None else min_disparity
+        self.num_disparities = num_disparities or config.SGBM_NUM_DISPARITIES
+        if self.num_disparities <= 0 or self.num_disparities % 16 != 0:
+            raise ValueError(f"num_disparities must be a positive multiple of 16, got {self.num_disparities}")
+        self.matcher = self._create_matcher(self.min_disparity, self.num_disparities)
+        self.last_compute_time = None
+        # _compute_tile 按 numDisparities 缓存的匹配器（"pyramid"、"incremental" 模式和 ROI 匹配使用）
+        self._tile_matchers = {}
+
+        if self.mode == "pyramid":
+            scale = 2 ** config.PYRAMID_LEVELS
+            # 粗层的视差范围按比例缩小，仍需是16的倍数
+            self._coarse_min = int(math.floor(self.min_disparity / scale))
+            coarse_num = max(16, int(math.ceil(self.num_disparities / scale / 16.0)) * 16)
+            self._coarse_matcher = self._create_matcher(self._coarse_min, coarse_num)
+
+        if self.mode == "tiled":
+            self.workers = workers or config.TILED_WORKERS or os.cpu_count() or 1
+            self.band_count = band_count or config.TILED_BAND_COUNT or self.workers
+            overlap = config.TILED_BAND_OVERLAP if band_overlap is None else band_overlap
+            # 重叠区域至少要覆盖半个匹配块，否则条带边缘的代价计算缺少上下文
+            self.band_overlap = max(overlap, config.SGBM_BLOCK_SIZE // 2 + 1)
+            # 匹配器对象内部持有计算缓冲区，不能在线程间共享，每个条带使用自己的匹配器
+            self._band_matchers = [self._create_matcher(self.min_disparity, self.num_disparities)
+                                   for _ in range(self.band_count)]
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sgbm-band")
+
+        if self.mode == "incremental":
+            self.refresh_interval = config.INCREMENTAL_REFRESH_INTERVAL
+            # 最近一帧的增量统计: full_refresh, recomputed_ratio, tiles, time_ms, speedup
+            self.last_update = None
+            self.reset()
+
+    def _create_matcher(self, min_disparity, num_disparities):
+        """用当前后端创建一个指定视差范围的匹配器。"""
+        return MATCHER_BACKENDS[self.backend](min_disparity, num_disparities)
+
+    @profiling.timed("match")
+    def compute_disparity(self, left_rectified_img, right_rectified_img, context=None):
         """
         计算视差图。
 
         Args:
-            left_rectified_img (np.ndarray): 校正后的左图像 (CV_8U)。
-            right_rectified_img (np.ndarray): 校正后的右图像 (CV_8U)。
+            left_rectified_img (np.ndarray): 校正后的左图像 (CV_8U，BGR 或已经转换好的灰度图，
+                                             例如 utils.image_utils.StereoPreprocessor 的结果)。
+            right_rectified_img (np.ndarray): 校正后的右图像，格式与左图相同。
+            context (utils.frame_context.FrameContext): 可选，灰度图和视差图写入其中的缓冲区，
+                                                        返回的视差图会被下一次使用同一上下文的调用覆盖。
+                                                        "incremental" 模式的视差图是匹配器自己的状态，不使用上下文。
 
         Returns:
             np.ndarray: 视差图 (CV_16S)。
         """
-        print("Computing disparity map...")
-        # SGBM算法要求输入灰度图
-        gray_left = cv2.cvtColor(left_rectified_img, cv2.COLOR_BGR2GRAY)
-        gray_right = cv2.cvtColor(right_rectified_img, cv2.COLOR_BGR2GRAY)
+        logger.debug("Computing disparity map...")
+        start_time = time.perf_counter()
+        shape = left_rectified_img.shape[:2]
+        # 匹配算法要求输入灰度图
+        gray_left = _as_gray(left_rectified_img, context_buffer(context, "match.gray_left", shape))
+        gray_right = _as_gray(right_rectified_img, context_buffer(context, "match.gray_right", shape))
 
-        disparity_map = self.matcher.compute(gray_left, gray_right)
+        if self.mode == "incremental":
+            disparity_map = self._compute_incremental(gray_left, gray_right)
+        else:
+            out = context_buffer(context, "match.disparity", shape, np.int16)
+            if self.mode == "pyramid":
+                disparity_map = self._compute_pyramid(gray_left, gray_right, out)
+            elif self.mode == "tiled":
+                disparity_map = self._compute_tiled(gray_left, gray_right, out)
+            elif out is None:
+                disparity_map = self.matcher.compute(gray_left, gray_right)
+            else:
+                disparity_map = self.matcher.compute(gray_left, gray_right, out)
 
         # 视差图的原始值范围比较大，且为有符号16位整数 (CV_16S)
         # 后面可视化时需要进行归一化
-        print("Disparity map computation complete.")
-        return disparity_map
\ No newline at end of file
+        self.last_compute_time = time.perf_counter() - start_time
+        if self.mode == "incremental":
+            self._log_incremental_update()
+        else:
+            logger.debug("Disparity map computation complete (%s/%s: %.1f ms).",
+                         self.backend, self.mode, self.last_compute_time * 1000)
+        return disparity_map
+
+    def _compute_pyramid(self, gray_left, gray_right, out=None):
+        """
+        由粗到精的视差计算：
+        1. 在下采样的图像上用缩小的视差范围计算粗视差；
+        2. 把全分辨率图像切成块（或整行宽的条带），用粗视差估计每一块实际出现的视差范围 [m, m + n)；
+        3. 每一块只用收窄后的范围做全分辨率 SGBM，再拼接回完整的视差图。
+        """
+        height, width = gray_left.shape[:2]
+        scale = 2 ** config.PYRAMID_LEVELS
+
+        coarse_size = (max(1, width // scale), max(1, height // scale))
+        coarse_left = cv2.resize(gray_left, coarse_size, interpolation=cv2.INTER_AREA)
+        coarse_right = cv2.resize(gray_right, coarse_size, interpolation=cv2.INTER_AREA)
+        coarse_disparity = self._coarse_matcher.compute(coarse_left, coarse_right)
+        coarse_invalid = (self._coarse_min - 1) * 16
+
+        invalid_value = (self.min_disparity - 1) * 16
+        disparity_map = np.empty((height, width), dtype=np.int16) if out is None else out
+        disparity_map.fill(invalid_value)
+
+        tile_height = config.PYRAMID_TILE_SIZE[1]
+        tile_width = config.PYRAMID_TILE_SIZE[0] or width
+        for y0 in range(0, height, tile_height):
+            y1 = min(y0 + tile_height, height)
+            for x0 in range(0, width, tile_width):
+                x1 = min(x0 + tile_width, width)
+                coarse_tile = coarse_disparity[y0 // scale:max(y1 // scale, y0 // scale + 1),
+                                               x0 // scale:max(x1 // scale, x0 // scale + 1)]
+                tile_min, tile_num = self._estimate_tile_range(coarse_tile, coarse_invalid, scale)
+                disparity_map[y0:y1, x0:x1] = self._compute_tile(
+                    gray_left, gray_right, (x0, y0, x1, y1), tile_min, tile_num, invalid_value
+                )
+
+        return disparity_map
+
+    def _estimate_tile_range(self, coarse_tile, coarse_invalid, scale):
+        """根据粗视差估计一块区域的全分辨率视差范围，返回 (minDisparity, numDisparities)。"""
+        valid = coarse_tile[coarse_tile > coarse_invalid]
+        if valid.size < config.PYRAMID_MIN_VALID_RATIO * coarse_tile.size:
+            # 粗层几乎没有有效视差（弱纹理等），退回到完整的搜索范围
+            return self.min_disparity, self.num_disparities
+
+        margin = config.PYRAMID_DISPARITY_MARGIN
+        low, high = np.percentile(valid, (1, 99)) / 16.0 * scale
+        tile_min = max(self.min_disparity, int(math.floor(low - margin)))
+        tile_num = int(math.ceil((high + margin - tile_min) / 16.0)) * 16
+        tile_num = min(max(tile_num, 16), self.num_disparities)
+        tile_min = min(tile_min, self.min_disparity + self.num_disparities - tile_num)
+        return tile_min, tile_num
+
+    def _compute_tile(self, gray_left, gray_right, tile, tile_min, tile_num, invalid_value):
+        """
+        在视差范围 [tile_min, tile_min + tile_num) 内计算一块区域的视差。
+
+        右图的裁剪窗口整体向左平移 tile_min 列，这样块内只需用 minDisparity=0、numDisparities=tile_num
+        匹配，左侧也只需要 tile_num 列的上下文，而不是完整的最大视差。
+        """
+        height, width = gray_left.shape[:2]
+        window = left, top, right, bottom = self._tile_window(tile, tile_min, tile_num, width, height)
+        return self._match_window(gray_left[top:bottom, left:right],
+                                  gray_right[top:bottom, left - tile_min:right - tile_min],
+                                  window, tile, tile_min, tile_num, invalid_value)
+
+    @staticmethod
+    def _tile_window(tile, tile_min, tile_num, width, height):
+        """计算一块区域需要参与匹配的左图窗口 (left, top, right, bottom)，右图窗口为它向左平移 tile_min 列。"""
+        x0, y0, x1, y1 = tile
+        # 上下左右多取一段，让 SGBM 的代价聚合在块边缘也有足够的上下文
+        pad = config.SGBM_BLOCK_SIZE * 2
+
+        top = max(0, y0 - pad)
+        bottom = min(height, y1 + pad)
+        # 左图裁剪列 [left, right)，对应右图列 [left - tile_min, right - tile_min)，两者都必须在图像内
+        left = max(0, tile_min, x0 - tile_num - pad)
+        right = min(width, width + tile_min, x1 + pad)
+        return left, top, right, bottom
+
+    def _match_window(self, gray_left, gray_right, window, tile, tile_min, tile_num, invalid_value):
+        """用 _tile_window 给出的窗口内的左右灰度图计算一块区域的视差。"""
+        x0, y0, x1, y1 = tile
+        left, top, right, bottom = window
+
+        result = np.full((y1 - y0, x1 - x0), invalid_value, dtype=np.int16)
+        # 裁剪宽度不超过搜索范围时，块内所有列都没有完整的搜索空间（SGBM 也不接受这样的输入）
+        if right <= max(left, x0) or right - left <= tile_num:
+            return result
+
+        tile_matcher = self._tile_matchers.get(tile_num)
+        if tile_matcher is None:
+            tile_matcher = self._tile_matchers[tile_num] = self._create_matcher(0, tile_num)
+        crop = tile_matcher.compute(np.ascontiguousarray(gray_left), np.ascontiguousarray(gray_right))
+
+        # 取出块对应的部分；块中 x < left 的列在右图中没有可匹配的位置，保持无效
+        start = max(x0, left)
+        crop = crop[y0 - top:y1 - top, start - left:x1 - left]
+        valid = crop >= 0
+        result[:, start - x0:] = np.where(valid, crop + tile_min * 16, invalid_value)
+        return result
+
+    def _compute_tiled(self, gray_left, gray_right, out=None):
+        """
+        多线程分带计算：把图像切成水平条带，每条带上下各多算 band_overlap 行，
+        在线程池中并行调用 compute（OpenCV 计算时会释放 GIL），最后只把各条带的中心部分拼接起来。
+
+        条带保留完整的图像宽度，所以左边界上视差搜索范围导致的无效列与整图计算完全相同；
+        条带之间只有垂直方向代价聚合的差异，重叠区域越大，拼接结果越接近整图结果。
+        """
+        height, width = gray_left.shape[:2]
+        # 条带太矮时重叠部分占比过大，按高度限制条带数
+        band_count = max(1, min(self.band_count, height // max(self.band_overlap, 1)))
+        edges = np.linspace(0, height, band_count + 1).astype(int)
+        disparity_map = np.empty((height, width), dtype=np.int16) if out is None else out
+
+        def compute_band(index):
+            y0, y1 = edges[index], edges[index + 1]
+            top = max(0, y0 - self.band_overlap)
+            bottom = min(height, y1 + self.band_overlap)
+            band = self._band_matchers[index].compute(gray_left[top:bottom], gray_right[top:bottom])
+            # 各条带写入互不重叠的行，可以直接在线程中写回
+            disparity_map[y0:y1] = band[y0 - top:y1 - top]
+
+        # list() 会等待所有条带完成，并把线程中的异常重新抛出
+        list(self._executor.map(compute_band, range(band_count)))
+        return disparity_map
+
+    def roi_window(self, roi, image_size):
+        """
+        返回计算 ROI (x, y, width, height) 的视差所需的校正后左图窗口 (x0, y0, x1, y1)：
+        上下各多取两个匹配块的高度，左侧多取完整的视差搜索范围。右图需要的是同样大小、
+        向左平移 min_disparity 列的窗口，见 utils.image_utils.Rectifier.rectify_region。
+        """
+        x, y, width, height = roi
+        return self._tile_window((x, y, x + width, y + height), self.min_disparity, self.num_disparities,
+                                 *image_size)
+
+    @profiling.timed("match.roi")
+    def compute_disparity_roi(self, left_window_img, right_window_img, window, roi):
+        """
+        只计算 ROI 内的视差。匹配模式对 ROI 不起作用，总是用当前后端和完整的视差范围直接匹配窗口。
+
+        Args:
+            left_window_img, right_window_img (np.ndarray): 按 roi_window 的窗口校正得到的左右图像
+                (Rectifier.rectify_region(..., right_shift=min_disparity) 的结果)。
+            window (tuple): roi_window 返回的窗口。
+            roi (tuple): (x, y, width, height)，校正后图像坐标。
+        Returns:
+            np.ndarray: height x width 的 CV_16S 视差图，格式与整幅视差图中的对应区域相同。
+        """
+        start_time = time.perf_counter()
+        gray_left = _as_gray(left_window_img)
+        gray_right = _as_gray(right_window_img)
+        x, y, width, height = roi
+        disparity_map = self._match_window(gray_left, gray_right, window, (x, y, x + width, y + height),
+                                           self.min_disparity, self.num_disparities, (self.min_disparity - 1) * 16)
+        self.last_compute_time = time.perf_counter() - start_time
+        logger.debug("ROI disparity computation complete (%s, %dx%d at (%d, %d): %.1f ms).",
+                     self.backend, width, height, x, y, self.last_compute_time * 1000)
+        return disparity_map
+
+    def reset(self):
+        """丢弃 "incremental" 模式保存的上一帧状态，下一帧重新计算整幅视差图（例如切换到另一段视频时）。"""
+        # 当前视差图对应的左右灰度图；只有检测为变化的块会更新，缓慢的累积变化最终也会超过阈值
+        self._reference_left = None
+        self._reference_right = None
+        self._previous_disparity = None
+        self._frames_since_refresh = 0
+        self._full_frame_time = None
+
+    def _compute_incremental(self, gray_left, gray_right):
+        """
+        视频流的增量视差计算（适用于固定机位、大部分场景静止的情况）：
+        1. 把左右图像分别与当前视差图对应的参考图像按块比较，平均灰度差超过阈值的块视为变化；
+        2. 右图的变化会影响左图中向右偏移 [minDisparity, minDisparity + numDisparities) 的像素，把它们也标记出来；
+        3. 标记区域向四周扩展 INCREMENTAL_MARGIN 像素后，按连通区域的外接矩形用 _compute_tile 重新计算，
+           其余像素沿用上一帧的视差。
+        第一帧、图像尺寸变化、每隔 refresh_interval 帧，或需要重新计算的比例超过 INCREMENTAL_MAX_DIRTY_RATIO 时，
+        整幅重新计算，限制误差的累积。
+        """
+        height, width = gray_left.shape[:2]
+        self._frames_since_refresh += 1
+        refresh = (self._previous_disparity is None or self._previous_disparity.shape != (height, width)
+                   or (self.refresh_interval and self._frames_since_refresh >= self.refresh_interval))
+
+        if not refresh:
+            left_dirty, right_dirty = self._dirty_blocks(gray_left, gray_right)
+            tiles, recomputed = self._dirty_tiles(left_dirty, right_dirty, width, height)
+            refresh = recomputed > config.INCREMENTAL_MAX_DIRTY_RATIO
+
+        if refresh:
+            disparity_map = self.matcher.compute(gray_left, gray_right)
+            # 灰度输入可能是调用方逐帧复用的缓冲区，参考图像需要自己的副本
+            self._reference_left, self._reference_right = gray_left.copy(), gray_right.copy()
+            self._frames_since_refresh = 0
+            self.last_update = {"full_refresh": True, "recomputed_ratio": 1.0, "tiles": 0}
+        else:
+            disparity_map = self._previous_disparity
+            if tiles:
+                # 返回给调用方的视差图不会再被修改，每次更新都在副本上进行
+                disparity_map = disparity_map.copy()
+                invalid_value = (self.min_disparity - 1) * 16
+                for x0, y0, x1, y1 in tiles:
+                    disparity_map[y0:y1, x0:x1] = self._compute_tile(
+                        gray_left, gray_right, (x0, y0, x1, y1), self.min_disparity, self.num_disparities,
+                        invalid_value
+                    )
+                self._update_reference(self._reference_left, gray_left, left_dirty)
+                self._update_reference(self._reference_right, gray_right, right_dirty)
+            self.last_update = {"full_refresh": False, "recomputed_ratio": recomputed, "tiles": len(tiles)}
+
+        self._previous_disparity = disparity_map
+        return disparity_map
+
+    def _dirty_blocks(self, gray_left, gray_right):
+        """按块比较左右图像与参考图像，返回 (左图变化块, 右图变化块) 两个布尔网格。"""
+        block = config.INCREMENTAL_BLOCK_SIZE
+        height, width = gray_left.shape[:2]
+        grid = (-(-width // block), -(-height // block))
+
+        def changed(gray, reference):
+            # INTER_AREA 缩小即为块内平均的灰度差
+            difference = cv2.resize(cv2.absdiff(gray, reference), grid, interpolation=cv2.INTER_AREA)
+            return difference > config.INCREMENTAL_DIFF_THRESHOLD
+
+        return changed(gray_left, self._reference_left), changed(gray_right, self._reference_right)
+
+    def _dirty_tiles(self, left_dirty, right_dirty, width, height):
+        """
+        根据变化块确定需要重新计算的矩形区域。
+        :return: ([(x0, y0, x1, y1), ...] 像素坐标, 这些矩形覆盖的像素比例)
+        """
+        block = config.INCREMENTAL_BLOCK_SIZE
+        columns = left_dirty.shape[1]
+        affected = left_dirty.copy()
+        # 右图 x_r 处的变化影响左图 x = x_r + d 处的视差
+        for shift in range(math.floor(self.min_disparity / block),
+                           math.ceil((self.min_disparity + self.num_disparities) / block) + 1):
+            if abs(shift) >= columns:
+                continue
+            if shift >= 0:
+                affected[:, shift:] |= right_dirty[:, :columns - shift]
+            else:
+                affected[:, :shift] |= right_dirty[:, -shift:]
+        if not affected.any():
+            return [], 0.0
+
+        margin = math.ceil(config.INCREMENTAL_MARGIN / block)
+        kernel = np.ones((2 * margin + 1, 2 * margin + 1), dtype=np.uint8)
+        affected = cv2.dilate(affected.astype(np.uint8), kernel)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(affected, connectivity=8)
+
+        tiles = []
+        covered = np.zeros((height, width), dtype=bool)
+        for x, y, w, h, _ in stats[1:count]:
+            tile = (x * block, y * block, min((x + w) * block, width), min((y + h) * block, height))
+            tiles.append(tile)
+            covered[tile[1]:tile[3], tile[0]:tile[2]] = True
+        return tiles, float(covered.mean())
+
+    @staticmethod
+    def _update_reference(reference, gray, dirty):
+        """把变化块的当前内容写入参考图像，没有超过阈值的块保留旧内容，继续累积差异。"""
+        if not dirty.any():
+            return
+        block = config.INCREMENTAL_BLOCK_SIZE
+        height, width = gray.shape[:2]
+        mask = np.repeat(np.repeat(dirty, block, axis=0), block, axis=1)[:height, :width]
+        np.copyto(reference, gray, where=mask)
+
+    def _log_incremental_update(self):
+        """记录本帧的耗时，并与最近一次整幅计算的耗时比较得到加速比。"""
+        update = self.last_update
+        if update["full_refresh"]:
+            self._full_frame_time = self.last_compute_time
+        update["time_ms"] = self.last_compute_time * 1000.0
+        update["speedup"] = self._full_frame_time / self.last_compute_time if self.last_compute_time > 0 else 1.0
+        if update["full_refresh"]:
+            logger.debug("Disparity map computation complete (%s/%s: %.1f ms, full refresh).",
+                         self.backend, self.mode, update['time_ms'])
+        else:
+            logger.debug("Disparity map computation complete (%s/%s: %.1f ms, recomputed %.1f%% of pixels "
+                         "in %d tile(s), x%.2f vs full frame).", self.backend, self.mode, update['time_ms'],
+                         update['recomputed_ratio'] * 100, update['tiles'], update['speedup'])
+
+    def close(self):
+        """释放 "tiled" 模式的线程池。"""
+        if self.mode == "tiled":
+            self._executor.shutdown(wait=True)
+
+    def quality_report(self, left_rectified_img, right_rectified_img):
+        """
+        用同一对图像分别运行全分辨率 SGBM 和当前模式，比较速度和与全分辨率结果的差异。
+
+        "incremental" 模式会沿用上一帧的结果，在本匹配器上再算一次同一对图像只会返回缓存的视差图，
+        因此在一个新的匹配器上计算（单独一对图像总是整幅计算），不改变本匹配器的状态；
+        本匹配器最近一帧实际的增量统计 (last_update) 另外附在报告中。
+
+        Returns:
+            dict: 两种方式的耗时、加速比以及 compare_disparity_maps 给出的差异统计，
+                  "incremental" 模式还有 last_update。
+        """
+        reference_matcher = self if self.mode == "full" else StereoMatcher(
+            mode="full", backend=self.backend, min_disparity=self.min_disparity, num_disparities=self.num_disparities)
+        candidate_matcher = self if self.mode != "incremental" else StereoMatcher(
+            mode="incremental", backend=self.backend, min_disparity=self.min_disparity,
+            num_disparities=self.num_disparities)
+
+        start = time.perf_counter()
+        reference = reference_matcher.compute_disparity(left_rectified_img, right_rectified_img)
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        candidate = candidate_matcher.compute_disparity(left_rectified_img, right_rectified_img)
+        candidate_time = time.perf_counter() - start
+
+        report = compare_disparity_maps(reference, candidate, self.min_disparity)
+        report.update({
+            "backend": self.backend,
+            "mode": self.mode,
+            "full_time_ms": reference_time * 1000.0,
+            "mode_time_ms": candidate_time * 1000.0,
+            "speedup": reference_time / candidate_time if candidate_time > 0 else float("inf"),
+        })
+        if self.mode == "incremental":
+            report["last_update"] = dict(self.last_update) if self.last_update is not None else None
+        return report
+
+
+def _as_gray(image, dst=None):
+    """[内部辅助函数] 把 BGR 图像转换为灰度图（写入 dst），已经是灰度图时原样返回。"""
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=dst)
+
+
+def compare_disparity_maps(reference, candidate, min_disparity, bad_threshold=1.0):
+    """
+    比较两张 CV_16S 视差图。
+
+    Args:
+        reference (np.ndarray): 参考视差图（通常是全分辨率 SGBM 的结果）。
+        candidate (np.ndarray): 待比较的视差图。
+        min_disparity (int): 两张图共同使用的最小视差，用于判断无效值。
+        bad_threshold (float): 视差差异超过多少像素算作坏点。
+
+    Returns:
+        dict: 有效像素比例、两者都有效的像素中的平均绝对误差和坏点率。
+    """
+    invalid_below = min_disparity * 16
+    reference_valid = reference >= invalid_below
+    candidate_valid = candidate >= invalid_below
+    both_valid = reference_valid & candidate_valid
+
+    difference = np.abs(reference[both_valid].astype(np.float32) - candidate[both_valid].astype(np.float32)) / 16.0
+    total = reference.size
+    return {
+        "reference_valid_ratio": float(reference_valid.sum()) / total,
+        "candidate_valid_ratio": float(candidate_valid.sum()) / total,
+        "mean_abs_diff_px": float(difference.mean()) if difference.size else 0.0,
+        "bad_pixel_rate": float((difference > bad_threshold).mean()) if difference.size else 0.0,
+    }
+
+
+def print_quality_report(report):
+    """打印匹配模式的速度与质量对比。"""
+    backend, mode = report['backend'], report['mode']
+    print(f"\n--- Matcher Quality Report ({backend}: {mode} vs full frame) ---")
+    print(f"  - Full frame time:     {report['full_time_ms']:.1f} ms")
+    print(f"  - {mode} mode time: {report['mode_time_ms']:.1f} ms (speedup x{report['speedup']:.2f})")
+    print(f"  - Valid pixels:        full {report['reference_valid_ratio']:.1%}, "
+          f"{mode} {report['candidate_valid_ratio']:.1%}")
+    print(f"  - Mean |diff|:         {report['mean_abs_diff_px']:.3f} px")
+    print(f"  - Bad pixels (>1 px):  {report['bad_pixel_rate']:.2%}")
+    if "last_update" in report:
+        # 单独一对图像的 incremental 结果就是整幅计算，真正的增量效果要看视频流中的帧
+        update = report["last_update"]
+        if update is None:
+            print("  - Last frame:          none computed yet")
+        elif update["full_refresh"]:
+            print(f"  - Last frame:          full refresh, {update['time_ms']:.1f} ms")
+        else:
+            print(f"  - Last frame:          recomputed {update['recomputed_ratio']:.1%} of pixels in "
+                  f"{update['tiles']} tile(s), {update['time_ms']:.1f} ms (x{update['speedup']:.2f} vs full frame)")
@@ -0,0 +1,393 @@
+# processing/stereo_service.py
+"""
+长期运行的本地双目处理服务 (python main.py serve)。
+
+每次运行 main.py 都要重新导入 OpenCV、解析标定文件、计算映射表并创建 SGBM 对象；服务只在启动时做一次，
+之后通过本机的 HTTP 端口或 Unix 域套接字接收图像对，返回原始二进制的视差图或深度图。
+
+asyncio 事件循环只负责网络读写，解码、校正、匹配和重建在线程池中执行（OpenCV 计算时释放 GIL）。
+每个处理线程有自己的匹配器（SGBM 对象内部持有计算缓冲区，不能在线程间共享）和 utils.frame_context.FrameContext，
+映射表在所有线程之间共享。正在处理和排队的请求总数有上限（线程数 + config.SERVICE_QUEUE_SIZE），
+超过时直接返回 503 和 Retry-After，由客户端退避重试，服务端的内存和延迟不会随负载无限增长。
+
+协议 (HTTP/1.1，支持 keep-alive):
+    POST /disparity   返回 CV_16S 原始视差图（真实视差 * 16）
+    POST /depth       返回 float32 深度图（毫米）
+    GET  /stats       返回 JSON 格式的请求计数和延迟统计
+请求体为一对图像，二选一:
+    X-Image-Size: WxH     左右两幅原始 BGR 图像 (uint8，各 H*W*3 字节) 依次拼接，本机调用时不需要编解码
+    X-Left-Length: N      左右两幅编码后的图像 (cv2.imdecode 支持的 PNG/JPEG 等) 依次拼接，前 N 字节为左图
+响应体为数组的原始字节（C 顺序），形状和类型在 X-Shape ("H,W") 和 X-Dtype (NumPy dtype 字符串，例如 "<i2") 中，
+X-Queue-Ms 和 X-Process-Ms 为请求在服务端排队和处理的时间。客户端可以用 decode_array 还原数组。
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import cv2
+import numpy as np
+
+import config
+from utils.frame_context import FrameContext
+from utils.image_utils import StereoPreprocessor
+from processing.reconstructor import Reconstructor
+from processing.stereo_matcher import StereoMatcher
+from processing.stream_pipeline import StageStats
+
+logger = logging.getLogger(__name__)
+
+# 可以请求的结果: URL 路径 /<名字>
+OUTPUTS = ("disparity", "depth")
+# 延迟统计只保留最近的这么多个请求，长期运行时内存不会增长
+_LATENCY_SAMPLES = 10000
+
+
+class ServiceError(Exception):
+    """带有 HTTP 状态码的请求错误。"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = HTTPStatus(status)
+
+
+async def read_message(reader, max_body):
+    """
+    读取一个 HTTP 消息（请求或响应）。
+    :return: (起始行, 小写名字的头部字典, 消息体)；连接在消息开始之前被关闭时返回 None。
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ServiceError(HTTPStatus.BAD_REQUEST, "Incomplete message header.")
+    except asyncio.LimitOverrunError:
+        raise ServiceError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Message header too large.")
+
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise ServiceError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+    if length < 0:
+        raise ServiceError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+    if length > max_body:
+        raise ServiceError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                           f"Message body of {length} bytes exceeds the {max_body} byte limit.")
+    body = await reader.readexactly(length) if length else b""
+    return lines[0], headers, body
+
+
+def encode_raw_pair(left_img, right_img):
+    """把一对 BGR 图像编码为 X-Image-Size 格式的 (请求头, 请求体)。"""
+    if left_img.shape != right_img.shape or left_img.ndim != 3 or left_img.shape[2] != 3:
+        raise ValueError("Left and right images must be BGR images of the same size.")
+    height, width = left_img.shape[:2]
+    body = b"".join((np.ascontiguousarray(left_img, dtype=np.uint8).data,
+                     np.ascontiguousarray(right_img, dtype=np.uint8).data))
+    return {"X-Image-Size": f"{width}x{height}"}, body
+
+
+def encode_compressed_pair(left_img, right_img, extension=".png"):
+    """把一对图像编码为 X-Left-Length 格式的 (请求头, 请求体)，extension 为 cv2.imencode 的格式。"""
+    encoded = []
+    for image in (left_img, right_img):
+        ok, data = cv2.imencode(extension, image)
+        if not ok:
+            raise ValueError(f"Could not encode image as {extension}.")
+        encoded.append(data.tobytes())
+    return {"X-Left-Length": str(len(encoded[0]))}, encoded[0] + encoded[1]
+
+
+def decode_pair(headers, body):
+    """从请求头和请求体还原左右 BGR 图像（原始格式不复制像素数据）。"""
+    if "x-image-size" in headers:
+        try:
+            width, height = (int(v) for v in headers["x-image-size"].lower().split("x"))
+        except ValueError:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "X-Image-Size must be 'WxH'.")
+        size = width * height * 3
+        if width <= 0 or height <= 0 or len(body) != 2 * size:
+            raise ServiceError(HTTPStatus.BAD_REQUEST,
+                               f"Expected two {width}x{height} BGR images ({2 * size} bytes), got {len(body)} bytes.")
+        pixels = np.frombuffer(body, dtype=np.uint8)
+        return pixels[:size].reshape(height, width, 3), pixels[size:].reshape(height, width, 3)
+
+    if "x-left-length" in headers:
+        try:
+            left_length = int(headers["x-left-length"])
+        except ValueError:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "X-Left-Length must be an integer.")
+        if not 0 < left_length < len(body):
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "X-Left-Length does not split the body into two images.")
+        data = np.frombuffer(body, dtype=np.uint8)
+        left_img = cv2.imdecode(data[:left_length], cv2.IMREAD_COLOR)
+        right_img = cv2.imdecode(data[left_length:], cv2.IMREAD_COLOR)
+        if left_img is None or right_img is None:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Could not decode the image pair.")
+        if left_img.shape != right_img.shape:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Left and right images have different sizes.")
+        return left_img, right_img
+
+    raise ServiceError(HTTPStatus.BAD_REQUEST, "Missing X-Image-Size or X-Left-Length header.")
+
+
+def decode_array(headers, body):
+    """[客户端] 按 X-Shape 和 X-Dtype 响应头把响应体还原为 NumPy 数组（头部名字为小写）。"""
+    shape = tuple(int(v) for v in headers["x-shape"].split(","))
+    return np.frombuffer(body, dtype=np.dtype(headers["x-dtype"])).reshape(shape)
+
+
+async def send_request(reader, writer, method, path, headers=None, body=b"", max_body=None):
+    """[客户端] 在一条 keep-alive 连接上发送一个请求并读取响应，返回 (状态码, 头部字典, 响应体)。"""
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    writer.write(body)
+    await writer.drain()
+    message = await read_message(reader, max_body or 2**31)
+    if message is None:
+        raise ConnectionError("Server closed the connection.")
+    status_line, response_headers, response_body = message
+    return int(status_line.split(" ", 2)[1]), response_headers, response_body
+
+
+class StereoService:
+    """加载一次标定和匹配器、在线程池中处理请求的 asyncio 服务。"""
+
+    def __init__(self, rectifier, backend=None, matcher_mode=None, reconstruction_mode=None, workers=None,
+                 queue_size=None, max_request_mb=None):
+        """
+        :param rectifier: utils.image_utils.Rectifier 实例，映射表在所有处理线程之间共享。
+        :param backend, matcher_mode: 传给 StereoMatcher；"incremental" 模式依赖相邻帧，不能用于相互独立的请求。
+        :param reconstruction_mode: 传给 Reconstructor。
+        :param workers: 处理线程数，默认使用 config.SERVICE_WORKERS（None 表示全部 CPU 核）。
+        :param queue_size: 所有线程都忙时最多排队的请求数，默认使用 config.SERVICE_QUEUE_SIZE。
+        :param max_request_mb: 请求体的最大大小，默认使用 config.SERVICE_MAX_REQUEST_MB。
+        """
+        self.rectifier = rectifier
+        self.backend = backend
+        self.matcher_mode = matcher_mode
+        self.reconstruction_mode = reconstruction_mode
+        # 先在当前线程中创建一次，尽早发现无效的后端和模式
+        if StereoMatcher(mode=matcher_mode, backend=backend).mode == "incremental":
+            raise ValueError("The 'incremental' matcher mode reuses the previous frame and cannot serve "
+                             "independent requests.")
+        Reconstructor(mode=reconstruction_mode)
+
+        self.workers = workers or config.SERVICE_WORKERS or os.cpu_count() or 1
+        self.queue_size = config.SERVICE_QUEUE_SIZE if queue_size is None else queue_size
+        self.max_body = int((max_request_mb or config.SERVICE_MAX_REQUEST_MB) * 2**20)
+
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stereo-service",
+                                            initializer=self._init_thread)
+        self._server = None
+        self._unix_path = None
+        # start() 修改前 OpenCV 的线程数，close() 时恢复（setNumThreads 对整个进程生效）
+        self._previous_cv_threads = None
+        # 正在处理和排队的请求数，只在事件循环线程中修改
+        self._pending = 0
+        self.counts = {"served": 0, "rejected": 0, "failed": 0}
+        self._latency = {name: StageStats(name, max_samples=_LATENCY_SAMPLES)
+                         for name in ("queue", "process", "total")}
+
+    @property
+    def max_pending(self):
+        """同时在处理和排队中的最大请求数。"""
+        return self.workers + self.queue_size
+
+    # --- 处理线程 ---
+    def _init_thread(self):
+        """[线程池初始化函数] 每个处理线程创建一次自己的预处理器、匹配器、重建器和输出缓冲区。"""
+        local = self._local
+        local.preprocessor = StereoPreprocessor(self.rectifier, with_color=False, reuse_buffers=False)
+        local.matcher = StereoMatcher(mode=self.matcher_mode, backend=self.backend)
+        local.reconstructor = Reconstructor(mode=self.reconstruction_mode)
+        local.context = FrameContext()
+
+    def _process(self, output, headers, body, submitted):
+        """在处理线程中解码、校正、匹配并（可选）计算深度，返回 (形状, dtype 字符串, 字节, 排队秒数, 处理秒数)。"""
+        started = time.perf_counter()
+        local = self._local
+        left_img, right_img = decode_pair(headers, body)
+        context = local.context
+        context.begin_frame()
+        left_gray, right_gray, _, Q = local.preprocessor.process(left_img, right_img, with_color=False,
+                                                                 context=context)
+        result = local.matcher.compute_disparity(left_gray, right_gray, context=context)
+        if output == "depth":
+            result = local.reconstructor.reconstruct_depth(result, Q, context=context)
+        # 结果在线程复用的缓冲区中，下一个请求会覆盖，返回之前复制为字节串
+        return result.shape, result.dtype.str, result.tobytes(), started - submitted, time.perf_counter() - started
+
+    # --- 网络 ---
+    async def start(self, host=None, port=None, unix_path=None):
+        """开始监听（unix_path 不为 None 时使用 Unix 域套接字），并预先计算标定尺寸的映射表。"""
+        if self.workers > 1:
+            # 并行由处理线程提供，每次 OpenCV 调用只用一个线程，避免线程数超过 CPU 核数
+            self._previous_cv_threads = cv2.getNumThreads()
+            cv2.setNumThreads(1)
+        image_size = self.rectifier.stereo_params.get("image_size")
+        if image_size is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.rectifier.get_maps, image_size)
+
+        if unix_path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=unix_path)
+            self._unix_path = unix_path
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection, host or config.SERVICE_HOST,
+                config.SERVICE_PORT if port is None else port
+            )
+        logger.info("Stereo service listening on %s (%d worker thread(s), up to %d queued requests)",
+                    self.address, self.workers, self.queue_size)
+        return self._server
+
+    @property
+    def address(self):
+        """监听的地址：TCP 时为 (host, port)，Unix 域套接字时为路径。"""
+        return self._server.sockets[0].getsockname() if self._server is not None else None
+
+    async def serve_forever(self, host=None, port=None, unix_path=None):
+        await self.start(host, port, unix_path)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        """停止监听并等待处理线程结束，删除 Unix 域套接字文件，恢复 OpenCV 的线程数。"""
+        if self._server is not None:
+            self._server.close()
+        if self._unix_path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self._unix_path)
+            self._unix_path = None
+        self._executor.shutdown(wait=True)
+        if self._previous_cv_threads is not None:
+            cv2.setNumThreads(self._previous_cv_threads)
+            self._previous_cv_threads = None
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    message = await read_message(reader, self.max_body)
+                except ServiceError as e:
+                    # 请求格式错误或过大时无法确定下一个请求从哪里开始，回复后关闭连接
+                    await self._respond(writer, e.status, str(e).encode(), close=True)
+                    break
+                if message is None:
+                    break
+                start_line, headers, body = message
+                status, response_headers, payload = await self._dispatch(start_line, headers, body)
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, payload, response_headers, close=close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _dispatch(self, start_line, headers, body):
+        """处理一个请求，返回 (状态码, 响应头, 响应体)。"""
+        method, path = (start_line.split(" ") + ["", ""])[:2]
+        path = path.split("?", 1)[0]
+        if path == "/stats":
+            if method != "GET":
+                return _error(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET for /stats.")
+            return HTTPStatus.OK, {"Content-Type": "application/json"}, json.dumps(self.summary()).encode()
+        output = path.strip("/")
+        if output not in OUTPUTS:
+            return _error(HTTPStatus.NOT_FOUND, f"Unknown path '{path}'. Use /{', /'.join(OUTPUTS)} or /stats.")
+        if method != "POST":
+            return _error(HTTPStatus.METHOD_NOT_ALLOWED, f"Use POST for /{output}.")
+
+        # 背压：排队的请求已满时立即拒绝，而不是让请求在服务端无限堆积
+        if self._pending >= self.max_pending:
+            self.counts["rejected"] += 1
+            status, response_headers, payload = _error(HTTPStatus.SERVICE_UNAVAILABLE, "Server is busy, retry later.")
+            response_headers["Retry-After"] = "1"
+            return status, response_headers, payload
+
+        self._pending += 1
+        submitted = time.perf_counter()
+        try:
+            shape, dtype, payload, queue_s, process_s = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._process, output, headers, body, submitted
+            )
+        except ServiceError as e:
+            self.counts["failed"] += 1
+            return _error(e.status, str(e))
+        except (cv2.error, ValueError) as e:
+            self.counts["failed"] += 1
+            logger.warning("Failed to process /%s request: %s", output, e)
+            return _error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Processing failed: {e}")
+        except Exception as e:
+            # 其他异常是服务本身的问题：记录完整的调用栈，仍然回复 500，而不是让连接没有响应就断开
+            self.counts["failed"] += 1
+            logger.error("Unexpected error while processing /%s request", output, exc_info=True)
+            return _error(HTTPStatus.INTERNAL_SERVER_ERROR, f"Internal error: {type(e).__name__}")
+        finally:
+            self._pending -= 1
+
+        self.counts["served"] += 1
+        self._latency["queue"].record(queue_s)
+        self._latency["process"].record(process_s)
+        self._latency["total"].record(time.perf_counter() - submitted)
+        return HTTPStatus.OK, {
+            "Content-Type": "application/octet-stream",
+            "X-Shape": ",".join(str(v) for v in shape),
+            "X-Dtype": dtype,
+            "X-Queue-Ms": f"{queue_s * 1000.0:.2f}",
+            "X-Process-Ms": f"{process_s * 1000.0:.2f}",
+        }, payload
+
+    @staticmethod
+    async def _respond(writer, status, payload, headers=None, close=False):
+        status = HTTPStatus(status)
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Length: {len(payload)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        if close:
+            lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        writer.write(payload)
+        await writer.drain()
+
+    def summary(self):
+        """请求计数和（最近的请求的）排队、处理、总延迟统计。"""
+        return {
+            **self.counts,
+            "pending": self._pending,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "latency": {name: stats.summary() for name, stats in self._latency.items()},
+        }
+
+
+def _error(status, message):
+    """[内部辅助函数] 纯文本的错误响应。"""
+    return HTTPStatus(status), {"Content-Type": "text/plain; charset=utf-8"}, message.encode("utf-8")
+
+
+def print_service_report(summary):
+    """打印服务运行期间的请求计数和延迟统计。"""
+    print("\n--- Stereo Service Report ---")
+    print(f"Requests: {summary['served']} served, {summary['rejected']} rejected (busy), {summary['failed']} failed")
+    print(f"{'latency':<12}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, stats in summary["latency"].items():
+        print(f"{name:<12}{stats['count']:>7}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['max_ms']:>10.2f}")
@@ -0,0 +1,329 @@
+# processing/stream_pipeline.py
+import collections
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+from utils.frame_context import FrameContextPool, format_memory_report
+from utils.image_utils import StereoPreprocessor
+
+# 队列中的结束标记
+_END = object()
+
+
+class StereoFrame:
+    """在流水线各阶段之间传递的一帧数据，每个阶段把自己的结果写回到这个对象上。"""
+
+    def __init__(self, index, timestamp, left, right):
+        self.index = index
+        self.timestamp = timestamp
+        self.left = left
+        self.right = right
+        self.left_rectified = None
+        self.left_gray = None
+        self.right_gray = None
+        self.Q = None
+        self.disparity = None
+        self.points_3D = None
+        self.point_cloud = None
+        self.depth = None
+        # 从 FrameContextPool 借出的输出缓冲区，未启用 reuse_buffers 时为 None
+        self.context = None
+        self.started_at = time.perf_counter()
+
+
+class StageStats:
+    """记录单个阶段每一帧的耗时。"""
+
+    def __init__(self, name, max_samples=None):
+        """:param max_samples: 只保留最近的这么多个耗时（长期运行的服务使用），None 表示全部保留。"""
+        self.name = name
+        self.latencies = [] if max_samples is None else collections.deque(maxlen=max_samples)
+
+    def record(self, seconds):
+        self.latencies.append(seconds)
+
+    def summary(self):
+        if not self.latencies:
+            return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        latencies_ms = np.asarray(self.latencies) * 1000.0
+        return {
+            "count": len(latencies_ms),
+            "mean_ms": float(latencies_ms.mean()),
+            "p50_ms": float(np.percentile(latencies_ms, 50)),
+            "p95_ms": float(np.percentile(latencies_ms, 95)),
+            "max_ms": float(latencies_ms.max()),
+        }
+
+
+class StreamPipeline:
+    """
+    流式双目处理流水线: decode -> rectify -> match -> reconstruct -> sink。
+
+    每个阶段运行在独立的线程中，阶段之间通过有界队列连接，
+    因此解码、匹配和写出可以相互重叠；队列满时上游阶段阻塞，内存占用有上限。
+    OpenCV 的计算函数会释放 GIL，所以多线程能够真正并行。
+
+    reuse_buffers=True 时每一帧从一个 utils.frame_context.FrameContextPool 中借出输出缓冲区，
+    sink 处理完后归还，预热之后各阶段不再为帧数据分配内存。池的大小 (config.STREAM_BUFFER_POOL_SIZE)
+    限制了同时在流水线中的帧数，池空时解码阶段等待，与队列满时一样形成反压。
+    此时 sink 收到的数组在它返回后会被后面的帧覆盖，需要保留的结果必须在 sink 中复制。
+    """
+
+    STAGES = ("decode", "rectify", "match", "reconstruct", "sink")
+
+    def __init__(self, rectifier, matcher, reconstructor, sink=None, queue_size=None, depth_only=False,
+                 reuse_buffers=False):
+        """
+        :param rectifier: utils.image_utils.Rectifier 实例。
+        :param matcher: processing.stereo_matcher.StereoMatcher 实例。
+        :param reconstructor: processing.reconstructor.Reconstructor 实例。
+        :param sink: 接收每一帧最终结果的可调用对象，None 表示丢弃结果。
+        :param queue_size: 阶段之间队列的最大长度，默认使用 config.STREAM_QUEUE_SIZE。
+        :param depth_only: 重建阶段只计算深度图 (frame.depth)，不生成点云。
+        :param reuse_buffers: 各阶段的输出写入按帧借出的复用缓冲区，sink 不能在返回后继续持有帧数据。
+        """
+        self.rectifier = rectifier
+        # 多帧同时在流水线中，预处理器自身不能复用输出缓冲区，复用时由每一帧的 context 提供
+        # 只计算深度时不需要校正彩色图
+        self._preprocessor = StereoPreprocessor(rectifier, with_color=not depth_only, reuse_buffers=False)
+        self.matcher = matcher
+        self.reconstructor = reconstructor
+        self.sink = sink
+        self.queue_size = config.STREAM_QUEUE_SIZE if queue_size is None else queue_size
+        self.depth_only = depth_only
+        self.reuse_buffers = reuse_buffers
+
+        self._stop = threading.Event()
+        self._error = None
+        self._stats = {}
+        self._updates = []
+        self._pool = None
+
+    def run(self, frames):
+        """
+        处理一个帧源直到结束。
+        :param frames: 产出 (index, timestamp, left, right) 的可迭代对象，例如 utils.frame_sources 中的生成器。
+        :return: 包含帧数、总耗时、持续 FPS 和各阶段耗时统计的字典。
+        """
+        self._stop.clear()
+        self._error = None
+        self._stats = {name: StageStats(name) for name in self.STAGES}
+        self._updates = []
+        end_to_end = StageStats("end_to_end")
+
+        queues = [queue.Queue(maxsize=max(self.queue_size, 1)) for _ in range(len(self.STAGES) - 1)]
+        self._pool = None
+        if self.reuse_buffers:
+            # 默认每个阶段正在处理一帧，另外最多一个队列长度的帧在排队
+            pool_size = config.STREAM_BUFFER_POOL_SIZE or len(self.STAGES) + max(self.queue_size, 1)
+            self._pool = FrameContextPool(pool_size)
+        stage_functions = [self._rectify, self._match, self._reconstruct]
+
+        threads = [threading.Thread(target=self._decode_stage, args=(frames, queues[0]), daemon=True)]
+        for i, function in enumerate(stage_functions):
+            name = self.STAGES[i + 1]
+            threads.append(threading.Thread(
+                target=self._run_stage, args=(name, function, queues[i], queues[i + 1]), daemon=True
+            ))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        # sink 阶段在调用线程中运行
+        frame_count = 0
+        try:
+            while True:
+                frame = self._get(queues[-1])
+                if frame is _END:
+                    break
+                stage_start = time.perf_counter()
+                if self.sink is not None:
+                    self.sink(frame)
+                if frame.context is not None:
+                    self._pool.release(frame.context)
+                    frame.context = None
+                now = time.perf_counter()
+                self._stats["sink"].record(now - stage_start)
+                end_to_end.record(now - frame.started_at)
+                frame_count += 1
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+        elapsed = time.perf_counter() - start
+        summary = {
+            "frames": frame_count,
+            "elapsed_s": elapsed,
+            "fps": frame_count / elapsed if elapsed > 0 else 0.0,
+            "stages": {name: stats.summary() for name, stats in self._stats.items()},
+            "end_to_end": end_to_end.summary(),
+        }
+        if self._updates:
+            summary["incremental"] = summarize_incremental_updates(self._updates)
+        if self._pool is not None:
+            summary["buffers"] = self._pool.memory_report()
+        return summary
+
+    # --- 各阶段的处理函数 ---
+    def _rectify(self, frame):
+        frame.left_gray, frame.right_gray, frame.left_rectified, frame.Q = self._preprocessor.process(
+            frame.left, frame.right, context=frame.context)
+        # 原始图像之后不再需要，尽早释放
+        frame.left = frame.right = None
+
+    def _match(self, frame):
+        frame.disparity = self.matcher.compute_disparity(frame.left_gray, frame.right_gray, context=frame.context)
+        frame.left_gray = frame.right_gray = None
+        if self.matcher.mode == "incremental":
+            self._updates.append(dict(self.matcher.last_update))
+
+    def _reconstruct(self, frame):
+        if self.depth_only:
+            frame.depth = self.reconstructor.reconstruct_depth(frame.disparity, frame.Q, context=frame.context)
+            return
+        frame.points_3D, frame.point_cloud = self.reconstructor.reconstruct(
+            frame.disparity, frame.left_rectified, frame.Q, context=frame.context
+        )
+
+    # --- 线程与队列管理 ---
+    def _decode_stage(self, frames, out_queue):
+        iterator = iter(frames)
+        try:
+            while not self._stop.is_set():
+                stage_start = time.perf_counter()
+                item = next(iterator, None)
+                if item is None:
+                    break
+                index, timestamp, left, right = item
+                frame = StereoFrame(index, timestamp, left, right)
+                frame.started_at = stage_start
+                self._stats["decode"].record(time.perf_counter() - stage_start)
+                # 等待空闲缓冲区与等待队列一样属于反压，不计入解码耗时
+                if self._pool is not None:
+                    frame.context = self._acquire_context()
+                    if frame.context is None:
+                        break
+                if not self._put(out_queue, frame):
+                    break
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+            self._put(out_queue, _END)
+
+    def _run_stage(self, name, function, in_queue, out_queue):
+        try:
+            while True:
+                frame = self._get(in_queue)
+                if frame is _END:
+                    break
+                stage_start = time.perf_counter()
+                function(frame)
+                self._stats[name].record(time.perf_counter() - stage_start)
+                if not self._put(out_queue, frame):
+                    break
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(out_queue, _END)
+
+    def _put(self, q, item):
+        """放入队列；流水线被中止时返回 False，避免在满队列上永久阻塞。"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _acquire_context(self):
+        """从缓冲区池借出一组缓冲区；流水线被中止时返回 None。"""
+        while not self._stop.is_set():
+            try:
+                return self._pool.acquire(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _get(self, q):
+        """从队列取出一帧；流水线被中止时返回结束标记。"""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+
+class DisparityImageSink:
+    """把每一帧的原始视差图 (CV_16S) 按位保存为 16 位 PNG，文件名带帧序号。"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def __call__(self, frame):
+        path = os.path.join(self.output_dir, f"disparity_{frame.index:06d}.png")
+        # PNG 不支持有符号 16 位，按位重新解释为 uint16 保存，读取后 view(np.int16) 即可还原
+        cv2.imwrite(path, frame.disparity.view(np.uint16))
+
+
+class ArchiveSink:
+    """把每一帧的视差图、时间戳和 Q 矩阵追加到 utils.frame_archive.DisparityArchive 中。"""
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    def __call__(self, frame):
+        self.archive.append(frame.disparity, frame.timestamp, frame.Q)
+
+
+def summarize_incremental_updates(updates):
+    """汇总 "incremental" 匹配模式每一帧的统计（StereoMatcher.last_update）：整幅刷新次数、重新计算的像素比例和加速比。"""
+    incremental = [update for update in updates if not update["full_refresh"]]
+    recomputed = np.array([update["recomputed_ratio"] for update in updates])
+    return {
+        "frames": len(updates),
+        "full_refreshes": len(updates) - len(incremental),
+        "mean_recomputed_ratio": float(recomputed.mean()),
+        "mean_speedup": float(np.mean([update["speedup"] for update in incremental])) if incremental else 1.0,
+    }
+
+
+def print_stream_report(summary):
+    """打印流式处理的 FPS 和各阶段耗时统计。"""
+    print("\n--- Stream Processing Report ---")
+    print(f"Frames processed: {summary['frames']} in {summary['elapsed_s']:.2f} s "
+          f"({summary['fps']:.2f} FPS sustained)")
+    print(f"{'stage':<12}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    rows = list(summary["stages"].items()) + [("end_to_end", summary["end_to_end"])]
+    for name, stats in rows:
+        print(f"{name:<12}{stats['count']:>7}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+    if "incremental" in summary:
+        incremental = summary["incremental"]
+        print(f"Incremental matching: {incremental['mean_recomputed_ratio']:.1%} of pixels recomputed per frame, "
+              f"{incremental['full_refreshes']}/{incremental['frames']} full refreshes, "
+              f"x{incremental['mean_speedup']:.2f} mean speedup on incremental frames")
+    if "buffers" in summary:
+        print(f"Frame buffers: {format_memory_report(summary['buffers'])}")
@@ -0,0 +1,70 @@
+# tests/test_batch_processor.py
+import json
+import shutil
+import cv2
+import numpy as np
+import pytest
+import config
+from utils import image_utils, ply_io
+from processing.batch_processor import process_directory
+from processing.stereo_matcher import StereoMatcher
+
+
+def _make_pair_directory(directory, count):
+    for i in range(1, count + 1):
+        shutil.copy(config.TEST_IMAGE_LEFT_PATH, directory / f"leftPic{i}.jpg")
+        shutil.copy(config.TEST_IMAGE_RIGHT_PATH, directory / f"rightPic{i}.jpg")
+
+
+def _expected_disparity():
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+    left_rectified, right_rectified, _ = rectifier.rectify(cv2.imread(config.TEST_IMAGE_LEFT_PATH),
+                                                           cv2.imread(config.TEST_IMAGE_RIGHT_PATH))
+    return StereoMatcher().compute_disparity(left_rectified, right_rectified)
+
+
+def test_worker_pool_writes_outputs_for_every_pair(tmp_path):
+    """
+    验证进程池处理了所有图像对，结果按输入顺序命名，并且与单独处理一对图像的结果一致。
+    """
+    input_dir, output_dir = tmp_path / "pairs", tmp_path / "out"
+    input_dir.mkdir()
+    _make_pair_directory(input_dir, 3)
+
+    summary = process_directory(str(input_dir), str(output_dir), params_path=config.CAMERA_PARAMS_PATH, workers=2)
+
+    assert summary["processed"] == 3 and summary["failed"] == 0
+    assert [result["index"] for result in summary["results"]] == [0, 1, 2]
+    assert summary["latency"]["count"] == 3 and summary["pairs_per_s"] > 0
+    with open(output_dir / "summary.json", encoding="utf-8") as f:
+        assert json.load(f)["processed"] == 3
+
+    expected = _expected_disparity()
+    for index in range(3):
+        disparity = cv2.imread(str(output_dir / f"disparity_{index:06d}.png"), cv2.IMREAD_UNCHANGED).view(np.int16)
+        assert np.array_equal(disparity, expected)
+        depth = np.load(output_dir / f"depth_{index:06d}.npy")
+        assert depth.shape == expected.shape
+        points, _ = ply_io.read_ply(str(output_dir / f"point_cloud_{index:06d}.ply"))
+        assert len(points) == summary["results"][index]["points"] > 0
+
+
+def test_unreadable_pair_is_reported_without_stopping_the_batch(tmp_path):
+    _make_pair_directory(tmp_path, 2)
+    (tmp_path / "leftPic2.jpg").write_bytes(b"not an image")
+
+    summary = process_directory(str(tmp_path), str(tmp_path / "out"), params_path=config.CAMERA_PARAMS_PATH,
+                                workers=1, depth_only=True)
+
+    assert summary["processed"] == 1 and summary["failed"] == 1
+    assert summary["results"][1]["error"] is not None
+    assert (tmp_path / "out" / "depth_000000.npy").exists()
+    assert not (tmp_path / "out" / "point_cloud_000000.ply").exists()
+
+
+def test_incremental_matcher_is_rejected(tmp_path):
+    _make_pair_directory(tmp_path, 1)
+    with pytest.raises(ValueError, match="incremental"):
+        process_directory(str(tmp_path), str(tmp_path / "out"), params_path=config.CAMERA_PARAMS_PATH,
+                          workers=1, matcher_mode="incremental")
+    assert not (tmp_path / "out").exists()
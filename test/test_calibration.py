@@ -1,8 +1,10 @@
 # tests/test_calibration.py
 import os
+import numpy as np
 import pytest
 from calibration.calibrator import StereoCalibrator
 import config
+from utils import file_utils
 
 def test_calibration_produces_valid_file():
     # 准备：确保没有旧的参数文件
@@ -23,3 +25,23 @@ def test_calibration_produces_valid_file():
     params = file_utils.load_stereo_params(config.CAMERA_PARAMS_PATH)
     assert "reprojection_error_L" in params
     assert "reprojection_error_R" in params
+
+
+def test_parallel_corner_detection_matches_sequential():
+    """
+    验证多进程检测角点的结果与单进程完全相同，并且按输入顺序排列。
+    """
+    image_pairs = file_utils.find_image_pairs(config.CALIBRATION_IMAGE_DIR)[:6]
+    sequential = StereoCalibrator(workers=1, use_cache=False)._detect_corners_parallel(image_pairs)
+    parallel = StereoCalibrator(workers=2, use_cache=False)._detect_corners_parallel(image_pairs)
+
+    assert len(parallel) == len(sequential) == len(image_pairs)
+    for expected, actual in zip(sequential, parallel):
+        assert actual["size_left"] == expected["size_left"]
+        assert (actual["ret_left"], actual["ret_right"]) == (expected["ret_left"], expected["ret_right"])
+        for side in ("corners_left", "corners_right"):
+            if expected[side] is None:
+                assert actual[side] is None
+            else:
+                assert np.array_equal(actual[side], expected[side])
+
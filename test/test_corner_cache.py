@@ -0,0 +1,37 @@
+# tests/test_corner_cache.py
+import numpy as np
+from calibration.calibrator import StereoCalibrator
+import config
+from utils import file_utils
+
+
+def test_corner_cache_reuses_detected_corners(tmp_path):
+    """
+    验证第二次检测完全命中缓存，并且缓存的角点与重新检测的结果一致。
+    """
+    image_pairs = file_utils.find_image_pairs(config.CALIBRATION_IMAGE_DIR)[:4]
+    calibrator = StereoCalibrator(workers=1, use_cache=True, cache_dir=str(tmp_path))
+
+    first = calibrator._find_corners_in_all_images(image_pairs)
+    assert calibrator.last_cache_stats["misses"] == len(image_pairs)
+
+    second = calibrator._find_corners_in_all_images(image_pairs)
+    assert calibrator.last_cache_stats["hits"] == len(image_pairs)
+    assert calibrator.last_cache_stats["misses"] == 0
+
+    assert second[3] == first[3]
+    for cached, detected in zip(second[1] + second[2], first[1] + first[2]):
+        assert np.array_equal(cached, detected)
+
+
+def test_corner_cache_detects_only_new_pairs(tmp_path):
+    """
+    验证新增图片对时，只有新增的部分需要重新检测。
+    """
+    image_pairs = file_utils.find_image_pairs(config.CALIBRATION_IMAGE_DIR)[:5]
+    calibrator = StereoCalibrator(workers=1, use_cache=True, cache_dir=str(tmp_path))
+
+    calibrator._find_corners_in_all_images(image_pairs[:3])
+    calibrator._find_corners_in_all_images(image_pairs)
+    assert calibrator.last_cache_stats["hits"] == 3
+    assert calibrator.last_cache_stats["misses"] == 2
@@ -0,0 +1,101 @@
+# tests/test_frame_archive.py
+import numpy as np
+import pytest
+from utils.frame_archive import DisparityArchive
+
+
+def _frames(count, dtype=np.int16, shape=(24, 32)):
+    rng = np.random.default_rng(0)
+    if np.issubdtype(dtype, np.integer):
+        # 包含无效值和接近 int16 上下限的值，验证差分的按位回绕能够正确还原
+        frames = rng.integers(-16, 2048, size=(count, *shape)).astype(dtype)
+        frames[:, 0, :2] = [np.iinfo(dtype).min, np.iinfo(dtype).max]
+        return list(frames)
+    frames = rng.uniform(100, 1000, size=(count, *shape)).astype(dtype)
+    frames[:, 0, 0] = np.inf
+    frames[:, 1, 1] = np.nan
+    return list(frames)
+
+
+def test_round_trip_and_random_access(tmp_path):
+    path = str(tmp_path / "archive")
+    frames = _frames(8)
+    Q = np.diag([1.0, 1.0, 0.0, 0.05])
+    with DisparityArchive(path, mode="w", chunk_frames=3) as archive:
+        for index, frame in enumerate(frames):
+            archive.append(frame, timestamp=index * 0.5, Q=Q)
+        # 未写入分块文件的帧也可以读取
+        assert np.array_equal(archive[-1], frames[-1])
+
+    archive = DisparityArchive(path)
+    assert len(archive) == 8
+    assert np.array_equal(archive.Q, Q)
+    assert np.array_equal(archive.timestamps, np.arange(8) * 0.5)
+    for index in [5, 0, 7, 3]:
+        assert np.array_equal(archive[index], frames[index])
+    assert all(np.array_equal(a, b) for a, b in zip(archive, frames))
+    with pytest.raises(IndexError):
+        archive[8]
+    with pytest.raises(IOError):
+        archive.append(frames[0])
+
+
+def test_append_to_existing_archive(tmp_path):
+    path = str(tmp_path / "archive")
+    frames = _frames(5)
+    with DisparityArchive(path, mode="w") as archive:
+        for frame in frames[:2]:
+            archive.append(frame)
+    with DisparityArchive(path, mode="a") as archive:
+        for frame in frames[2:]:
+            archive.append(frame)
+
+    archive = DisparityArchive(path)
+    assert np.array_equal(archive.timestamps, np.arange(5))
+    assert all(np.array_equal(archive[i], frames[i]) for i in range(5))
+    with pytest.raises(FileExistsError):
+        DisparityArchive(path, mode="w")
+
+
+def test_float_frames_and_mismatched_input(tmp_path):
+    path = str(tmp_path / "depth")
+    frames = _frames(3, dtype=np.float32)
+    with DisparityArchive(path, mode="w", codec="zlib") as archive:
+        for frame in frames:
+            archive.append(frame)
+        with pytest.raises(ValueError):
+            archive.append(np.zeros((24, 32), dtype=np.int16))
+        with pytest.raises(ValueError):
+            archive.append(np.zeros((10, 10), dtype=np.float32))
+
+    archive = DisparityArchive(path)
+    assert all(np.array_equal(archive[i], frames[i], equal_nan=True) for i in range(3))
+
+
+def test_index_stays_small_and_interrupted_flush_is_discarded(tmp_path):
+    """
+    验证 index.json 的大小不随帧数增长；frames.idx 中上次中断时多写的记录不会被当作帧，继续追加时被截掉。
+    """
+    path = tmp_path / "archive"
+    frames = _frames(12)
+    with DisparityArchive(str(path), mode="w", chunk_frames=2) as archive:
+        archive.append(frames[0])
+        archive.append(frames[1])
+        header_size = (path / "index.json").stat().st_size
+        for frame in frames[2:10]:
+            archive.append(frame)
+        # 只有分块数和帧数的位数可能变化
+        assert (path / "index.json").stat().st_size <= header_size + 2
+
+    # 模拟在追加记录之后、更新 index.json 之前中断
+    with open(path / "frames.idx", "ab") as f:
+        f.write(b"\xff" * 24)
+    assert len(DisparityArchive(str(path))) == 10
+
+    with DisparityArchive(str(path), mode="a") as archive:
+        for frame in frames[10:]:
+            archive.append(frame)
+    archive = DisparityArchive(str(path))
+    assert np.array_equal(archive.timestamps, np.arange(12))
+    assert all(np.array_equal(archive[i], frames[i]) for i in range(12))
+
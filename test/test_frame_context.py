@@ -0,0 +1,71 @@
+# tests/test_frame_context.py
+import cv2
+import numpy as np
+import pytest
+import config
+from utils import image_utils, profiling
+from utils.frame_context import FrameContext, FrameContextPool
+from processing.stereo_matcher import StereoMatcher
+from processing.reconstructor import Reconstructor
+
+
+def test_frame_context_reuses_buffers_and_counts_allocations():
+    context = FrameContext()
+    context.begin_frame()
+    first = context.buffer("a", (4, 5), np.float32)
+    context.buffer("b", (4, 5))
+    assert context.memory_report()["allocations"] == 2
+
+    context.begin_frame()
+    assert context.buffer("a", (4, 5), np.float32) is first
+    assert context.late_allocations == 0
+    assert context.resident_bytes == 4 * 5 * 4 + 4 * 5
+
+    # 分辨率变化时重新分配，计入预热之后的分配
+    context.buffer("a", (8, 5), np.float32)
+    report = context.memory_report()
+    assert report["late_allocations"] == 1
+    assert report["resident_bytes"] == 8 * 5 * 4 + 4 * 5
+    assert report["peak_bytes"] == report["resident_bytes"]
+
+
+def test_pool_hands_out_each_context_once():
+    pool = FrameContextPool(2)
+    first, second = pool.acquire(), pool.acquire()
+    assert first is not second
+    pool.release(first)
+    assert pool.acquire() is first
+    assert pool.memory_report()["contexts"] == 2 and pool.memory_report()["frames"] == 3
+
+
+@pytest.mark.parametrize("reconstruction_mode", Reconstructor.MODES)
+def test_pipeline_with_context_matches_fresh_arrays_without_allocating(reconstruction_mode):
+    """
+    使用 FrameContext 时校正、匹配和重建的结果与不使用时完全相同，预热之后不再分配帧大小的数组。
+    """
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+    preprocessor = image_utils.StereoPreprocessor(rectifier, reuse_buffers=False)
+    matcher = StereoMatcher(mode="full")
+    reconstructor = Reconstructor(mode=reconstruction_mode)
+
+    def process(context):
+        left_gray, right_gray, left_color, Q = preprocessor.process(left_img, right_img, context=context)
+        disparity = matcher.compute_disparity(left_gray, right_gray, context=context)
+        points, (cloud, colors) = reconstructor.reconstruct(disparity, left_color, Q, context=context)
+        depth = reconstructor.reconstruct_depth(disparity, Q, context=context)
+        return disparity, points, cloud, colors, depth
+
+    expected = [np.array(value) for value in process(None)]
+    context = FrameContext()
+    for _ in range(2):
+        context.begin_frame()
+        with profiling.traced_allocations() as allocations:
+            results = process(context)
+
+    for result, reference in zip(results, expected):
+        assert np.array_equal(result, reference, equal_nan=True)
+    assert context.late_allocations == 0
+    # 只剩下少量 Python 对象和行/列系数向量，远小于一幅灰度图
+    assert allocations["peak_bytes"] < left_img.shape[0] * left_img.shape[1] // 4
@@ -0,0 +1,51 @@
+# tests/test_headless.py
+import logging
+import sys
+import cv2
+import numpy as np
+import pytest
+import config
+import main
+from utils import ply_io
+
+
+@pytest.fixture
+def no_windows(monkeypatch):
+    """任何 HighGUI 调用都会让测试失败。"""
+    def fail(*args, **kwargs):
+        raise AssertionError("headless mode must not touch window code")
+
+    for name in ("imshow", "namedWindow", "waitKey", "setMouseCallback", "destroyAllWindows", "destroyWindow"):
+        monkeypatch.setattr(cv2, name, fail)
+
+
+@pytest.fixture
+def restore_root_logging():
+    """main.main() 会替换根日志记录器的处理器和级别，测试结束后恢复，避免影响之后的测试。"""
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_headless_run_writes_outputs(tmp_path, monkeypatch, no_windows, restore_root_logging):
+    monkeypatch.setattr(config, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "DISPARITY_COLOR_PATH", str(tmp_path / "disparity_color.png"))
+    monkeypatch.setattr(config, "DEPTH_MAP_PATH", str(tmp_path / "depth.npy"))
+    monkeypatch.setattr(config, "POINT_CLOUD_PATH", str(tmp_path / "point_cloud.ply"))
+    monkeypatch.setattr(config, "VERBOSE_MODE", True)
+    monkeypatch.setattr(sys, "argv", ["main.py", "-v", "run", "--headless"])
+
+    main.main()
+
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    colorized = cv2.imread(config.DISPARITY_COLOR_PATH)
+    assert colorized.shape == left_img.shape
+
+    depth = np.load(config.DEPTH_MAP_PATH)
+    assert depth.shape == left_img.shape[:2] and depth.dtype == np.float32
+    assert np.isfinite(depth).any()
+
+    points, colors = ply_io.read_ply(config.POINT_CLOUD_PATH)
+    assert len(points) > 0 and len(colors) == len(points)
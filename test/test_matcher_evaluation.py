@@ -0,0 +1,65 @@
+# tests/test_matcher_evaluation.py
+import numpy as np
+import pytest
+import config
+from utils import file_utils, image_utils
+from utils.synthetic_stereo import render_with_calibration
+from processing.stereo_matcher import StereoMatcher
+from processing.matcher_evaluation import evaluate_disparity, evaluate_matcher, make_scenes, config_overrides
+
+
+def test_evaluate_disparity_counts_unmatched_pixels_as_bad():
+    ground_truth = np.full((2, 4), 10.0, dtype=np.float32)
+    valid = np.ones((2, 4), dtype=bool)
+    valid[1, 3] = False  # 不参与评估
+    # 误差: 0, 0.5, 1.5, 无匹配 / 3, 0, 0.25, (不评估)
+    disparity = (np.array([[10.0, 10.5, 8.5, -1.0],
+                           [13.0, 10.0, 10.25, 0.0]]) * 16).astype(np.int16)
+
+    report = evaluate_disparity(disparity, ground_truth, valid, min_disparity=0)
+    assert report["pixels"] == 7
+    assert report["density"] == pytest.approx(6 / 7)
+    assert report["epe_px"] == pytest.approx((0 + 0.5 + 1.5 + 3 + 0 + 0.25) / 6)
+    assert report["bad_1"] == pytest.approx(3 / 7)
+    assert report["bad_0.5"] == pytest.approx(3 / 7)
+    assert report["bad_3"] == pytest.approx(1 / 7)
+
+
+def test_config_overrides_restores_values_and_rejects_unknown_names():
+    original = config.SGBM_UNIQUENESS_RATIO
+    with config_overrides(SGBM_UNIQUENESS_RATIO=original + 3):
+        assert config.SGBM_UNIQUENESS_RATIO == original + 3
+    assert config.SGBM_UNIQUENESS_RATIO == original
+
+    with pytest.raises(ValueError):
+        with config_overrides(SGBM_NOT_A_PARAMETER=1):
+            pass
+
+
+@pytest.fixture(scope="module")
+def stereo_params():
+    return file_utils.load_stereo_params(config.CAMERA_PARAMS_PATH)
+
+
+def test_rendered_capture_rectifies_back_onto_the_ground_truth(stereo_params):
+    capture = render_with_calibration(stereo_params, image_size=(320, 240), num_disparities=32, seed=2)
+    assert capture.left.shape == capture.right.shape == (240, 320, 3)
+
+    rectifier = image_utils.Rectifier(stereo_params=stereo_params, persist=False)
+    left, right, Q = rectifier.rectify(capture.left, capture.right)
+    assert np.allclose(Q, capture.Q)
+
+    matcher = StereoMatcher(mode="full", num_disparities=32)
+    report = evaluate_disparity(matcher.compute_disparity(left, right), capture.disparity, capture.valid,
+                                matcher.min_disparity)
+    assert report["density"] > 0.8
+    assert report["epe_px"] < 1.0
+
+
+def test_evaluate_matcher_summarizes_accuracy_and_time(stereo_params):
+    scenes = make_scenes(2, (320, 240), num_disparities=32, stereo_params=stereo_params)
+    summary = evaluate_matcher(StereoMatcher(mode="full", num_disparities=32), scenes, stereo_params)
+    assert summary["scenes"] == 2
+    assert summary["match_ms"] > 0 and summary["rectify_ms"] > 0
+    assert summary["epe_px"] < 1.0
+    assert 0.0 <= summary["bad_2"] <= summary["bad_1"] <= 1.0
@@ -0,0 +1,49 @@
+# tests/test_ply_io.py
+import numpy as np
+import pytest
+from utils import ply_io
+
+
+def test_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(1000, 3)).astype(np.float32)
+    colors = rng.integers(0, 256, size=(1000, 3), dtype=np.uint8)
+    path = str(tmp_path / "cloud.ply")
+
+    ply_io.write_ply(path, points, colors)
+    for mmap in (True, False):
+        loaded_points, loaded_colors = ply_io.read_ply(path, mmap=mmap)
+        assert np.array_equal(loaded_points, points)
+        assert np.array_equal(loaded_colors, colors)
+
+    ply_io.write_ply(path, points)
+    loaded_points, loaded_colors = ply_io.read_ply(path)
+    assert np.array_equal(loaded_points, points) and loaded_colors is None
+
+
+def test_reads_foreign_layout(tmp_path):
+    """
+    其他工具写出的文件：大端字节序、双精度坐标、额外的属性以及顶点之后的面元素。
+    """
+    vertex_dtype = np.dtype([("x", ">f8"), ("y", ">f8"), ("z", ">f8"), ("nx", ">f4"),
+                             ("red", "u1"), ("green", "u1"), ("blue", "u1"), ("alpha", "u1")])
+    vertices = np.zeros(3, dtype=vertex_dtype)
+    vertices["x"], vertices["y"], vertices["z"] = [1, 2, 3], [4, 5, 6], [7, 8, 9]
+    vertices["red"], vertices["green"], vertices["blue"] = [10, 20, 30], [40, 50, 60], [70, 80, 90]
+    header = ("ply\nformat binary_big_endian 1.0\ncomment written elsewhere\nelement vertex 3\n"
+              "property double x\nproperty double y\nproperty double z\nproperty float nx\n"
+              "property uchar red\nproperty uchar green\nproperty uchar blue\nproperty uchar alpha\n"
+              "element face 0\nproperty list uchar int vertex_indices\nend_header\n")
+    path = tmp_path / "foreign.ply"
+    path.write_bytes(header.encode("ascii") + vertices.tobytes())
+
+    points, colors = ply_io.read_ply(str(path))
+    assert np.array_equal(points, [[1, 4, 7], [2, 5, 8], [3, 6, 9]])
+    assert np.array_equal(colors, [[10, 40, 70], [20, 50, 80], [30, 60, 90]])
+
+
+def test_rejects_ascii_ply(tmp_path):
+    path = tmp_path / "ascii.ply"
+    path.write_text("ply\nformat ascii 1.0\nelement vertex 0\nproperty float x\nend_header\n")
+    with pytest.raises(ValueError):
+        ply_io.read_ply(str(path))
@@ -0,0 +1,48 @@
+# tests/test_point_cloud.py
+import numpy as np
+import pytest
+from processing import point_cloud
+from processing.point_cloud import voxel_downsample
+
+
+def test_voxel_centroids_and_mean_colors():
+    points = np.array([[0.1, 0.1, 0.1], [0.3, 0.3, 0.3],   # 同一个体素
+                       [1.5, 0.2, 0.2],                      # 相邻体素
+                       [5.2, 5.2, 5.2]], dtype=np.float32)
+    colors = np.array([[0, 0, 0], [100, 200, 255], [10, 20, 30], [7, 8, 9]], dtype=np.uint8)
+
+    out_points, out_colors = voxel_downsample(points, colors, voxel_size=1.0)
+
+    order = np.lexsort(out_points.T[::-1])
+    assert np.allclose(out_points[order], [[0.2, 0.2, 0.2], [1.5, 0.2, 0.2], [5.2, 5.2, 5.2]])
+    assert out_colors.dtype == np.uint8
+    assert np.array_equal(out_colors[order], [[50, 100, 128], [10, 20, 30], [7, 8, 9]])
+
+
+def test_dense_and_sparse_paths_agree(monkeypatch):
+    """
+    稠密计数和排序去重两条路径应该给出相同的体素集合。
+    """
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 50, size=(20000, 3))
+    colors = rng.integers(0, 256, size=(20000, 3), dtype=np.uint8)
+
+    dense = voxel_downsample(points, colors, voxel_size=2.0)
+    monkeypatch.setattr(point_cloud, "_DENSE_GRID_FACTOR", 0)
+    sparse = voxel_downsample(points, colors, voxel_size=2.0)
+
+    assert np.allclose(dense[0], sparse[0])
+    assert np.array_equal(dense[1], sparse[1])
+    # 每个非空体素恰好输出一个点
+    occupied = np.unique(np.floor((points - points.min(axis=0)) / 2.0), axis=0)
+    assert len(dense[0]) == len(occupied)
+
+
+def test_non_finite_points_are_dropped():
+    points = np.array([[0, 0, 0], [np.inf, 0, 0], [np.nan, 1, 1]], dtype=np.float32)
+    out_points, out_colors = voxel_downsample(points, None, voxel_size=1.0)
+    assert out_colors is None
+    assert np.array_equal(out_points, [[0, 0, 0]])
+
+    with pytest.raises(ValueError):
+        voxel_downsample(points, None, voxel_size=0)
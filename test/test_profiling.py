@@ -0,0 +1,71 @@
+# tests/test_profiling.py
+import csv
+import json
+import numpy as np
+from utils import profiling
+
+
+def test_timed_records_calls_as_context_manager_and_decorator():
+    registry = profiling.TimerRegistry()
+
+    @profiling.timed("square", registry)
+    def square(x):
+        return x * x
+
+    assert square(3) == 9
+    assert square(4) == 16
+    with profiling.timed("block", registry):
+        sum(range(1000))
+
+    stats = registry.to_dict()
+    assert list(stats) == ["square", "block"]
+    assert stats["square"]["calls"] == 2
+    assert stats["block"]["wall_s"] >= 0 and stats["block"]["cpu_s"] >= 0
+    # 未开启内存跟踪时不记录峰值内存
+    assert stats["block"]["peak_mem_mb"] is None
+
+
+def test_exception_is_still_recorded_and_propagated():
+    registry = profiling.TimerRegistry()
+    try:
+        with profiling.timed("failing", registry):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert registry["failing"].calls == 1
+
+
+def test_peak_memory_of_nested_stages():
+    """
+    验证内层阶段的峰值内存也计入外层阶段，而外层在内层之后的分配不计入内层。
+    """
+    registry = profiling.TimerRegistry()
+    profiling.start_memory_tracking()
+    try:
+        with profiling.timed("outer", registry):
+            with profiling.timed("inner", registry):
+                inner = np.ones(4 * 2**20, dtype=np.uint8)
+                del inner
+            outer = np.ones(2 * 2**20, dtype=np.uint8)
+            del outer
+    finally:
+        profiling.stop_memory_tracking()
+
+    stats = registry.to_dict()
+    assert 4.0 <= stats["inner"]["peak_mem_mb"] < 5.0
+    assert 4.0 <= stats["outer"]["peak_mem_mb"] < 5.0
+
+
+def test_export_json_and_csv(tmp_path):
+    registry = profiling.TimerRegistry()
+    with profiling.timed("stage", registry):
+        pass
+
+    registry.export(str(tmp_path / "timings.json"))
+    registry.export(str(tmp_path / "timings.csv"))
+
+    with open(tmp_path / "timings.json", encoding="utf-8") as f:
+        assert json.load(f)["stage"]["calls"] == 1
+    with open(tmp_path / "timings.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["stage"] == "stage" and rows[0]["calls"] == "1"
@@ -0,0 +1,117 @@
+# tests/test_reconstructor.py
+import cv2
+import numpy as np
+import pytest
+import config
+from utils import image_utils
+from processing.stereo_matcher import StereoMatcher
+from processing.reconstructor import Reconstructor, DisparityLUT
+
+
+@pytest.fixture(scope="module")
+def disparity_and_image():
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+    left_rectified, right_rectified, Q = rectifier.rectify(left_img, right_img)
+    disparity = StereoMatcher().compute_disparity(left_rectified, right_rectified)
+    return disparity, left_rectified, Q
+
+
+def test_lut_matches_reproject_image_to_3d(disparity_and_image):
+    """
+    验证查找表模式与 cv2.reprojectImageTo3D 的结果在浮点误差范围内一致。
+    """
+    disparity, left_rectified, Q = disparity_and_image
+    expected_matrix, (expected_points, expected_colors) = Reconstructor("reproject").reconstruct(
+        disparity, left_rectified, Q
+    )
+    points_matrix, (points, colors) = Reconstructor("lut").reconstruct(disparity, left_rectified, Q)
+
+    finite = np.isfinite(expected_matrix)
+    assert np.array_equal(finite, np.isfinite(points_matrix))
+    assert np.allclose(points_matrix[finite], expected_matrix[finite], rtol=1e-5)
+    assert np.allclose(points, expected_points, rtol=1e-5)
+    assert np.array_equal(colors, expected_colors)
+
+
+def test_depth_only_output(disparity_and_image):
+    disparity, left_rectified, Q = disparity_and_image
+    reconstructor = Reconstructor("lut")
+    depth = reconstructor.reconstruct_depth(disparity, Q)
+    expected = Reconstructor("reproject").reconstruct_depth(disparity, Q)
+
+    assert depth.shape == disparity.shape and depth.dtype == np.float32
+    finite = np.isfinite(expected)
+    assert np.allclose(depth[finite], expected[finite], rtol=1e-5)
+
+
+def test_non_rectified_q_falls_back_to_reproject(disparity_and_image):
+    disparity, left_rectified, Q = disparity_and_image
+    skewed_Q = Q.copy()
+    skewed_Q[2, 0] = 1e-3
+    assert not DisparityLUT.is_supported(skewed_Q)
+
+    depth = Reconstructor("lut").reconstruct_depth(disparity, skewed_Q)
+    expected = Reconstructor("reproject").reconstruct_depth(disparity, skewed_Q)
+    assert np.array_equal(depth, expected, equal_nan=True)
+
+
+@pytest.mark.parametrize("mode", Reconstructor.MODES)
+def test_lazy_result_matches_full_reconstruction(disparity_and_image, mode):
+    """
+    验证惰性结果的单点查询、子网格和过滤点云与完整重建结果中对应的部分一致。
+    """
+    disparity, left_rectified, Q = disparity_and_image
+    reconstructor = Reconstructor(mode)
+    points_matrix, _ = reconstructor.reconstruct(disparity, left_rectified, Q)
+    result = reconstructor.reconstruct_lazy(disparity, left_rectified, Q)
+
+    assert result.shape == points_matrix.shape
+    h, w = disparity.shape
+    for y, x in [(0, 0), (h // 2, w // 2), (h - 1, w - 1), (h // 3, 2 * w // 3)]:
+        assert np.allclose(result[y, x], points_matrix[y, x], rtol=1e-5, equal_nan=True)
+
+    stride, roi = 4, (17, 9, w // 2, h // 2)
+    points, colors = result.subset(stride=stride, roi=roi)
+    x, y, roi_w, roi_h = roi
+    expected = points_matrix[y:y + roi_h:stride, x:x + roi_w:stride]
+    finite = np.isfinite(expected)
+    assert points.shape == expected.shape
+    assert np.allclose(points[finite], expected[finite], rtol=1e-5)
+    assert np.array_equal(colors, cv2.cvtColor(left_rectified, cv2.COLOR_BGR2RGB)[y:y + roi_h:stride, x:x + roi_w:stride])
+
+    # 过滤规则与 reconstruct() 相同：有效视差并且深度小于上限
+    cloud_points, cloud_colors = result.filtered_cloud(stride=stride)
+    sampled_disparity = disparity[::stride, ::stride]
+    sampled_points = points_matrix[::stride, ::stride]
+    mask = (sampled_disparity > disparity.min()) & (sampled_points[:, :, 2] < config.POINT_CLOUD_MAX_DEPTH)
+    assert np.allclose(cloud_points, sampled_points[mask], rtol=1e-5)
+    assert len(cloud_colors) == len(cloud_points)
+
+
+@pytest.mark.parametrize("mode", Reconstructor.MODES)
+def test_lazy_result_of_a_region_uses_full_image_coordinates(disparity_and_image, mode):
+    """
+    只覆盖一个区域的视差图加上 origin 后，三维坐标与整幅重建中相同像素的结果一致。
+    """
+    disparity, left_rectified, Q = disparity_and_image
+    reconstructor = Reconstructor(mode)
+    full = reconstructor.reconstruct_lazy(disparity, left_rectified, Q)
+    x, y, w, h = 200, 120, 160, 100
+    region = reconstructor.reconstruct_lazy(disparity[y:y + h, x:x + w], left_rectified[y:y + h, x:x + w], Q,
+                                            origin=(x, y), invalid_disparity=disparity.min())
+
+    assert np.allclose(region.point_at(x + 5, y + 7), full.point_at(x + 5, y + 7), rtol=1e-5, equal_nan=True)
+    with pytest.raises(IndexError):
+        region.point_at(x - 1, y)
+
+    # ROI 超出区域的部分被裁掉
+    points, _ = region.subset(roi=(x - 50, y + 10, 100, 20))
+    expected, _ = full.subset(roi=(x, y + 10, 50, 20))
+    assert points.shape == expected.shape
+    assert np.allclose(points, expected, rtol=1e-5, equal_nan=True)
+
+    cloud_points, _ = region.filtered_cloud()
+    expected_points, _ = full.filtered_cloud(roi=(x, y, w, h))
+    assert np.allclose(cloud_points, expected_points, rtol=1e-5)
@@ -0,0 +1,83 @@
+# tests/test_rectifier.py
+import cv2
+import numpy as np
+import config
+from utils import file_utils, image_utils
+
+
+def _load_pair():
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    return left_img, right_img
+
+
+def test_rectifier_matches_direct_rectification():
+    """
+    验证缓存的映射表与每次直接调用 stereoRectify 得到的结果完全一致。
+    """
+    params = file_utils.load_stereo_params(config.CAMERA_PARAMS_PATH)
+    left_img, right_img = _load_pair()
+    h, w = left_img.shape[:2]
+
+    R1, R2, P1, P2, Q, _, _ = cv2.stereoRectify(
+        params['K1'], params['D1'], params['K2'], params['D2'], (w, h), params['R'], params['T'], alpha=0
+    )
+    map1, map2 = cv2.initUndistortRectifyMap(params['K1'], params['D1'], R1, P1, (w, h), cv2.CV_16SC2)
+    expected_left = cv2.remap(left_img, map1, map2, cv2.INTER_LINEAR)
+
+    image_utils.clear_rectification_cache()
+    rectifier = image_utils.Rectifier(stereo_params=params, alpha=0, persist=False)
+    left_rectified, _, Q_cached = rectifier.rectify(left_img, right_img)
+
+    assert np.array_equal(left_rectified, expected_left)
+    assert np.allclose(Q_cached, Q)
+    # 第二次调用应直接命中内存缓存
+    assert rectifier.get_maps((w, h)) is rectifier.get_maps((w, h))
+
+
+def test_rectifier_persists_and_reloads_maps(tmp_path):
+    """
+    验证映射表持久化后，新的校正器可以从磁盘 mmap 读取并得到相同的结果。
+    """
+    left_img, right_img = _load_pair()
+
+    image_utils.clear_rectification_cache()
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=True, cache_dir=str(tmp_path))
+    expected_left, expected_right, expected_Q = rectifier.rectify(left_img, right_img)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # 模拟一个全新的进程：清空内存缓存后重新加载
+    image_utils.clear_rectification_cache()
+    reloaded = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=True, cache_dir=str(tmp_path))
+    maps = reloaded.get_maps(left_img.shape[1::-1])
+    assert isinstance(maps.left_map1, np.memmap)
+
+    left_rectified, right_rectified, Q = reloaded.rectify(left_img, right_img)
+    assert np.array_equal(left_rectified, expected_left)
+    assert np.array_equal(right_rectified, expected_right)
+    assert np.array_equal(Q, expected_Q)
+
+
+def test_preprocessor_matches_rectify_then_gray_and_reuses_buffers():
+    left_img, right_img = _load_pair()
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+    left_rectified, right_rectified, Q = rectifier.rectify(left_img, right_img)
+
+    preprocessor = image_utils.StereoPreprocessor(rectifier)
+    first = preprocessor.process(left_img, right_img)
+    # 先转灰度再插值与先插值再转灰度只差舍入误差
+    for gray, rectified in ((first.left_gray, left_rectified), (first.right_gray, right_rectified)):
+        expected = cv2.cvtColor(rectified, cv2.COLOR_BGR2GRAY)
+        assert gray.shape == expected.shape
+        assert np.abs(gray.astype(np.int16) - expected).max() <= 1
+    assert np.array_equal(first.left_color, left_rectified)
+    assert np.array_equal(first.Q, Q)
+
+    # 同一尺寸的下一帧写入同一组缓冲区
+    second = preprocessor.process(right_img, left_img)
+    assert second.left_gray is first.left_gray and second.left_color is first.left_color
+
+    gray_only = image_utils.StereoPreprocessor(rectifier, with_color=False, reuse_buffers=False)
+    third = gray_only.process(left_img, right_img)
+    assert third.left_color is None
+    assert third.left_gray is not gray_only.process(left_img, right_img).left_gray
@@ -0,0 +1,91 @@
+# tests/test_roi_pipeline.py
+import sys
+import cv2
+import numpy as np
+import pytest
+import config
+import main
+from utils import image_utils
+from processing.stereo_matcher import StereoMatcher, compare_disparity_maps
+from processing.reconstructor import Reconstructor
+from processing.roi_pipeline import parse_roi, clip_roi, process_roi, paste_roi, compare_with_full_frame
+
+
+@pytest.fixture(scope="module")
+def raw_pair():
+    return cv2.imread(config.TEST_IMAGE_LEFT_PATH), cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+
+
+@pytest.fixture(scope="module")
+def rectifier():
+    return image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+
+
+def test_parse_and_clip_roi():
+    assert parse_roi("10,20,30,40") == (10, 20, 30, 40)
+    for text in ("10,20,30", "a,b,c,d", "10,20,0,40"):
+        with pytest.raises(ValueError):
+            parse_roi(text)
+    assert clip_roi((-10, 460, 100, 100), (640, 480)) == (0, 460, 90, 20)
+    with pytest.raises(ValueError):
+        clip_roi((700, 0, 10, 10), (640, 480))
+
+
+def test_rectify_region_matches_full_rectification(raw_pair, rectifier):
+    left_rectified, right_rectified, Q = rectifier.rectify(*raw_pair)
+    left_window, right_window, window_Q = rectifier.rectify_region(*raw_pair, (100, 50, 300, 200), right_shift=16)
+    assert np.array_equal(left_window, left_rectified[50:200, 100:300])
+    assert np.array_equal(right_window, right_rectified[50:200, 84:284])
+    assert np.array_equal(window_Q, Q)
+    with pytest.raises(ValueError):
+        rectifier.rectify_region(*raw_pair, (10, 0, 100, 100), right_shift=16)
+
+
+def test_roi_disparity_and_points_match_full_frame(raw_pair, rectifier):
+    matcher = StereoMatcher(mode="full")
+    roi = (200, 150, 160, 120)
+    result = process_roi(rectifier, matcher, *raw_pair, roi)
+    assert result.roi == roi
+    assert result.disparity.shape == (120, 160) and result.disparity.dtype == np.int16
+    assert result.left_rectified.shape == (120, 160, 3)
+    assert set(result.timings) == {"rectify", "match"}
+
+    left_rectified, right_rectified, Q = rectifier.rectify(*raw_pair)
+    full = matcher.compute_disparity(left_rectified, right_rectified)
+    report = compare_disparity_maps(full[150:270, 200:360], result.disparity, matcher.min_disparity)
+    assert report["bad_pixel_rate"] < 0.1
+    assert report["candidate_valid_ratio"] > 0.8 * report["reference_valid_ratio"]
+
+    # 视差相同的像素，三维坐标与整幅重建完全一致
+    reconstructor = Reconstructor()
+    roi_reconstruction = reconstructor.reconstruct_lazy(result.disparity, result.left_rectified, result.Q,
+                                                        origin=roi[:2], invalid_disparity=(matcher.min_disparity - 1) * 16)
+    full_reconstruction = reconstructor.reconstruct_lazy(full, left_rectified, Q)
+    rows, columns = np.nonzero((full[150:270, 200:360] == result.disparity) & (result.disparity >= 0))
+    row, column = rows[len(rows) // 2], columns[len(columns) // 2]
+    assert np.allclose(roi_reconstruction.point_at(200 + column, 150 + row),
+                       full_reconstruction.point_at(200 + column, 150 + row))
+
+    comparison = compare_with_full_frame(rectifier, matcher, *raw_pair, result)
+    assert comparison["full_match_ms"] > 0 and comparison["speedup"] > 0
+
+
+def test_paste_roi_fills_outside():
+    full = paste_roi(np.ones((2, 3), dtype=np.float32), (1, 2, 3, 2), (5, 4), np.nan)
+    assert full.shape == (4, 5)
+    assert np.all(full[2:4, 1:4] == 1) and np.isnan(full).sum() == 20 - 6
+
+
+def test_headless_roi_run_writes_full_size_outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "DISPARITY_COLOR_PATH", str(tmp_path / "disparity_color.png"))
+    monkeypatch.setattr(config, "DEPTH_MAP_PATH", str(tmp_path / "depth.npy"))
+    monkeypatch.setattr(config, "POINT_CLOUD_PATH", str(tmp_path / "point_cloud.ply"))
+    monkeypatch.setattr(sys, "argv", ["main.py", "run", "--headless", "--roi", "200,150,160,120"])
+
+    main.main()
+
+    depth = np.load(config.DEPTH_MAP_PATH)
+    assert depth.shape == (480, 640)
+    assert np.isnan(depth[:150]).all() and np.isfinite(depth[150:270, 200:360]).any()
+    assert cv2.imread(config.DISPARITY_COLOR_PATH).shape == (480, 640, 3)
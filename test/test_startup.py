@@ -0,0 +1,79 @@
+# tests/test_startup.py
+import os
+import subprocess
+import sys
+import cv2
+import config
+
+MAIN_PATH = os.path.join(config.PROJECT_ROOT, "main.py")
+
+# 冷启动导入耗时的上限（秒）。留有较大余量，只用于发现把重量级模块重新放回顶层导入这类回归
+HELP_IMPORT_BUDGET = 0.5
+HEADLESS_IMPORT_BUDGET = 3.0
+
+
+def _import_profile(*args, output_dir=None):
+    """
+    用 python -X importtime 运行 main.py，返回 ({模块名: 累计导入耗时(秒)}, 顶层导入的总耗时)。
+    output_dir 不为 None 时先把 config 中的输出文件路径改到该目录，避免测试覆盖 output/ 中的结果。
+    """
+    command = [sys.executable, "-X", "importtime", MAIN_PATH, *args]
+    if output_dir is not None:
+        launcher = (
+            "import os, runpy, sys, config\n"
+            f"output_dir = {str(output_dir)!r}\n"
+            "config.OUTPUT_DIR = output_dir\n"
+            "for name in ('DISPARITY_COLOR_PATH', 'DEPTH_MAP_PATH', 'POINT_CLOUD_PATH'):\n"
+            "    setattr(config, name, os.path.join(output_dir, os.path.basename(getattr(config, name))))\n"
+            f"sys.argv = {[MAIN_PATH, *args]!r}\n"
+            f"runpy.run_path({MAIN_PATH!r}, run_name='__main__')\n"
+        )
+        command = [sys.executable, "-X", "importtime", "-c", launcher]
+    result = subprocess.run(command, cwd=config.PROJECT_ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    modules, total = {}, 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        seconds = int(cumulative) / 1e6
+        modules[name.strip()] = seconds
+        # 没有缩进的是顶层导入，它们的累计耗时之和就是全部导入耗时
+        if not name.startswith("  "):
+            total += seconds
+    return modules, total
+
+
+def test_help_does_not_import_heavy_modules():
+    modules, total = _import_profile("--help")
+    for heavy in ("cv2", "numpy", "visualization.visualizer", "calibration.calibrator"):
+        assert heavy not in modules, f"'main.py --help' imported {heavy}"
+    assert total < HELP_IMPORT_BUDGET, f"'main.py --help' spent {total:.3f} s importing modules"
+
+
+def test_headless_run_skips_visualization_and_calibration(tmp_path):
+    modules, total = _import_profile("run", "--headless", output_dir=tmp_path)
+    assert "cv2" in modules
+    assert (tmp_path / "depth.npy").exists()
+    for unused in ("visualization.visualizer", "calibration.calibrator", "open3d", "concurrent.futures.process"):
+        assert unused not in modules, f"'main.py run --headless' imported {unused}"
+    assert total < HEADLESS_IMPORT_BUDGET, f"'main.py run --headless' spent {total:.3f} s importing modules"
+
+
+def test_stream_run_skips_visualization_and_calibration():
+    modules, total = _import_profile("run", "--stream", config.TEST_IMAGE_DIR, "--no-write", "--max-frames", "1")
+    assert "cv2" in modules
+    for unused in ("visualization.visualizer", "calibration.calibrator", "open3d", "concurrent.futures.process"):
+        assert unused not in modules, f"'main.py run --stream' imported {unused}"
+    assert total < HEADLESS_IMPORT_BUDGET, f"'main.py run --stream' spent {total:.3f} s importing modules"
+
+
+def test_config_constants_match_opencv():
+    """config.py 不导入 cv2，这里检查手写的常量数值与 OpenCV 一致。"""
+    assert config.TERM_CRITERIA_EPS == cv2.TERM_CRITERIA_EPS
+    assert config.TERM_CRITERIA_MAX_ITER == cv2.TERM_CRITERIA_MAX_ITER
+    assert config.CALIB_USE_INTRINSIC_GUESS == cv2.CALIB_USE_INTRINSIC_GUESS
+    assert config.STEREO_SGBM_MODE_SGBM == cv2.STEREO_SGBM_MODE_SGBM
+    assert config.STEREO_SGBM_MODE_HH == cv2.STEREO_SGBM_MODE_HH
+    assert config.STEREO_SGBM_MODE_SGBM_3WAY == cv2.STEREO_SGBM_MODE_SGBM_3WAY
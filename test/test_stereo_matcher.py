@@ -0,0 +1,166 @@
+# tests/test_stereo_matcher.py
+import cv2
+import numpy as np
+import pytest
+import config
+from utils import image_utils
+from processing.stereo_matcher import StereoMatcher, compare_disparity_maps
+
+
+@pytest.fixture(scope="module")
+def rectified_pair():
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+    left_rectified, right_rectified, _ = rectifier.rectify(left_img, right_img)
+    return left_rectified, right_rectified
+
+
+def test_pyramid_mode_keeps_disparity_contract(rectified_pair):
+    """
+    验证由粗到精模式输出与全分辨率 SGBM 相同格式的视差图，且大部分像素结果一致。
+    """
+    full = StereoMatcher(mode="full").compute_disparity(*rectified_pair)
+    pyramid = StereoMatcher(mode="pyramid").compute_disparity(*rectified_pair)
+
+    assert pyramid.dtype == np.int16
+    assert pyramid.shape == full.shape
+    # 无效值必须统一为 (minDisparity - 1) * 16
+    assert pyramid.min() >= (config.SGBM_MIN_DISPARITY - 1) * 16
+    assert pyramid.max() < (config.SGBM_MIN_DISPARITY + config.SGBM_NUM_DISPARITIES) * 16
+
+    report = compare_disparity_maps(full, pyramid, config.SGBM_MIN_DISPARITY)
+    assert report["candidate_valid_ratio"] > 0.5 * report["reference_valid_ratio"]
+    assert report["bad_pixel_rate"] < 0.15
+
+
+def test_compare_disparity_maps_of_identical_maps():
+    disparity = np.full((4, 4), 32 * 16, dtype=np.int16)
+    disparity[0, 0] = -16
+    report = compare_disparity_maps(disparity, disparity.copy(), 0)
+    assert report["mean_abs_diff_px"] == 0.0
+    assert report["bad_pixel_rate"] == 0.0
+    assert report["reference_valid_ratio"] == pytest.approx(15 / 16)
+
+
+def test_tiled_mode_with_one_band_is_identical(rectified_pair):
+    """
+    只有一个条带时，分带计算应与整图计算逐像素一致。
+    """
+    full = StereoMatcher(mode="full").compute_disparity(*rectified_pair)
+    matcher = StereoMatcher(mode="tiled", band_count=1, workers=1)
+    tiled = matcher.compute_disparity(*rectified_pair)
+    matcher.close()
+    assert np.array_equal(tiled, full)
+
+
+def test_tiled_mode_stitches_bands_within_tolerance(rectified_pair, monkeypatch):
+    """
+    多条带拼接的结果只在条带接缝附近与整图结果有差异。
+    """
+    # MODE_SGBM 在整幅图上做完整的多方向代价聚合，最能暴露条带接缝
+    monkeypatch.setattr(config, "SGBM_MODE", cv2.STEREO_SGBM_MODE_SGBM)
+    full = StereoMatcher(mode="full").compute_disparity(*rectified_pair)
+    matcher = StereoMatcher(mode="tiled", band_count=4, band_overlap=32, workers=4)
+    tiled = matcher.compute_disparity(*rectified_pair)
+    matcher.close()
+
+    assert tiled.dtype == np.int16 and tiled.shape == full.shape
+    report = compare_disparity_maps(full, tiled, config.SGBM_MIN_DISPARITY)
+    assert report["bad_pixel_rate"] < 0.01
+    assert report["candidate_valid_ratio"] == pytest.approx(report["reference_valid_ratio"], abs=0.01)
+
+
+@pytest.mark.parametrize("backend", ["sgbm", "sgbm_5dir", "sgbm_hh", "sgbm_3way", "bm", "sgbm_wls"])
+def test_backends_share_disparity_contract(rectified_pair, backend):
+    """
+    验证每个后端都输出 Reconstructor 和可视化模块所期望的 CV_16S 视差图。
+    """
+    if backend == "sgbm_wls" and not hasattr(cv2, "ximgproc"):
+        pytest.skip("opencv-contrib-python is not installed")
+
+    matcher = StereoMatcher(backend=backend)
+    disparity = matcher.compute_disparity(*rectified_pair)
+
+    assert disparity.dtype == np.int16
+    assert disparity.shape == rectified_pair[0].shape[:2]
+    assert matcher.last_compute_time > 0
+    # 视差以 1/16 像素为单位，最大不超过搜索范围
+    assert disparity.max() <= (config.SGBM_MIN_DISPARITY + config.SGBM_NUM_DISPARITIES) * 16
+    assert (disparity >= config.SGBM_MIN_DISPARITY * 16).mean() > 0.2
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        StereoMatcher(backend="does-not-exist")
+
+
+def _with_moving_patch(rectified_pair, x, disparity=40, size=64):
+    """在左右图像的 (x, 200) 处贴上同一块纹理，右图中向左偏移 disparity 像素。"""
+    left, right = rectified_pair[0].copy(), rectified_pair[1].copy()
+    patch = np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    left[200:200 + size, x:x + size] = patch
+    right[200:200 + size, x - disparity:x - disparity + size] = patch
+    return left, right
+
+
+def test_incremental_mode_reuses_static_frames(rectified_pair):
+    matcher = StereoMatcher(mode="incremental")
+    first = matcher.compute_disparity(*rectified_pair)
+    assert matcher.last_update["full_refresh"]
+    assert np.array_equal(first, StereoMatcher(mode="full").compute_disparity(*rectified_pair))
+
+    second = matcher.compute_disparity(*rectified_pair)
+    assert not matcher.last_update["full_refresh"]
+    assert matcher.last_update["recomputed_ratio"] == 0.0
+    assert np.array_equal(second, first)
+
+
+def test_incremental_mode_recomputes_only_changed_regions(rectified_pair):
+    """
+    只有物体移动的区域被重新计算，结果与整幅计算基本一致。
+    """
+    matcher = StereoMatcher(mode="incremental")
+    full_matcher = StereoMatcher(mode="full")
+    matcher.compute_disparity(*_with_moving_patch(rectified_pair, 200))
+
+    frame = _with_moving_patch(rectified_pair, 216)
+    disparity = matcher.compute_disparity(*frame)
+    update = matcher.last_update
+    assert not update["full_refresh"] and update["tiles"] >= 1
+    assert 0.0 < update["recomputed_ratio"] < 0.3
+    assert update["speedup"] > 0
+
+    report = compare_disparity_maps(full_matcher.compute_disparity(*frame), disparity, config.SGBM_MIN_DISPARITY)
+    assert report["bad_pixel_rate"] < 0.01
+
+
+def test_incremental_mode_refreshes_periodically(rectified_pair, monkeypatch):
+    monkeypatch.setattr(config, "INCREMENTAL_REFRESH_INTERVAL", 2)
+    matcher = StereoMatcher(mode="incremental")
+    refreshes = []
+    for _ in range(5):
+        matcher.compute_disparity(*rectified_pair)
+        refreshes.append(matcher.last_update["full_refresh"])
+    assert refreshes == [True, False, True, False, True]
+
+    # 图像尺寸变化时重新整幅计算
+    matcher.compute_disparity(*(image[:240, :320] for image in rectified_pair))
+    assert matcher.last_update["full_refresh"]
+
+
+def test_incremental_quality_report_does_not_compare_with_cached_result(rectified_pair):
+    """
+    incremental 模式的质量报告在新的匹配器上计算，不会拿上一帧缓存的结果与自己比较，也不改变匹配器的状态。
+    """
+    matcher = StereoMatcher(mode="incremental")
+    matcher.compute_disparity(*_with_moving_patch(rectified_pair, 200))
+    previous = matcher.compute_disparity(*_with_moving_patch(rectified_pair, 216))
+    last_update = dict(matcher.last_update)
+
+    report = matcher.quality_report(*rectified_pair)
+    assert report["last_update"] == last_update and not last_update["full_refresh"]
+    # 新的匹配器对单独一对图像整幅计算，结果与全分辨率相同，而不是返回缓存的上一帧
+    assert report["mean_abs_diff_px"] == 0.0 and report["bad_pixel_rate"] == 0.0
+    assert matcher.last_update == last_update
+    assert matcher.compute_disparity(*_with_moving_patch(rectified_pair, 216)) is previous
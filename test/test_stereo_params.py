@@ -0,0 +1,112 @@
+# tests/test_stereo_params.py
+import os
+import shutil
+import cv2
+import numpy as np
+import pytest
+import config
+from utils import file_utils, image_utils
+
+
+@pytest.fixture
+def params():
+    params = file_utils.load_stereo_params(config.CAMERA_PARAMS_PATH)
+    params["image_size"] = (640, 480)
+    return params
+
+
+def test_binary_round_trip_with_precomputed_rectification(tmp_path, params):
+    path = str(tmp_path / "stereo_params.bin")
+    file_utils.save_stereo_params(path, params)
+    loaded = file_utils.load_stereo_params(path)
+
+    for key in ("K1", "D1", "K2", "D2", "R", "T", "E", "F"):
+        assert np.array_equal(loaded[key], params[key])
+    assert loaded["image_size"] == (640, 480)
+    assert loaded["reprojection_error_L"] == params["reprojection_error_L"]
+
+    expected = file_utils.compute_rectification(params, (640, 480), config.RECTIFY_ALPHA)
+    assert np.array_equal(loaded["Q"], expected["Q"])
+    assert loaded["roi1"] == expected["roi1"]
+
+
+def test_format_is_detected_from_content(tmp_path, params):
+    """
+    格式由文件内容决定，与扩展名无关。
+    """
+    binary_path = str(tmp_path / "stereo_params.bin")
+    file_utils.save_stereo_params(binary_path, params)
+    renamed = str(tmp_path / "params.dat")
+    shutil.copy(binary_path, renamed)
+    yaml_copy = str(tmp_path / "params_yaml.dat")
+    shutil.copy(config.CAMERA_PARAMS_PATH, yaml_copy)
+
+    assert np.array_equal(file_utils.load_stereo_params(renamed)["K1"], params["K1"])
+    assert np.array_equal(file_utils.load_stereo_params(yaml_copy)["K1"], params["K1"])
+
+
+def test_binary_file_is_used_only_while_it_matches_the_yaml(tmp_path, params):
+    yaml_path, binary_path = str(tmp_path / "p.yml"), str(tmp_path / "p.bin")
+    assert file_utils.find_stereo_params(yaml_path, binary_path) == yaml_path
+    file_utils.save_stereo_params(yaml_path, params)
+    file_utils.save_stereo_params(binary_path, params, source_path=yaml_path)
+    assert file_utils.find_stereo_params(yaml_path, binary_path) == binary_path
+
+    # 修改时间不影响选择，只看内容
+    os.utime(yaml_path, (os.path.getmtime(binary_path) + 10,) * 2)
+    assert file_utils.find_stereo_params(yaml_path, binary_path) == binary_path
+
+    params["reprojection_error"] = 1.0
+    file_utils.save_stereo_params(yaml_path, params)
+    os.utime(yaml_path, (os.path.getmtime(binary_path) - 10,) * 2)
+    assert file_utils.find_stereo_params(yaml_path, binary_path) == yaml_path
+
+    # 没有记录来源的二进制文件不会代替已有的 YAML
+    file_utils.save_stereo_params(binary_path, params)
+    assert file_utils.find_stereo_params(yaml_path, binary_path) == yaml_path
+
+
+@pytest.mark.parametrize("key, value, message", [
+    ("K1", np.eye(4), "'K1' must have shape"),
+    ("D2", np.zeros(7), "'D2' must be a vector"),
+    ("R", np.ones((3, 3)), "not a rotation matrix"),
+    ("T", np.array([[1.0], [np.nan], [0.0]]), "non-finite"),
+    ("F", None, "missing 'F'"),
+])
+def test_malformed_parameters_fail_loudly(tmp_path, params, key, value, message):
+    params[key] = value
+    with pytest.raises(ValueError, match=message):
+        file_utils.validate_stereo_params(params)
+
+    # 已经损坏的文件在加载时就会报错（固定布局放不下的形状在写入时就会报错）
+    path = str(tmp_path / "broken.bin")
+    with pytest.raises(ValueError, match=message):
+        file_utils._write_params_binary(path, params)
+        file_utils.load_stereo_params(path)
+
+
+def test_truncated_binary_file_fails_loudly(tmp_path, params):
+    path = str(tmp_path / "stereo_params.bin")
+    file_utils.save_stereo_params(path, params)
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 8)
+    with pytest.raises(ValueError, match="expected"):
+        file_utils.load_stereo_params(path)
+
+
+def test_rectifier_uses_precomputed_rectification(tmp_path, params, monkeypatch):
+    path = str(tmp_path / "stereo_params.bin")
+    file_utils.save_stereo_params(path, params)
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    image_utils.clear_rectification_cache()
+    expected = image_utils.Rectifier(stereo_params=params, persist=False).rectify(left_img, right_img)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("stereoRectify should not be called")
+
+    image_utils.clear_rectification_cache()
+    monkeypatch.setattr(cv2, "stereoRectify", fail)
+    rectified = image_utils.Rectifier.from_file(path, persist=False).rectify(left_img, right_img)
+    assert np.array_equal(rectified[0], expected[0])
+    assert np.array_equal(rectified[2], expected[2])
@@ -0,0 +1,172 @@
+# tests/test_stereo_service.py
+import asyncio
+import http.client
+import json
+import threading
+import time
+import cv2
+import numpy as np
+import pytest
+import config
+from utils import image_utils
+from processing.stereo_service import StereoService, decode_array, encode_compressed_pair, encode_raw_pair
+from processing.stereo_matcher import StereoMatcher
+from processing.reconstructor import Reconstructor
+
+
+@pytest.fixture
+def rectifier():
+    return image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+
+
+@pytest.fixture
+def images():
+    return cv2.imread(config.TEST_IMAGE_LEFT_PATH), cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+
+
+def _start_service(service):
+    """在后台线程的事件循环中启动服务（端口 0），返回 (端口, 停止函数)。"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = asyncio.run_coroutine_threadsafe(service.start(host="127.0.0.1", port=0), loop).result(timeout=30)
+
+    async def shutdown():
+        # 与 asyncio.run 结束时相同：关闭监听并取消仍在等待请求的连接
+        server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=10)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+        service.close()
+        loop.close()
+
+    return service.address[1], stop
+
+
+def _post(port, path, headers, body):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request("POST", path, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, {name.lower(): value for name, value in response.getheaders()}, response.read()
+    finally:
+        connection.close()
+
+
+def test_service_returns_same_disparity_and_depth_as_direct_processing(rectifier, images):
+    """
+    验证服务返回的视差图和深度图与在进程内直接校正、匹配、重建的结果完全相同（原始和 PNG 编码两种请求格式）。
+    """
+    left_img, right_img = images
+    left_gray, right_gray, _, Q = image_utils.StereoPreprocessor(rectifier, with_color=False).process(left_img,
+                                                                                                      right_img)
+    expected_disparity = StereoMatcher().compute_disparity(left_gray, right_gray)
+    expected_depth = Reconstructor().reconstruct_depth(expected_disparity, Q)
+
+    port, stop = _start_service(StereoService(rectifier, workers=1))
+    try:
+        for encode in (encode_raw_pair, encode_compressed_pair):
+            headers, body = encode(left_img, right_img)
+            status, response_headers, payload = _post(port, "/disparity", headers, body)
+            assert status == 200
+            assert np.array_equal(decode_array(response_headers, payload), expected_disparity)
+
+        status, response_headers, payload = _post(port, "/depth", *encode_raw_pair(left_img, right_img))
+        assert status == 200
+        assert np.array_equal(decode_array(response_headers, payload), expected_depth, equal_nan=True)
+
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        connection.request("GET", "/stats")
+        stats = json.loads(connection.getresponse().read())
+        connection.close()
+        assert stats["served"] == 3 and stats["rejected"] == 0 and stats["failed"] == 0
+    finally:
+        stop()
+
+
+def test_service_rejects_malformed_requests(rectifier, images):
+    port, stop = _start_service(StereoService(rectifier, workers=1))
+    try:
+        left_img, right_img = images
+        _, body = encode_raw_pair(left_img, right_img)
+        assert _post(port, "/disparity", {}, body)[0] == 400
+        assert _post(port, "/disparity", {"X-Image-Size": "10x10"}, body)[0] == 400
+        assert _post(port, "/unknown", {}, b"")[0] == 404
+    finally:
+        stop()
+
+
+def test_service_answers_503_when_queue_is_full(rectifier, images, monkeypatch):
+    """
+    验证所有处理线程都忙且排队已满时，新的请求立即得到 503 和 Retry-After，而不是在服务端堆积。
+    """
+    service = StereoService(rectifier, workers=1, queue_size=0)
+    release = threading.Event()
+
+    def blocking_process(output, headers, body, submitted):
+        release.wait(timeout=30)
+        return (1,), "<i2", b"\x00\x00", 0.0, 0.0
+
+    monkeypatch.setattr(service, "_process", blocking_process)
+    port, stop = _start_service(service)
+    try:
+        headers, body = encode_raw_pair(*images)
+        first = {}
+        thread = threading.Thread(target=lambda: first.update(status=_post(port, "/disparity", headers, body)[0]))
+        thread.start()
+        for _ in range(300):
+            if service.summary()["pending"] == 1:
+                break
+            time.sleep(0.01)
+
+        status, response_headers, _ = _post(port, "/disparity", headers, body)
+        assert status == 503 and "retry-after" in response_headers
+
+        release.set()
+        thread.join(timeout=30)
+        assert first["status"] == 200
+        assert service.summary()["rejected"] == 1 and service.summary()["served"] == 1
+    finally:
+        release.set()
+        stop()
+
+
+def test_service_rejects_incremental_matcher(rectifier):
+    with pytest.raises(ValueError):
+        StereoService(rectifier, matcher_mode="incremental", workers=1)
+
+
+def test_unexpected_processing_error_returns_500(rectifier, images, monkeypatch):
+    service = StereoService(rectifier, workers=1)
+
+    def broken_process(output, headers, body, submitted):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(service, "_process", broken_process)
+    port, stop = _start_service(service)
+    try:
+        status, _, payload = _post(port, "/disparity", *encode_raw_pair(*images))
+        assert status == 500 and b"RuntimeError" in payload
+        # 连接和服务仍然可用
+        assert _post(port, "/unknown", {}, b"")[0] == 404
+        assert service.summary()["failed"] == 1 and service.summary()["served"] == 0
+    finally:
+        stop()
+
+
+def test_close_restores_opencv_thread_count(rectifier):
+    previous = cv2.getNumThreads()
+    cv2.setNumThreads(3)
+    try:
+        _, stop = _start_service(StereoService(rectifier, workers=2))
+        assert cv2.getNumThreads() == 1
+        stop()
+        assert cv2.getNumThreads() == 3
+    finally:
+        cv2.setNumThreads(previous)
@@ -0,0 +1,125 @@
+# tests/test_stream_pipeline.py
+import logging
+import shutil
+import sys
+import cv2
+import numpy as np
+import pytest
+import config
+import main
+from utils import frame_sources, image_utils
+from processing.stream_pipeline import StreamPipeline
+from processing.stereo_matcher import StereoMatcher
+from processing.reconstructor import Reconstructor
+
+
+def _make_pair_directory(directory, count):
+    for i in range(1, count + 1):
+        shutil.copy(config.TEST_IMAGE_LEFT_PATH, directory / f"leftPic{i}.jpg")
+        shutil.copy(config.TEST_IMAGE_RIGHT_PATH, directory / f"rightPic{i}.jpg")
+
+
+def test_stream_pipeline_processes_all_frames_in_order(tmp_path):
+    """
+    验证流水线按顺序处理完所有帧，并且结果与单帧处理一致。
+    """
+    _make_pair_directory(tmp_path, 3)
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+    matcher = StereoMatcher()
+
+    received = []
+    pipeline = StreamPipeline(rectifier, matcher, Reconstructor(),
+                              sink=lambda frame: received.append((frame.index, frame.disparity)), queue_size=1)
+    summary = pipeline.run(frame_sources.open_stereo_source(str(tmp_path)))
+
+    assert summary["frames"] == 3
+    assert [index for index, _ in received] == [0, 1, 2]
+    assert summary["stages"]["match"]["count"] == 3
+
+    left_img = cv2.imread(config.TEST_IMAGE_LEFT_PATH)
+    right_img = cv2.imread(config.TEST_IMAGE_RIGHT_PATH)
+    left_rectified, right_rectified, _ = rectifier.rectify(left_img, right_img)
+    expected = matcher.compute_disparity(left_rectified, right_rectified)
+    assert np.array_equal(received[0][1], expected)
+
+
+def test_side_by_side_video_is_split_into_left_and_right(tmp_path):
+    """
+    验证并排视频被正确拆分为左右两路画面。
+    """
+    path = str(tmp_path / "stereo.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (320, 120))
+    for _ in range(4):
+        frame = np.zeros((120, 320, 3), dtype=np.uint8)
+        frame[:, 160:] = 255
+        writer.write(frame)
+    writer.release()
+
+    frames = list(frame_sources.open_stereo_source(path, max_frames=2))
+    assert len(frames) == 2
+    index, _, left, right = frames[1]
+    assert index == 1
+    assert left.shape == right.shape == (120, 160, 3)
+    assert left.mean() < 10 and right.mean() > 245
+
+
+def test_stream_pipeline_reports_incremental_matching(tmp_path):
+    _make_pair_directory(tmp_path, 3)
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+    pipeline = StreamPipeline(rectifier, StereoMatcher(mode="incremental"), Reconstructor(), depth_only=True)
+    summary = pipeline.run(frame_sources.open_stereo_source(str(tmp_path)))
+
+    incremental = summary["incremental"]
+    assert incremental["frames"] == 3 and incremental["full_refreshes"] == 1
+    # 三帧相同，后两帧不需要重新计算任何像素
+    assert incremental["mean_recomputed_ratio"] == pytest.approx(1 / 3)
+
+
+def test_stream_pipeline_reuses_frame_buffers_after_warm_up(tmp_path):
+    _make_pair_directory(tmp_path, 6)
+    rectifier = image_utils.Rectifier.from_file(config.CAMERA_PARAMS_PATH, persist=False)
+    matcher = StereoMatcher()
+
+    received = []
+    # 复用缓冲区时，sink 需要在返回之前复制要保留的结果
+    pipeline = StreamPipeline(rectifier, matcher, Reconstructor(), queue_size=1, reuse_buffers=True,
+                              sink=lambda frame: received.append(frame.disparity.copy()))
+    summary = pipeline.run(frame_sources.open_stereo_source(str(tmp_path)))
+
+    assert summary["frames"] == 6
+    buffers = summary["buffers"]
+    assert buffers["frames"] == 6 and buffers["late_allocations"] == 0
+    # 6 帧使用的上下文不超过池的大小，每个上下文只在第一次使用时分配
+    assert buffers["allocations"] <= buffers["buffers"]
+    assert all(np.array_equal(disparity, received[0]) for disparity in received)
+
+
+@pytest.fixture
+def restore_root_logging():
+    """main.main() 会替换根日志记录器的处理器和级别，测试结束后恢复，避免影响之后的测试。"""
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+@pytest.mark.parametrize("layout", ["missing", "empty", "unpaired"])
+def test_stream_command_reports_invalid_source_without_traceback(tmp_path, monkeypatch, capsys, restore_root_logging,
+                                                                 layout):
+    """
+    验证 run --stream 的输入目录不存在、没有图片对或左右数量不一致时，记录错误并正常返回，而不是抛出异常。
+    """
+    source = tmp_path / "frames"
+    if layout != "missing":
+        source.mkdir()
+    if layout == "unpaired":
+        _make_pair_directory(source, 2)
+        (source / "rightPic2.jpg").unlink()
+    monkeypatch.setattr(sys, "argv", ["main.py", "run", "--stream", str(source), "--no-write"])
+
+    main.main()
+
+    # main() 的日志处理器写到标准输出，错误带有 [Error] 前缀
+    assert "[Error]" in capsys.readouterr().out
+
@@ -0,0 +1,44 @@
+# tests/test_synthetic_stereo.py
+import numpy as np
+import pytest
+from utils.synthetic_stereo import make_rectified_pair
+from processing.stereo_matcher import StereoMatcher
+
+
+def test_pair_is_deterministic_for_a_seed():
+    first = make_rectified_pair(160, 120, num_disparities=32, seed=3)
+    second = make_rectified_pair(160, 120, num_disparities=32, seed=3)
+    other = make_rectified_pair(160, 120, num_disparities=32, seed=4)
+    assert np.array_equal(first.left, second.left) and np.array_equal(first.right, second.right)
+    assert not np.array_equal(first.left, other.left)
+
+
+def test_ground_truth_disparity_maps_left_pixels_onto_right_pixels():
+    """
+    可见像素在右图中 x - d 处的颜色应当与左图相同（只差双线性插值的误差）。
+    """
+    pair = make_rectified_pair(200, 150, num_disparities=48, min_disparity=0, seed=1)
+    assert pair.left.shape == pair.right.shape == (150, 200, 3)
+    assert pair.disparity.dtype == np.float32
+    assert 0 <= pair.disparity.min() and pair.disparity.max() <= 48
+    assert pair.valid.mean() > 0.7
+
+    ys, xs = np.nonzero(pair.valid)
+    x_right = xs - pair.disparity[ys, xs]
+    x0 = np.floor(x_right).astype(int)
+    x1 = np.minimum(x0 + 1, 199)
+    weight = (x_right - x0)[:, np.newaxis]
+    resampled = (1 - weight) * pair.right[ys, x0] + weight * pair.right[ys, x1]
+    difference = np.abs(resampled - pair.left[ys, xs].astype(np.float64))
+    assert np.median(difference) < 3.0
+
+
+@pytest.mark.parametrize("backend", ["sgbm", "bm"])
+def test_matchers_recover_the_ground_truth(backend):
+    pair = make_rectified_pair(320, 240, num_disparities=64, seed=0)
+    disparity = StereoMatcher(mode="full", backend=backend, num_disparities=64).compute_disparity(
+        pair.left, pair.right) / 16.0
+    matched = pair.valid & (disparity >= 0)
+    assert matched.sum() > 0.5 * pair.valid.sum()
+    error = np.abs(disparity - pair.disparity)[matched]
+    assert np.mean(error > 1.0) < 0.2
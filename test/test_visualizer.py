@@ -0,0 +1,39 @@
+# test/test_visualizer.py
+import numpy as np
+
+from visualization import visualizer
+
+
+def test_depth_map_accepts_matrix_depth_map_and_lazy_result():
+    points = np.random.default_rng(0).uniform(100, 900, size=(4, 5, 3)).astype(np.float32)
+
+    class LazyResult:
+        def depth_map(self):
+            return points[:, :, 2]
+
+    for source in (points, points[:, :, 2], LazyResult()):
+        depth = visualizer._as_depth_map(source)
+        assert depth.shape == (4, 5)
+        np.testing.assert_array_equal(depth, points[:, :, 2])
+
+
+def test_text_overlay_is_restored_from_backup():
+    canvas = np.random.default_rng(1).integers(0, 256, size=(60, 200, 3), dtype=np.uint8)
+    original = canvas.copy()
+
+    (y0, y1, x0, x1), patch = visualizer._draw_text_with_backup(canvas, "Dist: 512 mm", (20, 30))
+    assert not np.array_equal(canvas, original)
+    # 文字只画在返回的区域内
+    outside = np.ones(canvas.shape[:2], dtype=bool)
+    outside[y0:y1, x0:x1] = False
+    np.testing.assert_array_equal(canvas[outside], original[outside])
+
+    canvas[y0:y1, x0:x1] = patch
+    np.testing.assert_array_equal(canvas, original)
+
+
+def test_text_overlay_near_border_is_clipped():
+    canvas = np.zeros((40, 80, 3), dtype=np.uint8)
+    (y0, y1, x0, x1), patch = visualizer._draw_text_with_backup(canvas, "Distance: inf", (70, 38))
+    assert 0 <= y0 < y1 <= 40 and 0 <= x0 < x1 <= 80
+    assert patch.shape == (y1 - y0, x1 - x0, 3)
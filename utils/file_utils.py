@@ -1,29 +1,242 @@
+import logging
 import cv2
+import glob
+import hashlib
+import os
 import re
+import struct
+import numpy as np
+import config
+from utils import ply_io, profiling
 
-# TODO(cjn): Refactor this to use a Pydantic model for data validation.
-# This will prevent silent errors from malformed or type-incorrect data in the YAML file.
-# This should be addressed after the two-step calibration logic is complete.
-def save_stereo_params(path, stereo_params):
+logger = logging.getLogger(__name__)
+
+# 标定参数的结构约束: 名称 -> 允许的形状。加载和保存时都会检查，格式错误的文件在启动时就报错，
+# 而不是等到 stereoRectify 内部才失败
+_STEREO_PARAMS_SCHEMA = {
+    "K1": [(3, 3)], "K2": [(3, 3)],
+    "D1": "distortion", "D2": "distortion",
+    "R": [(3, 3)], "T": [(3, 1), (3,), (1, 3)],
+    "E": [(3, 3)], "F": [(3, 3)],
+}
+# 预先计算的校正结果（可选），只有全部存在时才会被使用
+_RECTIFY_PARAMS_SCHEMA = {
+    "R1": [(3, 3)], "R2": [(3, 3)], "P1": [(3, 4)], "P2": [(3, 4)], "Q": [(4, 4)],
+    "roi1": [(4,)], "roi2": [(4,)],
+}
+# OpenCV 支持的畸变系数个数
+_DISTORTION_LENGTHS = (4, 5, 8, 12, 14)
+# 二进制标定文件的布局: 32 字节文件头（标识、同时生成的 YAML 文件的 SHA-1、D1/D2 的系数个数），
+# 之后按 _BINARY_LAYOUT 的固定顺序连续存放小端 float64，可以一次读入或直接 memmap。
+# 可选的项（误差、image_size、校正结果）不存在时填 NaN
+_BINARY_MAGIC = b"SVPARAM\x01"
+_BINARY_HEADER = struct.Struct("<8s20sHH")
+_BINARY_LAYOUT = (
+    ("K1", (3, 3)), ("D1", (14,)), ("K2", (3, 3)), ("D2", (14,)),
+    ("R", (3, 3)), ("T", (3, 1)), ("E", (3, 3)), ("F", (3, 3)),
+    ("reprojection_error", ()), ("reprojection_error_L", ()), ("reprojection_error_R", ()),
+    ("image_size", (2,)), ("rectify_alpha", ()),
+    ("R1", (3, 3)), ("R2", (3, 3)), ("P1", (3, 4)), ("P2", (3, 4)), ("Q", (4, 4)),
+    ("roi1", (4,)), ("roi2", (4,)),
+)
+_BINARY_SIZES = [int(np.prod(shape)) for _, shape in _BINARY_LAYOUT]
+_BINARY_OFFSETS = np.cumsum([0] + _BINARY_SIZES[:-1])
+_BINARY_SIZE = sum(_BINARY_SIZES)
+
+
+def validate_stereo_params(stereo_params, source="stereo parameters"):
+    """
+    检查标定参数的完整性、形状和数值类型，发现问题时抛出 ValueError。
+    :param stereo_params: 参数字典。
+    :param source: 出错时在信息中显示的来源（通常是文件路径）。
+    """
+    errors = []
+    for key, expected in _STEREO_PARAMS_SCHEMA.items():
+        if key not in stereo_params or stereo_params[key] is None:
+            errors.append(f"missing '{key}'")
+            continue
+        errors.extend(_check_matrix(key, stereo_params[key], expected))
+
+    if not errors:
+        R = np.asarray(stereo_params["R"], dtype=np.float64)
+        if not np.allclose(R @ R.T, np.eye(3), atol=1e-6):
+            errors.append("'R' is not a rotation matrix")
+        for key in ("K1", "K2"):
+            K = np.asarray(stereo_params[key], dtype=np.float64)
+            if K[0, 0] <= 0 or K[1, 1] <= 0:
+                errors.append(f"'{key}' has non-positive focal length")
+
+    if "image_size" in stereo_params:
+        image_size = stereo_params["image_size"]
+        if len(image_size) != 2 or min(image_size) <= 0:
+            errors.append(f"'image_size' must be (width, height), got {image_size}")
+
+    present = [key for key in _RECTIFY_PARAMS_SCHEMA if key in stereo_params]
+    if present:
+        if len(present) != len(_RECTIFY_PARAMS_SCHEMA) or "image_size" not in stereo_params:
+            errors.append("precomputed rectification is incomplete "
+                          f"(expected {', '.join(_RECTIFY_PARAMS_SCHEMA)} and image_size)")
+        else:
+            for key in present:
+                errors.extend(_check_matrix(key, stereo_params[key], _RECTIFY_PARAMS_SCHEMA[key]))
+
+    if errors:
+        raise ValueError(f"Invalid {source}: " + "; ".join(errors))
+
+
+@profiling.timed("save_stereo_params")
+def save_stereo_params(path, stereo_params, source_path=None):
     """
-    使用 OpenCV 的 FileStorage 保存双目标定参数。
-    :param path: yml文件的保存路径。
+    保存双目标定参数。根据扩展名选择格式：
+    - .bin: 固定布局的二进制格式，加载快。参数中包含 image_size 时，
+            还会按 config.RECTIFY_ALPHA 预先计算并一起保存 stereoRectify 的结果。
+    - 其他（.yml 等）: 使用 OpenCV 的 FileStorage 保存为可读的 YAML。
+    :param path: 保存路径。
     :param stereo_params: 包含所有相机参数的字典。
+    :param source_path: [.bin] 同一份参数的 YAML 文件，其哈希记录在文件头中，
+                        find_stereo_params 据此判断二进制文件是否仍与 YAML 一致。
     :return:
     """
-    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
-    for key, value in stereo_params.items():
-        fs.write(key, value)
-    fs.release()
-    print(f"Stereo parameters saved to {path}")
+    validate_stereo_params(stereo_params, source=f"stereo parameters for {path}")
+    if path.endswith(".bin"):
+        params = dict(stereo_params)
+        if "image_size" in params:
+            params.update(compute_rectification(params, params["image_size"], config.RECTIFY_ALPHA))
+            params["rectify_alpha"] = float(config.RECTIFY_ALPHA)
+        source_digest = bytes.fromhex(hash_file(source_path)) if source_path else b""
+        _write_params_binary(path, params, source_digest)
+    else:
+        fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+        for key, value in stereo_params.items():
+            if key == "image_size":
+                value = np.asarray(value, dtype=np.int32)
+            fs.write(key, value)
+        fs.release()
+    logger.info("Stereo parameters saved to %s", path)
 
 
+@profiling.timed("load_stereo_params")
 def load_stereo_params(path):
     """
-    从 yml 文件加载双目标定参数。
-    :param path:yml文件的路径。
+    加载双目标定参数，根据文件内容自动识别二进制格式或 YAML 格式，并检查参数是否有效。
+    :param path: 标定文件的路径。
     :return: params
     """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Could not open stereo parameters file: {path}")
+    with open(path, "rb") as f:
+        is_binary = f.read(len(_BINARY_MAGIC)) == _BINARY_MAGIC
+
+    params = _load_params_binary(path) if is_binary else _load_params_yaml(path)
+    if "image_size" in params:
+        params["image_size"] = tuple(int(v) for v in np.asarray(params["image_size"]).ravel())
+    for key in ("roi1", "roi2"):
+        if key in params:
+            params[key] = tuple(int(v) for v in np.asarray(params[key]).ravel())
+    validate_stereo_params(params, source=f"stereo parameters file {path}")
+    logger.debug("Stereo parameters loaded from %s", path)
+    return params
+
+
+def find_stereo_params(yaml_path=None, binary_path=None):
+    """
+    返回应该加载的标定文件路径。二进制文件只在它记录的哈希与当前 YAML 文件的内容一致
+    （即两者由同一次标定生成，YAML 之后没有被修改或替换）时使用，否则使用 YAML。
+    判断只依赖文件内容，不受检出、复制等操作改变修改时间的影响。
+    """
+    yaml_path = yaml_path or config.CAMERA_PARAMS_PATH
+    binary_path = binary_path or config.CAMERA_PARAMS_BINARY_PATH
+    if not os.path.isfile(binary_path):
+        return yaml_path
+    with open(binary_path, "rb") as f:
+        header = f.read(_BINARY_HEADER.size)
+    if len(header) != _BINARY_HEADER.size:
+        return yaml_path
+    magic, source_digest, _, _ = _BINARY_HEADER.unpack(header)
+    if magic != _BINARY_MAGIC:
+        return yaml_path
+    if not os.path.isfile(yaml_path):
+        return binary_path
+    if source_digest.hex() == hash_file(yaml_path):
+        return binary_path
+    logger.debug("%s was not generated from the current %s, using the YAML file", binary_path, yaml_path)
+    return yaml_path
+
+
+def compute_rectification(stereo_params, image_size, alpha):
+    """
+    调用 stereoRectify 计算校正变换。
+    :return: 包含 R1, R2, P1, P2, Q, roi1, roi2 的字典。
+    """
+    R1, R2, P1, P2, Q, roi1, roi2 = cv2.stereoRectify(
+        stereo_params['K1'], stereo_params['D1'], stereo_params['K2'], stereo_params['D2'],
+        tuple(int(v) for v in image_size), stereo_params['R'], stereo_params['T'], alpha=alpha
+    )
+    return {"R1": R1, "R2": R2, "P1": P1, "P2": P2, "Q": Q, "roi1": tuple(roi1), "roi2": tuple(roi2)}
+
+
+@profiling.timed("save_point_cloud")
+def save_point_cloud(path, points_3D, colors):
+    """将点云保存为二进制 .ply 文件（float32 坐标 + uint8 颜色），不依赖 Open3D。"""
+    ply_io.write_ply(path, points_3D, colors)
+    logger.info("Point cloud saved to %s", path)
+
+def find_image_pairs(directory, left_pattern=None, right_pattern=None):
+    """
+    在目录中按命名规则查找左右图像对，并按自然顺序配对。
+    :param directory: 图像目录。
+    :param left_pattern: 左图的 glob 模式，默认使用 config.LEFT_IMAGE_PATTERN。
+    :param right_pattern: 右图的 glob 模式，默认使用 config.RIGHT_IMAGE_PATTERN。
+    :return: [(left_path, right_path), ...]
+    :raises ValueError: 左右图像数量不一致时。
+    """
+    left_pattern = left_pattern or config.LEFT_IMAGE_PATTERN
+    right_pattern = right_pattern or config.RIGHT_IMAGE_PATTERN
+
+    images_left = sorted(glob.glob(os.path.join(directory, left_pattern)), key=natural_sort_key)
+    images_right = sorted(glob.glob(os.path.join(directory, right_pattern)), key=natural_sort_key)
+    if len(images_left) != len(images_right):
+        raise ValueError(f"Number of left and right images must be equal, found {len(images_left)} left and "
+                         f"{len(images_right)} right images in {directory}")
+    return list(zip(images_left, images_right))
+
+def hash_file(path):
+    """
+    计算文件内容的 SHA-1，用作各种磁盘缓存的键。
+    :param path: 文件路径。
+    :return: 十六进制摘要字符串。
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def natural_sort_key(s):
+    """
+    一个用于 sorted() 函数的 key 函数，实现自然排序。
+    """
+    return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', s)]
+
+# --- Internal Helper Functions ---
+def _check_matrix(key, value, expected):
+    """[内部辅助函数] 检查单个矩阵的形状、类型和数值，返回错误信息列表。"""
+    array = np.asarray(value)
+    # 用 dtype.kind 代替 np.issubdtype、用 .all() 代替 np.all，启动时每个进程都要检查十几个矩阵
+    if array.dtype.kind not in "iufc":
+        return [f"'{key}' must be numeric, got {array.dtype}"]
+    if expected == "distortion":
+        if array.ndim > 2 or (array.ndim == 2 and 1 not in array.shape) or array.size not in _DISTORTION_LENGTHS:
+            return [f"'{key}' must be a vector of {_DISTORTION_LENGTHS} coefficients, got shape {array.shape}"]
+    elif array.shape not in expected:
+        return [f"'{key}' must have shape {' or '.join(map(str, expected))}, got {array.shape}"]
+    if not np.isfinite(array).all():
+        return [f"'{key}' contains non-finite values"]
+    return []
+
+
+def _load_params_yaml(path):
+    """[内部辅助函数] 逐个节点读取 FileStorage YAML 文件。"""
     fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
     if not fs.isOpened():
         raise FileNotFoundError(f"Could not open stereo parameters file: {path}")
@@ -47,27 +260,60 @@ def load_stereo_params(path):
         else:
             params[key] = fs.getNode(key).mat()
     fs.release()
-    print(f"Stereo parameters loaded from {path}")
     return params
 
-def save_point_cloud(path, points_3D, colors):
-    """使用 Open3D 将点云保存为 .ply 文件。"""
-    try:
-        import open3d as o3d
-    except ImportError:
-        print("\n[Warning] Open3D is not installed, cannot save point cloud.")
-        print("To install, run: pip install open3d")
-        return
-    pcd = o3d.geometry.PointCloud()
-    pcd.points = o3d.utility.Vector3dVector(points_3D)
-    # Open3D 需要的颜色值是 0-1 范围的浮点数
-    pcd.colors = o3d.utility.Vector3dVector(colors / 255.0)
-
-    o3d.io.write_point_cloud(path, pcd)
-    print(f"Point cloud saved to {path}")
 
-def natural_sort_key(s):
-    """
-    一个用于 sorted() 函数的 key 函数，实现自然排序。
-    """
-    return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', s)]
\ No newline at end of file
+def _write_params_binary(path, params, source_digest=b""):
+    """[内部辅助函数] 按 _BINARY_LAYOUT 写入二进制标定文件（不做参数检查）。"""
+    unknown = sorted(set(params) - {key for key, _ in _BINARY_LAYOUT})
+    if unknown:
+        raise ValueError(f"Cannot store {', '.join(unknown)} in the binary stereo parameters format")
+    values = np.full(_BINARY_SIZE, np.nan, dtype="<f8")
+    lengths = {"D1": 0, "D2": 0}
+    offset = 0
+    for key, shape in _BINARY_LAYOUT:
+        size = int(np.prod(shape))
+        value = params.get(key)
+        if value is not None:
+            array = np.asarray(value, dtype=np.float64).ravel()
+            if key in lengths:
+                if array.size > size:
+                    raise ValueError(f"'{key}' must be a vector of {_DISTORTION_LENGTHS} coefficients, "
+                                     f"got {array.size}")
+                lengths[key] = array.size
+            elif array.size != size:
+                raise ValueError(f"'{key}' must have shape {shape}, got {np.shape(value)}")
+            values[offset:offset + array.size] = array
+        offset += size
+
+    # 先写临时文件再改名，避免其他进程读到写了一半的文件
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_BINARY_HEADER.pack(_BINARY_MAGIC, source_digest, lengths["D1"], lengths["D2"]))
+        f.write(values.tobytes())
+    os.replace(tmp_path, path)
+
+
+def _load_params_binary(path):
+    """[内部辅助函数] 一次读入二进制标定文件，按固定布局切分，全为 NaN 的项视为不存在。"""
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+    if len(data) != _BINARY_HEADER.size + _BINARY_SIZE * 8:
+        raise ValueError(f"Could not read stereo parameters file {path}: expected "
+                         f"{_BINARY_HEADER.size + _BINARY_SIZE * 8} bytes, got {len(data)}")
+    _, _, d1_length, d2_length = _BINARY_HEADER.unpack_from(data)
+    values = np.frombuffer(data, dtype="<f8", offset=_BINARY_HEADER.size)
+    # 一次判断所有项是否全为 NaN，避免逐项调用 numpy
+    missing = np.logical_and.reduceat(np.isnan(values), _BINARY_OFFSETS).tolist()
+    lengths = {"D1": d1_length, "D2": d2_length}
+
+    params = {}
+    for (key, shape), offset, size, is_missing in zip(_BINARY_LAYOUT, _BINARY_OFFSETS.tolist(), _BINARY_SIZES,
+                                                       missing):
+        if key in lengths:
+            if is_missing or not lengths[key]:
+                continue
+            params[key] = values[offset:offset + lengths[key]].reshape(1, -1)
+        elif not is_missing:
+            params[key] = float(values[offset]) if not shape else values[offset:offset + size].reshape(shape)
+    return params
@@ -0,0 +1,278 @@
+# utils/frame_archive.py
+"""
+视差图 / 深度图序列的分块压缩归档。
+
+归档是一个目录:
+    index.json              固定大小的元数据: 编码、帧尺寸、数据类型、Q 矩阵、分块数和帧数
+    frames.idx              每帧一条定长记录 (所在分块、起始字节、字节数、时间戳)，只追加
+    chunk_000000.bin        每个分块依次保存若干帧，每帧单独压缩
+    chunk_000001.bin
+    ...
+
+写入时帧在内存中压缩后攒满一个分块再落盘：先写分块文件，再把这些帧的记录追加到 frames.idx，
+最后原子地更新 index.json 中的帧数。每次落盘的开销只与分块大小有关，与归档已有的长度无关，
+内存中也只保存未落盘的帧。流式运行中途中断最多丢失最后一个未写满的分块；
+frames.idx 中超出 index.json 帧数的记录（中断时只写了一半）会被忽略，追加时截掉。
+每帧独立压缩，随机读取时只需读出并解压这一帧的字节范围，不需要解压整个分块。
+
+压缩前先做预测滤波：整数类型（如 CV_16S 视差图）逐行做水平差分，
+相邻像素的视差通常相同或只差一点，差分后大部分为零，压缩更快、压缩率更高；
+浮点类型（如深度图）做字节重排 (byte shuffle)，把各像素的同一字节位置排在一起。
+"""
+import json
+import os
+import tempfile
+import zlib
+
+import numpy as np
+
+import config
+
+_INDEX_NAME = "index.json"
+_FRAMES_NAME = "frames.idx"
+_ARCHIVE_VERSION = 2
+# frames.idx 中每帧的定长记录
+_FRAME_RECORD = np.dtype([("chunk", "<u4"), ("length", "<u4"), ("offset", "<u8"), ("timestamp", "<f8")])
+
+
+class DisparityArchive:
+    """
+    可追加、可随机访问的帧归档。所有帧必须具有相同的尺寸和数据类型
+    （例如 CV_16S 视差图，或 float32 深度图）。
+
+    用法:
+        with DisparityArchive(path, mode="a") as archive:
+            archive.append(disparity, timestamp, Q)
+        archive = DisparityArchive(path)
+        disparity = archive[42]
+    """
+
+    def __init__(self, path, mode="r", chunk_frames=None, codec=None, level=None):
+        """
+        Args:
+            path (str): 归档目录。
+            mode (str): "r" 只读；"w" 新建（目录中已有归档时报错）；"a" 追加（不存在时新建）。
+            chunk_frames (int): 每个分块文件的帧数，默认使用 config.ARCHIVE_CHUNK_FRAMES。
+            codec (str): "zlib" 或 "zstd"，默认使用 config.ARCHIVE_CODEC（"auto" 表示已安装 zstandard 时用 zstd）。
+                         只在新建归档时生效，已有归档沿用创建时的编码。
+            level (int): 压缩级别，默认使用 config.ARCHIVE_COMPRESSION_LEVEL。
+        """
+        if mode not in ("r", "w", "a"):
+            raise ValueError(f"Unknown archive mode '{mode}'. Use 'r', 'w' or 'a'.")
+        self.path = path
+        self.mode = mode
+        # 尚未写入分块文件的帧：压缩后的字节串和时间戳
+        self._pending = []
+        self._pending_timestamps = []
+
+        index_path = os.path.join(path, _INDEX_NAME)
+        exists = os.path.exists(index_path)
+        if mode == "r" and not exists:
+            raise FileNotFoundError(f"No disparity archive found at {path}")
+        if mode == "w" and exists:
+            raise FileExistsError(f"A disparity archive already exists at {path}")
+
+        if exists:
+            with open(index_path, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+            if self._index.get("version") != _ARCHIVE_VERSION:
+                raise ValueError(f"Unsupported archive version {self._index.get('version')} in {path}")
+            elif mode == "a":
+                # 丢弃上次中断时追加了一半、但没有计入 index.json 的记录
+                with open(self._frames_path, "ab") as f:
+                    f.truncate(self._index["frames"] * _FRAME_RECORD.itemsize)
+        else:
+            self._index = {
+                "version": _ARCHIVE_VERSION,
+                "codec": _resolve_codec(codec or config.ARCHIVE_CODEC),
+                "level": config.ARCHIVE_COMPRESSION_LEVEL if level is None else level,
+                "shape": None,
+                "dtype": None,
+                "Q": None,
+                # 已落盘的分块数和帧数，frames.idx 中只有前 frames 条记录有效
+                "chunks": 0,
+                "frames": 0,
+            }
+        self.chunk_frames = chunk_frames or config.ARCHIVE_CHUNK_FRAMES
+        self._compress, self._decompress = _get_codec(self._index["codec"], self._index["level"])
+
+    # --- 元数据 ---
+    def __len__(self):
+        return self._index["frames"] + len(self._pending)
+
+    @property
+    def Q(self):
+        """归档中保存的 Q 矩阵 (4x4 float64)，未保存时为 None。"""
+        Q = self._index["Q"]
+        return None if Q is None else np.asarray(Q, dtype=np.float64)
+
+    @property
+    def timestamps(self):
+        """每一帧的时间戳（秒）。"""
+        written = self._written_records()["timestamp"]
+        return np.concatenate([written, np.asarray(self._pending_timestamps, dtype=np.float64)])
+
+    @property
+    def frame_shape(self):
+        shape = self._index["shape"]
+        return None if shape is None else tuple(shape)
+
+    # --- 写入 ---
+    def append(self, frame, timestamp=None, Q=None):
+        """
+        追加一帧。
+        :param frame: 与归档中其他帧尺寸、类型相同的二维数组。
+        :param timestamp: 帧时间戳（秒），None 时使用帧序号。
+        :param Q: 可选的 Q 矩阵；第一次提供时写入归档，之后必须保持一致。
+        """
+        if self.mode == "r":
+            raise IOError("Archive is opened read-only.")
+        frame = np.asarray(frame)
+        if self._index["shape"] is None:
+            self._index["shape"] = list(frame.shape)
+            self._index["dtype"] = frame.dtype.str
+        elif tuple(frame.shape) != self.frame_shape or frame.dtype.str != self._index["dtype"]:
+            raise ValueError(f"Frame {frame.shape}/{frame.dtype} does not match archive "
+                             f"{self.frame_shape}/{np.dtype(self._index['dtype'])}.")
+        if Q is not None:
+            Q = np.asarray(Q, dtype=np.float64)
+            if self._index["Q"] is None:
+                self._index["Q"] = Q.tolist()
+            elif not np.allclose(Q, self.Q):
+                raise ValueError("Q matrix differs from the one stored in the archive.")
+
+        self._pending_timestamps.append(float(len(self) if timestamp is None else timestamp))
+        self._pending.append(self._compress(_encode(frame)))
+        if len(self._pending) >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """把内存中尚未写出的帧写为一个新的分块文件，追加它们的记录，并更新 index.json。"""
+        if self.mode == "r":
+            return
+        index_path = os.path.join(self.path, _INDEX_NAME)
+        if not self._pending and os.path.exists(index_path):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if self._pending:
+            chunk_id = self._index["chunks"]
+            _atomic_write(self._chunk_path(chunk_id), b"".join(self._pending))
+            records = np.empty(len(self._pending), dtype=_FRAME_RECORD)
+            records["chunk"] = chunk_id
+            records["length"] = [len(blob) for blob in self._pending]
+            records["offset"] = np.cumsum(records["length"], dtype=np.uint64) - records["length"]
+            records["timestamp"] = self._pending_timestamps
+            with open(self._frames_path, "ab") as f:
+                f.write(records.tobytes())
+            self._index["chunks"] += 1
+            self._index["frames"] += len(self._pending)
+            self._pending, self._pending_timestamps = [], []
+        self._write_index()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # --- 读取 ---
+    def __getitem__(self, index):
+        """按帧序号读取一帧（支持负数下标），只读取并解压这一帧。"""
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError(f"Frame {index} out of range for archive with {count} frames.")
+
+        written = self._index["frames"]
+        if index >= written:
+            blob = self._pending[index - written]
+        else:
+            record = self._record(index)
+            with open(self._chunk_path(int(record["chunk"])), "rb") as f:
+                f.seek(int(record["offset"]))
+                blob = f.read(int(record["length"]))
+        return _decode(self._decompress(blob), np.dtype(self._index["dtype"]), self.frame_shape)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    # --- 内部方法 ---
+    @property
+    def _frames_path(self):
+        return os.path.join(self.path, _FRAMES_NAME)
+
+    def _chunk_path(self, chunk_id):
+        return os.path.join(self.path, f"chunk_{chunk_id:06d}.bin")
+
+    def _write_index(self):
+        _atomic_write(os.path.join(self.path, _INDEX_NAME), json.dumps(self._index).encode("utf-8"))
+
+    def _record(self, index):
+        """读取第 index 帧（已落盘）的记录。"""
+        with open(self._frames_path, "rb") as f:
+            f.seek(index * _FRAME_RECORD.itemsize)
+            return np.frombuffer(f.read(_FRAME_RECORD.itemsize), dtype=_FRAME_RECORD)[0]
+
+    def _written_records(self):
+        """所有已落盘帧的记录。"""
+        count = self._index["frames"]
+        if count == 0:
+            return np.empty(0, dtype=_FRAME_RECORD)
+        return np.fromfile(self._frames_path, dtype=_FRAME_RECORD, count=count)
+
+
+# --- Internal Helper Functions ---
+def _resolve_codec(codec):
+    """[内部辅助函数] 把 "auto" 解析为实际可用的编码。"""
+    if codec != "auto":
+        return codec
+    try:
+        import zstandard  # noqa: F401
+        return "zstd"
+    except ImportError:
+        return "zlib"
+
+
+def _get_codec(codec, level):
+    """[内部辅助函数] 返回 (压缩函数, 解压函数)。"""
+    if codec == "zlib":
+        return (lambda data: zlib.compress(data, level)), zlib.decompress
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("This archive uses zstd compression. To install, run: pip install zstandard")
+        return zstandard.ZstdCompressor(level=level).compress, zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"Unknown archive codec '{codec}'. Available codecs: zlib, zstd")
+
+
+def _encode(frame):
+    """[内部辅助函数] 压缩前的预测滤波：整数逐行水平差分（按位回绕），浮点做字节重排。"""
+    if np.issubdtype(frame.dtype, np.integer):
+        residual = frame.copy()
+        residual[..., 1:] = frame[..., 1:] - frame[..., :-1]
+        return residual.tobytes()
+    itemsize = frame.dtype.itemsize
+    return np.ascontiguousarray(frame).reshape(-1).view(np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def _decode(raw, dtype, shape):
+    """[内部辅助函数] _encode 的逆操作。"""
+    if np.issubdtype(dtype, np.integer):
+        residual = np.frombuffer(raw, dtype=dtype).reshape(shape)
+        return np.cumsum(residual, axis=-1, dtype=dtype)
+    planes = np.frombuffer(raw, dtype=np.uint8).reshape(dtype.itemsize, -1)
+    return np.ascontiguousarray(planes.T).view(dtype).reshape(shape)
+
+
+def _atomic_write(path, data):
+    """[内部辅助函数] 先写临时文件再改名，避免中断时留下损坏的文件。"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
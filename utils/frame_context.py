@@ -0,0 +1,121 @@
+# utils/frame_context.py
+"""
+逐帧处理时复用的输出缓冲区。
+
+每处理一对图像，校正 (remap)、转灰度、视差、浮点视差、HxWx3 点矩阵、掩码和过滤后的点列表都会分配新数组，
+持续处理视频时每秒会产生数百 MB 的分配和释放。FrameContext 按名字保存这些缓冲区，
+第一帧（预热）按分辨率分配一次，之后尺寸不变时每一帧都直接写入已有的缓冲区
+（OpenCV 的 dst 参数、NumPy 的 out 参数）。
+
+校正 (utils.image_utils.StereoPreprocessor.process)、匹配 (StereoMatcher.compute_disparity) 和
+重建 (Reconstructor.reconstruct / reconstruct_depth) 都接受可选的 context 参数；为 None 时行为与原来相同。
+使用 context 时返回的数组是缓冲区本身，会被下一帧覆盖，需要保留的结果由调用方复制。
+同时有多帧在处理中的场景（例如 processing.stream_pipeline）从 FrameContextPool 中为每一帧借出一个上下文。
+
+memory_report() 给出缓冲区占用的字节数（稳态）、峰值和预热之后发生的分配次数，
+late_allocations 为 0 即说明预热之后没有再为帧数据分配内存。
+"""
+import queue
+
+import numpy as np
+
+
+class FrameContext:
+    """一帧处理所需的、按名字复用的输出缓冲区。"""
+
+    def __init__(self):
+        self._buffers = {}
+        # 分配次数（包括尺寸或类型变化时的重新分配）和累计分配的字节数
+        self.allocations = 0
+        self.allocated_bytes = 0
+        # 预热（第一帧）之后发生的分配次数，稳态下应为 0
+        self.late_allocations = 0
+        # 同时持有的缓冲区总字节数的峰值
+        self.peak_bytes = 0
+        self.frames = 0
+
+    def buffer(self, name, shape, dtype=np.uint8):
+        """返回指定形状和类型的缓冲区，第一次请求或形状、类型变化时才分配（内容未初始化）。"""
+        shape = tuple(int(v) for v in shape)
+        dtype = np.dtype(dtype)
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            # 先释放旧的缓冲区，峰值只统计同时持有的内存
+            self._buffers.pop(name, None)
+            buffer = self._buffers[name] = np.empty(shape, dtype=dtype)
+            self.allocations += 1
+            self.allocated_bytes += buffer.nbytes
+            if self.frames > 1:
+                self.late_allocations += 1
+            self.peak_bytes = max(self.peak_bytes, self.resident_bytes)
+        return buffer
+
+    def begin_frame(self):
+        """标记新的一帧开始；第一帧之后的分配计入 late_allocations。"""
+        self.frames += 1
+
+    @property
+    def resident_bytes(self):
+        """当前持有的缓冲区总字节数（稳态内存）。"""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def clear(self):
+        """释放所有缓冲区，统计数据保留。"""
+        self._buffers.clear()
+
+    def memory_report(self):
+        return {
+            "contexts": 1,
+            "buffers": len(self._buffers),
+            "frames": self.frames,
+            "resident_bytes": self.resident_bytes,
+            "peak_bytes": self.peak_bytes,
+            "allocations": self.allocations,
+            "allocated_bytes": self.allocated_bytes,
+            "late_allocations": self.late_allocations,
+        }
+
+
+def context_buffer(context, name, shape, dtype=np.uint8):
+    """context 为 None 时返回 None（让 OpenCV / NumPy 自行分配输出），否则返回 context 中的缓冲区。"""
+    return None if context is None else context.buffer(name, shape, dtype)
+
+
+class FrameContextPool:
+    """
+    固定数量的 FrameContext，供多帧同时在处理中的流水线使用：
+    每一帧开始时 acquire() 借出一个上下文，帧处理完（结果已被消费）后 release() 归还。
+    池的大小应不小于同时在处理中的最大帧数，否则 acquire() 会阻塞到有上下文被归还。
+    """
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError(f"Pool size must be >= 1, got {size}")
+        self._contexts = [FrameContext() for _ in range(size)]
+        self._free = queue.Queue()
+        for context in self._contexts:
+            self._free.put(context)
+
+    def __len__(self):
+        return len(self._contexts)
+
+    def acquire(self, timeout=None):
+        """借出一个空闲的上下文并标记新的一帧；timeout 秒内没有空闲上下文时抛出 queue.Empty。"""
+        context = self._free.get(timeout=timeout)
+        context.begin_frame()
+        return context
+
+    def release(self, context):
+        self._free.put(context)
+
+    def memory_report(self):
+        """汇总所有上下文的统计；峰值为各上下文峰值之和（所有上下文可能同时被使用）。"""
+        reports = [context.memory_report() for context in self._contexts]
+        return {key: sum(report[key] for report in reports) for key in reports[0]}
+
+
+def format_memory_report(report):
+    """把 memory_report() 的结果格式化为一行文本，用于日志和报告。"""
+    return (f"{report['contexts']} context(s), {report['buffers']} buffers, "
+            f"{report['resident_bytes'] / 2**20:.1f} MB resident (peak {report['peak_bytes'] / 2**20:.1f} MB), "
+            f"{report['allocations']} allocations, {report['late_allocations']} after warm-up")
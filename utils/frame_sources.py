@@ -0,0 +1,109 @@
+# utils/frame_sources.py
+import logging
+import os
+import time
+
+import cv2
+
+from utils import file_utils
+
+logger = logging.getLogger(__name__)
+
+
+def open_stereo_source(source, right_source=None, max_frames=None):
+    """
+    根据输入类型打开一个双目帧源，返回逐帧产出 (index, timestamp, left, right) 的生成器。
+
+    支持三种输入：
+    - 一个目录：按 leftPic*/rightPic* 命名配对的图片序列。
+    - 一个视频文件：左右画面并排 (side-by-side) 的双目视频。
+    - 两个视频文件 (source + right_source)：同步录制的左右视频。
+
+    :param source: 目录或视频文件路径。
+    :param right_source: 右相机视频路径，提供时 source 视为左相机视频。
+    :param max_frames: 最多产出的帧数，None 表示不限制。
+    """
+    if right_source is not None:
+        frames = iter_dual_videos(source, right_source)
+    elif os.path.isdir(source):
+        frames = iter_image_pairs(source)
+    elif os.path.isfile(source):
+        frames = iter_side_by_side_video(source)
+    else:
+        raise FileNotFoundError(f"Stream source not found: {source}")
+
+    if max_frames is None:
+        return frames
+    return _limit(frames, max_frames)
+
+
+def iter_image_pairs(directory):
+    """逐对读取目录中的左右图片。时间戳为读取该帧时相对于开始的秒数。"""
+    image_pairs = file_utils.find_image_pairs(directory)
+    if not image_pairs:
+        raise FileNotFoundError(f"No stereo image pairs found in {directory}")
+
+    start = time.perf_counter()
+    for index, (left_path, right_path) in enumerate(image_pairs):
+        left_img = cv2.imread(left_path)
+        right_img = cv2.imread(right_path)
+        if left_img is None or right_img is None:
+            logger.warning("  - Skipped unreadable pair: %s & %s", os.path.basename(left_path), os.path.basename(right_path))
+            continue
+        yield index, time.perf_counter() - start, left_img, right_img
+
+
+def iter_side_by_side_video(path):
+    """逐帧读取左右画面并排的视频，左半边为左相机，右半边为右相机。"""
+    capture = _open_capture(path)
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            half_width = frame.shape[1] // 2
+            yield index, timestamp, frame[:, :half_width], frame[:, half_width:half_width * 2]
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_dual_videos(left_path, right_path):
+    """同步读取左右两个视频，任意一路结束时停止。"""
+    left_capture = _open_capture(left_path)
+    right_capture = _open_capture(right_path)
+    try:
+        index = 0
+        while True:
+            ok_left, left_frame = left_capture.read()
+            ok_right, right_frame = right_capture.read()
+            if not (ok_left and ok_right):
+                break
+            timestamp = left_capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            yield index, timestamp, left_frame, right_frame
+            index += 1
+    finally:
+        left_capture.release()
+        right_capture.release()
+
+
+# --- Internal Helper Functions ---
+def _open_capture(path):
+    """[内部辅助函数] 打开视频文件，失败时抛出异常。"""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Could not open video: {path}")
+    return capture
+
+
+def _limit(frames, max_frames):
+    """[内部辅助函数] 最多产出 max_frames 帧，并及时关闭底层生成器以释放视频句柄。"""
+    try:
+        for count, frame in enumerate(frames):
+            if count >= max_frames:
+                break
+            yield frame
+    finally:
+        frames.close()
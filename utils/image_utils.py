@@ -1,12 +1,269 @@
 # utils/image_utils.py
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
 import cv2
 import numpy as np
 
+import config
+from utils import file_utils, profiling
+from utils.frame_context import FrameContext, context_buffer
+
+logger = logging.getLogger(__name__)
+
+
+# stereoRectify 的全部产物以及左右相机的 CV_16SC2 映射表
+RectificationMaps = namedtuple(
+    "RectificationMaps",
+    ["R1", "R2", "P1", "P2", "Q", "roi1", "roi2",
+     "left_map1", "left_map2", "right_map1", "right_map2"]
+)
+
+# 进程内共享的映射表 LRU 缓存: (参数哈希, 图像尺寸, alpha) -> RectificationMaps
+_MAPS_CACHE = OrderedDict()
+# 多个线程（例如 processing.stereo_service 的线程池）同时校正时保护缓存，同一尺寸的映射表也只计算一次
+_MAPS_LOCK = threading.Lock()
+
+
+class Rectifier:
+    """
+    立体校正器。
+
+    stereoRectify 和 initUndistortRectifyMap 只与标定参数、图像尺寸和 alpha 有关，
+    所以每个 (标定文件内容哈希, 图像尺寸, alpha) 只计算一次，结果放进进程内的 LRU 缓存，
+    并可选地以 .npy 文件持久化到标定文件旁边，新进程可以直接 mmap 读取而无需重新计算。
+    """
+
+    def __init__(self, stereo_params=None, params_path=None, alpha=None, persist=None, cache_dir=None):
+        """
+        :param stereo_params: 已加载的标定参数字典。为 None 时从 params_path 加载。
+        :param params_path: 标定文件路径。提供时使用文件内容的哈希作为缓存键。
+        :param alpha: stereoRectify 的缩放参数，默认使用 config.RECTIFY_ALPHA。
+        :param persist: 是否把映射表持久化到磁盘，默认使用 config.RECTIFY_PERSIST_MAPS。
+        :param cache_dir: 持久化目录，默认使用 config.RECTIFY_CACHE_DIR。
+        """
+        if stereo_params is None and params_path is None:
+            raise ValueError("Either stereo_params or params_path must be provided.")
+        if stereo_params is None:
+            stereo_params = file_utils.load_stereo_params(params_path)
+
+        self.stereo_params = stereo_params
+        self.params_path = params_path
+        self.alpha = config.RECTIFY_ALPHA if alpha is None else alpha
+        self.persist = config.RECTIFY_PERSIST_MAPS if persist is None else persist
+        self.cache_dir = config.RECTIFY_CACHE_DIR if cache_dir is None else cache_dir
+
+        if params_path is not None:
+            self.params_hash = file_utils.hash_file(params_path)
+        else:
+            self.params_hash = _hash_params(stereo_params)
+
+    @classmethod
+    def from_file(cls, params_path, **kwargs):
+        """从标定文件创建校正器。"""
+        return cls(params_path=params_path, **kwargs)
+
+    def get_maps(self, image_size):
+        """
+        获取指定图像尺寸的校正映射表，依次查找内存缓存、磁盘缓存，都没有时才重新计算。
+        :param image_size: 图像尺寸 (width, height)。
+        :return: RectificationMaps
+        """
+        key = (self.params_hash, tuple(int(v) for v in image_size), float(self.alpha))
+        with _MAPS_LOCK:
+            maps = _MAPS_CACHE.get(key)
+            if maps is not None:
+                _MAPS_CACHE.move_to_end(key)
+                return maps
+
+            if self.persist:
+                maps = self._load_persisted(key)
+            if maps is None:
+                maps = self._compute_maps(key[1])
+                if self.persist:
+                    self._save_persisted(key, maps)
+
+            _MAPS_CACHE[key] = maps
+            while len(_MAPS_CACHE) > max(config.RECTIFY_CACHE_SIZE, 1):
+                _MAPS_CACHE.popitem(last=False)
+            return maps
+
+    @profiling.timed("rectify")
+    def rectify(self, left_img, right_img):
+        """
+        使用缓存的映射表对左右图像进行立体校正。
+        :return: (left_rectified, right_rectified, Q)
+        """
+        height, width = left_img.shape[:2]
+        maps = self.get_maps((width, height))
+
+        left_rectified = cv2.remap(left_img, maps.left_map1, maps.left_map2, cv2.INTER_LINEAR)
+        right_rectified = cv2.remap(right_img, maps.right_map1, maps.right_map2, cv2.INTER_LINEAR)
+        return left_rectified, right_rectified, maps.Q
+
+    @profiling.timed("rectify.region")
+    def rectify_region(self, left_img, right_img, region, right_shift=0):
+        """
+        只校正校正后图像中的一个窗口，remap 只访问窗口对应的映射表行列，结果与整幅校正后裁剪的窗口逐像素相同。
+
+        :param region: 左图窗口 (x0, y0, x1, y1)，校正后图像坐标，例如 StereoMatcher.roi_window 的结果。
+        :param right_shift: 右图窗口相对左图窗口向左平移的列数（立体匹配时为最小视差）。
+        :return: (left_window, right_window, Q)
+        """
+        height, width = left_img.shape[:2]
+        x0, y0, x1, y1 = region
+        if not (0 <= x0 < x1 <= width and 0 <= y0 < y1 <= height
+                and 0 <= x0 - right_shift and x1 - right_shift <= width):
+            raise ValueError(f"Region {region} (right shift {right_shift}) is outside the {width}x{height} image.")
+        maps = self.get_maps((width, height))
+
+        rows, left_columns = slice(y0, y1), slice(x0, x1)
+        right_columns = slice(x0 - right_shift, x1 - right_shift)
+        left_window = cv2.remap(left_img, maps.left_map1[rows, left_columns], maps.left_map2[rows, left_columns],
+                                cv2.INTER_LINEAR)
+        right_window = cv2.remap(right_img, maps.right_map1[rows, right_columns], maps.right_map2[rows, right_columns],
+                                 cv2.INTER_LINEAR)
+        return left_window, right_window, maps.Q
+
+    @profiling.timed("rectify.compute_maps")
+    def _compute_maps(self, image_size):
+        logger.debug("Computing rectification maps for image size %s...", image_size)
+        K1 = self.stereo_params['K1']
+        D1 = self.stereo_params['D1']
+        K2 = self.stereo_params['K2']
+        D2 = self.stereo_params['D2']
+        R = self.stereo_params['R']
+        T = self.stereo_params['T']
+
+        # 标定文件中保存了同一图像尺寸和 alpha 的校正结果时直接使用，省去 stereoRectify
+        if (self.stereo_params.get('image_size') == tuple(image_size) and 'Q' in self.stereo_params
+                and self.stereo_params.get('rectify_alpha') == self.alpha):
+            R1, R2, P1, P2, Q, roi1, roi2 = (self.stereo_params[key]
+                                             for key in ('R1', 'R2', 'P1', 'P2', 'Q', 'roi1', 'roi2'))
+        else:
+            # 这个函数计算校正变换所需的旋转矩阵(R1, R2)、投影矩阵(P1, P2)和Q矩阵
+            # alpha=0: 校正后图像无黑边，但会裁剪掉一部分像素
+            # alpha=1: 保留所有原始像素，但校正后图像会有黑边
+            R1, R2, P1, P2, Q, roi1, roi2 = cv2.stereoRectify(
+                K1, D1, K2, D2, image_size, R, T, alpha=self.alpha
+            )
+        left_map1, left_map2 = cv2.initUndistortRectifyMap(K1, D1, R1, P1, image_size, cv2.CV_16SC2)
+        right_map1, right_map2 = cv2.initUndistortRectifyMap(K2, D2, R2, P2, image_size, cv2.CV_16SC2)
+
+        return RectificationMaps(R1, R2, P1, P2, Q, tuple(roi1), tuple(roi2),
+                                 left_map1, left_map2, right_map1, right_map2)
+
+    def _persist_dir(self, key):
+        params_hash, (width, height), alpha = key
+        return os.path.join(self.cache_dir, f"{params_hash[:16]}_{width}x{height}_a{alpha:g}")
+
+    def _load_persisted(self, key):
+        directory = self._persist_dir(key)
+        if not os.path.isdir(directory):
+            return None
+        try:
+            # 大的映射表使用 mmap 读取，只有被 remap 访问到的页面才会真正读入内存
+            arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+                      for name in RectificationMaps._fields}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable rectification cache %s: %s", directory, e)
+            return None
+        arrays['roi1'] = tuple(int(v) for v in arrays['roi1'])
+        arrays['roi2'] = tuple(int(v) for v in arrays['roi2'])
+        logger.debug("Rectification maps loaded from %s", directory)
+        return RectificationMaps(**arrays)
+
+    def _save_persisted(self, key, maps):
+        directory = self._persist_dir(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # 先写到临时目录再整体改名，避免并发进程读到写了一半的缓存
+            tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+            for name, value in maps._asdict().items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(value))
+            try:
+                os.rename(tmp_dir, directory)
+            except OSError:
+                # 其他进程已经写好了同一份缓存
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except OSError as e:
+            logger.warning("Could not persist rectification maps to %s: %s", directory, e)
+
+
+# 融合预处理的结果：校正后的左右灰度图（匹配器的输入）、校正后的左彩色图（不需要颜色时为 None）和 Q 矩阵
+PreprocessedPair = namedtuple("PreprocessedPair", ["left_gray", "right_gray", "left_color", "Q"])
+
+
+class StereoPreprocessor:
+    """
+    把校正和转灰度合并为一步的预处理，供逐帧处理的循环使用。
+
+    先把原始图像转换为灰度再 remap：单通道 remap 的计算量只有三通道的约三分之一，匹配器拿到的已经是灰度图，
+    不需要再转换一次；左彩色图只在需要颜色（点云、显示）时才 remap，右彩色图完全不生成。
+    灰度值与先校正再转灰度的结果最多相差插值的舍入误差（1 个灰度级）。
+
+    reuse_buffers=True 时所有输出都写入自带的 utils.frame_context.FrameContext 中按图像尺寸分配一次的缓冲区
+    （OpenCV 的 dst 参数），尺寸不变时每一帧都不再分配新数组。此时 process 返回的数组会被下一次调用覆盖，
+    需要保留的结果由调用方复制；有多帧同时在处理中的场景（例如 processing.stream_pipeline）
+    应使用 reuse_buffers=False，并为每一帧传入自己的 context。
+    """
+
+    def __init__(self, rectifier, with_color=True, reuse_buffers=True):
+        """
+        :param rectifier: Rectifier 实例，提供缓存的映射表。
+        :param with_color: 是否生成校正后的左彩色图。
+        :param reuse_buffers: 是否在多次调用之间复用输出缓冲区。
+        """
+        self.rectifier = rectifier
+        self.with_color = with_color
+        self.reuse_buffers = reuse_buffers
+        self.context = FrameContext() if reuse_buffers else None
+
+    @profiling.timed("rectify")
+    def process(self, left_img, right_img, with_color=None, context=None):
+        """
+        校正一对 BGR 图像。
+        :param with_color: 覆盖构造时的 with_color 设置。
+        :param context: 输出写入的 FrameContext，None 时使用自带的上下文（reuse_buffers=False 时每次分配新数组）。
+        :return: PreprocessedPair
+        """
+        with_color = self.with_color if with_color is None else with_color
+        context = self.context if context is None else context
+        height, width = left_img.shape[:2]
+        maps = self.rectifier.get_maps((width, height))
+
+        shape = (height, width)
+        raw_left = cv2.cvtColor(left_img, cv2.COLOR_BGR2GRAY, dst=context_buffer(context, "rectify.raw_left", shape))
+        raw_right = cv2.cvtColor(right_img, cv2.COLOR_BGR2GRAY,
+                                 dst=context_buffer(context, "rectify.raw_right", shape))
+        left_gray = cv2.remap(raw_left, maps.left_map1, maps.left_map2, cv2.INTER_LINEAR,
+                              dst=context_buffer(context, "rectify.left_gray", shape))
+        right_gray = cv2.remap(raw_right, maps.right_map1, maps.right_map2, cv2.INTER_LINEAR,
+                               dst=context_buffer(context, "rectify.right_gray", shape))
+        left_color = None
+        if with_color:
+            left_color = cv2.remap(left_img, maps.left_map1, maps.left_map2, cv2.INTER_LINEAR,
+                                   dst=context_buffer(context, "rectify.left_color", shape + (3,)))
+        return PreprocessedPair(left_gray, right_gray, left_color, maps.Q)
+
+
+def clear_rectification_cache():
+    """清空进程内的映射表缓存（不影响磁盘上的缓存）。"""
+    with _MAPS_LOCK:
+        _MAPS_CACHE.clear()
+
 
 def rectify_stereo_pair(left_img, right_img, stereo_params):
     """
     使用标定参数对左右图像进行立体校正。
 
+    映射表按参数内容缓存在进程内，对同一组参数和尺寸重复调用时不会重新计算。
+
     Args:
         left_img (np.ndarray): 原始左图像。
         right_img (np.ndarray): 原始右图像。
@@ -18,35 +275,36 @@ def rectify_stereo_pair(left_img, right_img, stereo_params):
         - right_rectified (np.ndarray): 校正后的右图像。
         - Q (np.ndarray): 4x4 的视差转深度重投影矩阵。
     """
-    print("Rectifying stereo image pair...")
-
-    # 从参数字典中提取需要的矩阵
-    K1 = stereo_params['K1']
-    D1 = stereo_params['D1']
-    K2 = stereo_params['K2']
-    D2 = stereo_params['D2']
-    R = stereo_params['R']
-    T = stereo_params['T']
-
-    # 获取图像尺寸
-    height, width = left_img.shape[:2]
-    image_size = (width, height)
-
-    # --- 核心步骤: 执行 cv2.stereoRectify ---
-    # 这个函数计算校正变换所需的旋转矩阵(R1, R2)、投影矩阵(P1, P2)和Q矩阵
-    R1, R2, P1, P2, Q, _, _ = cv2.stereoRectify(
-        K1, D1, K2, D2, image_size, R, T, alpha=0
-    )
-
-    # --- 计算校正所需的映射表 ---
-    # alpha=0: 校正后图像无黑边，但会裁剪掉一部分像素
-    # alpha=1: 保留所有原始像素，但校正后图像会有黑边
-    left_map1, left_map2 = cv2.initUndistortRectifyMap(K1, D1, R1, P1, image_size, cv2.CV_16SC2)
-    right_map1, right_map2 = cv2.initUndistortRectifyMap(K2, D2, R2, P2, image_size, cv2.CV_16SC2)
-
-    # --- 应用映射表，进行重映射 ---
-    left_rectified = cv2.remap(left_img, left_map1, left_map2, cv2.INTER_LINEAR)
-    right_rectified = cv2.remap(right_img, right_map1, right_map2, cv2.INTER_LINEAR)
-
-    print("Rectification complete.")
-    return left_rectified, right_rectified, Q
\ No newline at end of file
+    logger.debug("Rectifying stereo image pair...")
+    rectifier = Rectifier(stereo_params=stereo_params, persist=False)
+    left_rectified, right_rectified, Q = rectifier.rectify(left_img, right_img)
+    logger.debug("Rectification complete.")
+    return left_rectified, right_rectified, Q
+
+
+def colorize_disparity(disparity_map, min_disp, num_disp):
+    """
+    把 CV_16S 原始视差图归一化到 0-255 并应用伪彩色，返回 BGR 图像。
+    显示窗口和无界面模式保存的视差图都使用这一函数，保证两者的颜色一致。
+
+    Args:
+        disparity_map (np.ndarray): CV_16S 格式的原始视差图。
+        min_disp (int): SGBM的最小视差。
+        num_disp (int): SGBM的视差范围。
+    """
+    # 注意：disparity_map 的值是 16 * 真实视差，所以要除以 16
+    disp_to_show = (disparity_map.astype(np.float32) / 16.0 - min_disp) / num_disp
+    disp_to_show = cv2.normalize(disp_to_show, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+    return cv2.applyColorMap(disp_to_show, cv2.COLORMAP_JET)
+
+
+# --- Internal Helper Functions ---
+def _hash_params(stereo_params):
+    """[内部辅助函数] 计算参数字典中校正相关矩阵的 SHA-1。"""
+    digest = hashlib.sha1()
+    for key in ('K1', 'D1', 'K2', 'D2', 'R', 'T'):
+        value = np.ascontiguousarray(stereo_params[key], dtype=np.float64)
+        digest.update(key.encode())
+        digest.update(str(value.shape).encode())
+        digest.update(value.tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,162 @@
+# utils/ply_io.py
+"""
+不依赖 Open3D 的二进制 PLY 点云读写。
+
+写入时用结构化 dtype 把 float32 坐标和 uint8 颜色交织成一个数组，
+再连同文件头一次性写出；读取时解析文件头后直接把顶点数据 memmap 成结构化数组，
+不需要逐行解析，也不需要把数据复制成双精度。
+"""
+import numpy as np
+
+# PLY 属性类型名与 NumPy 类型的对应关系（不含字节序）
+_PLY_TYPES = {
+    "char": "i1", "int8": "i1",
+    "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2",
+    "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4",
+    "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4",
+    "double": "f8", "float64": "f8",
+}
+_FORMATS = {"binary_little_endian": "<", "binary_big_endian": ">"}
+
+
+def write_ply(path, points, colors=None):
+    """
+    把点云写为 binary_little_endian 格式的 PLY 文件。
+
+    Args:
+        path (str): 输出文件路径。
+        points (np.ndarray): Nx3 的点坐标，以 float32 保存。
+        colors (np.ndarray): Nx3 的 RGB 颜色 (0-255)，以 uint8 保存；None 表示不保存颜色。
+    """
+    points = np.asarray(points).reshape(-1, 3)
+    fields = [("x", "<f4"), ("y", "<f4"), ("z", "<f4")]
+    if colors is not None:
+        colors = np.asarray(colors).reshape(-1, 3)
+        if len(colors) != len(points):
+            raise ValueError(f"Got {len(points)} points but {len(colors)} colors.")
+        if colors.dtype != np.uint8:
+            colors = np.clip(np.rint(colors), 0, 255)
+        fields += [("red", "u1"), ("green", "u1"), ("blue", "u1")]
+
+    vertices = np.empty(len(points), dtype=fields)
+    vertices["x"], vertices["y"], vertices["z"] = points[:, 0], points[:, 1], points[:, 2]
+    if colors is not None:
+        vertices["red"], vertices["green"], vertices["blue"] = colors[:, 0], colors[:, 1], colors[:, 2]
+
+    header = ["ply", "format binary_little_endian 1.0", f"element vertex {len(points)}"]
+    header += [f"property {'float' if dtype == '<f4' else 'uchar'} {name}" for name, dtype in fields]
+    header.append("end_header")
+    with open(path, "wb") as f:
+        f.write(("\n".join(header) + "\n").encode("ascii"))
+        vertices.tofile(f)
+
+
+def read_ply(path, mmap=True):
+    """
+    读取二进制 PLY 文件中的顶点坐标和颜色。
+
+    Args:
+        path (str): PLY 文件路径。
+        mmap (bool): True 时以只读 memmap 方式映射顶点数据，数据在被访问时才从磁盘读入。
+    Returns:
+        tuple: (points, colors)。points 为 Nx3 数组（保持文件中的浮点类型），
+               colors 为 Nx3 uint8 数组，文件中没有颜色时为 None。
+    """
+    with open(path, "rb") as f:
+        elements = _parse_header(f)
+        data_offset = f.tell()
+
+    # 顶点之前的其他元素（如果有）需要跳过
+    offset = data_offset
+    vertex_dtype, vertex_count = None, 0
+    for name, count, dtype in elements:
+        if name == "vertex":
+            vertex_dtype, vertex_count = dtype, count
+            break
+        if dtype is None:
+            raise ValueError(f"Unsupported PLY file {path}: list properties before the vertex element.")
+        offset += count * dtype.itemsize
+    if vertex_dtype is None:
+        raise ValueError(f"PLY file {path} has no vertex element.")
+
+    if mmap and vertex_count > 0:
+        vertices = np.memmap(path, dtype=vertex_dtype, mode="r", offset=offset, shape=(vertex_count,))
+    else:
+        vertices = np.fromfile(path, dtype=vertex_dtype, count=vertex_count, offset=offset)
+
+    names = vertex_dtype.names
+    if not all(axis in names for axis in ("x", "y", "z")):
+        raise ValueError(f"PLY file {path} has no x/y/z vertex properties.")
+    points = _stack_fields(vertices, ("x", "y", "z"))
+    colors = None
+    if all(channel in names for channel in ("red", "green", "blue")):
+        colors = _stack_fields(vertices, ("red", "green", "blue"))
+        if colors.dtype != np.uint8:
+            colors = colors.astype(np.uint8)
+    return points, colors
+
+
+# --- Internal Helper Functions ---
+def _parse_header(f):
+    """[内部辅助函数] 解析文件头，返回 [(元素名, 数量, 结构化 dtype 或 None)]。"""
+    if f.readline().strip() != b"ply":
+        raise ValueError("Not a PLY file.")
+    byte_order = None
+    elements = []
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("Unexpected end of file in PLY header.")
+        tokens = line.decode("ascii").split()
+        if not tokens or tokens[0] in ("comment", "obj_info"):
+            continue
+        keyword = tokens[0]
+        if keyword == "end_header":
+            break
+        if keyword == "format":
+            if tokens[1] not in _FORMATS:
+                raise ValueError(f"Unsupported PLY format '{tokens[1]}', only binary PLY files can be read.")
+            byte_order = _FORMATS[tokens[1]]
+        elif keyword == "element":
+            elements.append([tokens[1], int(tokens[2]), []])
+        elif keyword == "property":
+            if not elements:
+                raise ValueError("PLY property declared before any element.")
+            # 列表属性的长度不固定，无法表示为结构化 dtype
+            if tokens[1] == "list":
+                elements[-1][2] = None
+            elif elements[-1][2] is not None:
+                elements[-1][2].append((tokens[2], tokens[1]))
+    if byte_order is None:
+        raise ValueError("PLY header has no format line.")
+
+    parsed = []
+    for name, count, properties in elements:
+        dtype = None
+        if properties is not None:
+            dtype = np.dtype([(prop, byte_order + _PLY_TYPES[ply_type]) for prop, ply_type in properties])
+        parsed.append((name, count, dtype))
+    return parsed
+
+
+def _stack_fields(vertices, fields):
+    """
+    [内部辅助函数] 把结构化数组的几个字段合并为 Nx3 数组。
+    字段类型相同且在记录中连续排列时（本模块写出的文件就是这样）直接返回跨步视图，不复制数据。
+    """
+    layout = [vertices.dtype.fields[field] for field in fields]
+    field_dtype, first_offset = layout[0][:2]
+    contiguous = all(dtype == field_dtype and offset == first_offset + i * field_dtype.itemsize
+                     for i, (dtype, offset) in enumerate(entry[:2] for entry in layout))
+    if contiguous and len(vertices) > 0:
+        return np.ndarray((len(vertices), len(fields)), dtype=field_dtype, buffer=vertices,
+                          offset=first_offset, strides=(vertices.dtype.itemsize, field_dtype.itemsize))
+
+    columns = [vertices[field] for field in fields]
+    result = np.empty((len(vertices), len(fields)), dtype=np.result_type(*columns).newbyteorder("="))
+    for i, column in enumerate(columns):
+        result[:, i] = column
+    return result
@@ -0,0 +1,227 @@
+# utils/profiling.py
+"""
+轻量的分阶段计时工具。
+
+用 timed(name) 作为上下文管理器或装饰器包裹一个处理阶段，每次调用的墙钟时间和 CPU 时间
+都会累计到全局的 REGISTRY 中；开启内存跟踪 (start_memory_tracking) 时还会记录该阶段的峰值内存。
+计时本身只调用两次 perf_counter / process_time，未开启内存跟踪时开销可以忽略，因此各阶段总是被计时，
+结果是否输出由命令行的 --timings / --profile 决定。
+
+峰值内存由 tracemalloc 统计，包括 Python 对象和 NumPy 数组（OpenCV 函数返回的数组也是 NumPy 分配的），
+但不包括 OpenCV 内部的临时缓冲区。阶段嵌套时，外层阶段的峰值包含内层阶段的峰值。
+多线程同时运行的阶段（例如流式流水线）共享同一个 tracemalloc 计数，峰值内存只是近似值。
+进程池中的工作进程各有自己的 REGISTRY，不会汇总到主进程。
+"""
+import contextlib
+import csv
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+_CSV_FIELDS = ("stage", "calls", "wall_s", "cpu_s", "mean_ms", "max_ms", "peak_mem_mb")
+
+
+class StageTimings:
+    """单个阶段的累计统计。"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.max_s = 0.0
+        self.peak_mem_bytes = None
+
+    def record(self, wall_s, cpu_s, peak_mem_bytes=None):
+        self.calls += 1
+        self.wall_s += wall_s
+        self.cpu_s += cpu_s
+        self.max_s = max(self.max_s, wall_s)
+        if peak_mem_bytes is not None:
+            self.peak_mem_bytes = max(self.peak_mem_bytes or 0, peak_mem_bytes)
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "calls": self.calls,
+            "wall_s": self.wall_s,
+            "cpu_s": self.cpu_s,
+            "mean_ms": self.wall_s / self.calls * 1000.0 if self.calls else 0.0,
+            "max_ms": self.max_s * 1000.0,
+            "peak_mem_mb": None if self.peak_mem_bytes is None else self.peak_mem_bytes / 2**20,
+        }
+
+
+class TimerRegistry:
+    """按阶段名汇总计时结果，可以在多个线程中同时记录。"""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, wall_s, cpu_s, peak_mem_bytes=None):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = StageTimings(name)
+            stage.record(wall_s, cpu_s, peak_mem_bytes)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def __contains__(self, name):
+        return name in self._stages
+
+    def __getitem__(self, name):
+        return self._stages[name]
+
+    def to_dict(self):
+        """返回 {阶段名: 统计字典}，按第一次记录的顺序排列。"""
+        with self._lock:
+            return {name: stage.to_dict() for name, stage in self._stages.items()}
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=_CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.to_dict().values())
+
+    def export(self, path):
+        """根据扩展名把结果写为 CSV (.csv) 或 JSON（其他扩展名）。"""
+        if path.lower().endswith(".csv"):
+            self.write_csv(path)
+        else:
+            self.write_json(path)
+        logger.info("Stage timings written to %s", path)
+
+    def log_report(self, level=logging.INFO):
+        """以表格形式把各阶段的统计写入日志。"""
+        stages = self.to_dict()
+        if not stages:
+            return
+        lines = ["--- Stage Timings ---",
+                 f"{'stage':<28}{'calls':>7}{'wall ms':>11}{'cpu ms':>11}{'mean ms':>10}{'peak MB':>10}"]
+        for stats in stages.values():
+            peak = "-" if stats["peak_mem_mb"] is None else f"{stats['peak_mem_mb']:.1f}"
+            lines.append(f"{stats['stage']:<28}{stats['calls']:>7}{stats['wall_s'] * 1000:>11.1f}"
+                         f"{stats['cpu_s'] * 1000:>11.1f}{stats['mean_ms']:>10.1f}{peak:>10}")
+        logger.log(level, "\n".join(lines))
+
+
+# 全局的计时结果
+REGISTRY = TimerRegistry()
+# 每个线程当前正在运行的阶段，用于嵌套阶段的峰值内存统计
+_active = threading.local()
+
+
+class timed:
+    """
+    阶段计时器，既可以作为上下文管理器，也可以作为装饰器:
+
+        with timed("match"):
+            ...
+
+        @timed("rectify")
+        def rectify(...):
+            ...
+    """
+
+    def __init__(self, name, registry=None):
+        self.name = name
+        self.registry = registry
+
+    def __enter__(self):
+        stack = getattr(_active, "stack", None)
+        if stack is None:
+            stack = _active.stack = []
+        frame = {"wall": time.perf_counter(), "cpu": time.process_time(), "mem": None, "peak": 0}
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # 重置峰值之前，把到目前为止的峰值记到外层阶段上
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            frame["mem"] = current
+        stack.append(frame)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_s = time.perf_counter()
+        cpu_s = time.process_time()
+        stack = _active.stack
+        frame = stack.pop()
+        peak_mem = None
+        if frame["mem"] is not None and tracemalloc.is_tracing():
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            peak_mem = max(peak - frame["mem"], 0)
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        (self.registry or REGISTRY).record(self.name, wall_s - frame["wall"], cpu_s - frame["cpu"], peak_mem)
+        return False
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            # 每次调用使用新的计时器对象，函数可以被递归或在多个线程中同时调用
+            with timed(self.name, self.registry):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+def start_memory_tracking():
+    """开启 tracemalloc，之后的阶段会记录峰值内存。会使内存分配变慢，只在需要时开启。"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop_memory_tracking():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def traced_allocations():
+    """
+    统计 with 块中 tracemalloc 记录的内存分配，产出的字典在退出时填入
+    peak_bytes（块内相对进入时的峰值）和 net_bytes（退出时仍未释放的字节数）。
+    未开启内存跟踪时临时开启。用于验证复用缓冲区（utils.frame_context）之后每一帧不再分配大块内存。
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    stats = {}
+    try:
+        yield stats
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        stats["peak_bytes"] = max(peak - start_bytes, 0)
+        stats["net_bytes"] = current - start_bytes
+        if started:
+            tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def cprofile_to(path):
+    """在 with 块中运行 cProfile，结束时把统计结果写入 path（可用 python -m pstats 或 snakeviz 查看）。"""
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        logger.info("cProfile statistics written to %s", path)
@@ -0,0 +1,165 @@
+# utils/synthetic_stereo.py
+"""
+合成的双目图像对，附带精确的真值视差，用于基准测试和匹配精度评估。
+
+场景由若干个带随机纹理的平面层组成：一个铺满画面的倾斜背景平面，和几个在它前面的矩形物体
+（正对相机或略微倾斜），视差在每一层内是像素坐标的线性函数 d = a + b*x + c*y（以左图坐标表示）。
+纹理定义在左图坐标上，左图直接按层从远到近绘制；右图中每个像素 x_r 对应左图坐标 x = x_r + d，
+对平面层可以直接解出 x，再从纹理中双线性采样，因此两幅图像和真值视差完全一致，不需要前向投影。
+
+render_with_calibration 再用标定参数把校正后的合成图像反向映射成两台相机拍到的原始图像（带畸变、未校正），
+这样评估时可以让图像经过与实际使用时完全相同的校正流程，真值视差仍然定义在校正后的坐标上。
+"""
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+import config
+
+# left/right: 校正后的 BGR 图像 (uint8)；disparity: 左图每个像素的真值视差 (float32, 像素)；
+# valid: 在右图中可见（未被遮挡且没有移出画面）的像素，只有这些像素可以被匹配
+SyntheticPair = namedtuple("SyntheticPair", ["left", "right", "disparity", "valid"])
+# left/right 为原始（未校正）图像；disparity、valid 定义在校正后的左图坐标上；Q 为该图像尺寸下的 Q 矩阵
+SyntheticCapture = namedtuple("SyntheticCapture", ["left", "right", "disparity", "valid", "Q"])
+
+
+def make_rectified_pair(width, height, num_disparities=None, min_disparity=None, num_objects=4, seed=0):
+    """
+    生成一对校正后的合成图像及其真值视差。
+
+    Args:
+        width, height (int): 图像尺寸。
+        num_disparities (int): 场景视差覆盖的范围，默认使用 config.SGBM_NUM_DISPARITIES。
+                               真值视差落在 [min_disparity, min_disparity + 0.9 * num_disparities] 内。
+        min_disparity (int): 最小视差，默认使用 config.SGBM_MIN_DISPARITY。
+        num_objects (int): 背景前的矩形物体个数。
+        seed (int): 随机种子，相同参数和种子总是生成相同的图像。
+    Returns:
+        SyntheticPair
+    """
+    num_disparities = num_disparities or config.SGBM_NUM_DISPARITIES
+    min_disparity = config.SGBM_MIN_DISPARITY if min_disparity is None else min_disparity
+    rng = np.random.default_rng(seed)
+    layers = _random_layers(width, height, num_disparities, min_disparity, num_objects, rng)
+    # 纹理比图像宽出一个视差范围，右图靠右边缘的像素在左图坐标中超出图像时仍能采样到背景
+    texture_width = width + min_disparity + num_disparities + 2
+    textures = [_random_texture(height, texture_width, rng) for _ in layers]
+    return _render(layers, textures, width, height)
+
+
+def render_with_calibration(stereo_params, image_size=None, num_disparities=None, min_disparity=None,
+                            num_objects=4, seed=0, alpha=None):
+    """
+    按标定参数生成一对原始相机图像：先生成校正后的合成图像对，再用每台相机的内参、畸变系数和校正旋转
+    把它映射回原始图像坐标。用 utils.image_utils.Rectifier 校正这两幅图像，就得到与真值视差对齐的校正图像对。
+
+    Args:
+        stereo_params (dict): file_utils.load_stereo_params 加载的标定参数。
+        image_size (tuple): 图像尺寸 (width, height)，默认使用标定时的图像尺寸。
+        alpha (float): 校正的 alpha，默认使用 config.RECTIFY_ALPHA，必须与之后校正时使用的值相同。
+        其余参数与 make_rectified_pair 相同。
+    Returns:
+        SyntheticCapture
+    """
+    from utils.image_utils import Rectifier
+
+    image_size = tuple(image_size or stereo_params.get('image_size') or ())
+    if len(image_size) != 2:
+        raise ValueError("image_size is required when the stereo parameters do not record one.")
+    width, height = image_size
+    maps = Rectifier(stereo_params=stereo_params, alpha=alpha, persist=False).get_maps(image_size)
+    pair = make_rectified_pair(width, height, num_disparities, min_disparity, num_objects, seed)
+
+    left = _unrectify(pair.left, stereo_params['K1'], stereo_params['D1'], maps.R1, maps.P1)
+    right = _unrectify(pair.right, stereo_params['K2'], stereo_params['D2'], maps.R2, maps.P2)
+    return SyntheticCapture(left, right, pair.disparity, pair.valid, maps.Q)
+
+
+# --- Internal Helper Functions ---
+def _unrectify(rectified, K, D, R, P):
+    """
+    [内部辅助函数] 校正的逆过程：对原始图像的每个像素，用 undistortPoints 求出它在校正图像中的位置并采样。
+    """
+    height, width = rectified.shape[:2]
+    xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    raw_points = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2)
+    rectified_points = cv2.undistortPoints(raw_points, K, D, R=R, P=P).reshape(height, width, 2)
+    # 校正时被裁掉的边缘像素不会出现在校正结果中，用镜像填充，避免产生很强的人工边缘
+    return cv2.remap(rectified, rectified_points[..., 0], rectified_points[..., 1], cv2.INTER_LINEAR,
+                     borderMode=cv2.BORDER_REFLECT_101)
+
+
+def _random_layers(width, height, num_disparities, min_disparity, num_objects, rng):
+    """
+    [内部辅助函数] 随机生成场景的平面层，按视差从小到大（从远到近）排列。
+    每一层为 (x0, y0, x1, y1, a, b, c)，在左图矩形 [x0, x1) x [y0, y1) 内视差为 a + b*x + c*y。
+    """
+    span = float(num_disparities)
+    # 背景平面：视差在整幅图像上从约 10% 渐变到约 35%
+    near, far = min_disparity + span * rng.uniform(0.25, 0.35), min_disparity + span * rng.uniform(0.1, 0.15)
+    b = (near - far) / width * rng.choice([-1.0, 1.0])
+    c = rng.uniform(-0.05, 0.05) * span / height
+    a = (near + far) / 2 - b * width / 2 - c * height / 2
+    layers = [(0, 0, width, height, a, b, c)]
+
+    objects = []
+    for _ in range(num_objects):
+        w = int(rng.uniform(0.12, 0.35) * width)
+        h = int(rng.uniform(0.12, 0.35) * height)
+        x0 = int(rng.uniform(0, width - w))
+        y0 = int(rng.uniform(0, height - h))
+        center = min_disparity + span * rng.uniform(0.45, 0.9)
+        # 一半的物体正对相机（视差恒定），另一半在水平方向略微倾斜
+        b = 0.0 if rng.random() < 0.5 else rng.uniform(-0.05, 0.05) * span / w
+        a = center - b * (x0 + w / 2)
+        objects.append((x0, y0, x0 + w, y0 + h, a, b, 0.0))
+    objects.sort(key=lambda layer: layer[4] + layer[5] * (layer[0] + layer[2]) / 2)
+    return layers + objects
+
+
+def _random_texture(height, width, rng):
+    """[内部辅助函数] 多尺度随机噪声叠加成的彩色纹理 (float32 BGR, 0-255)，保证各个尺度上都有可匹配的结构。"""
+    gray = np.zeros((height, width), dtype=np.float32)
+    for cell, weight in ((32, 0.35), (8, 0.35), (2, 0.3)):
+        coarse = rng.random((height // cell + 2, width // cell + 2)).astype(np.float32)
+        gray += weight * cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
+    tint = rng.uniform(0.6, 1.0, size=3).astype(np.float32)
+    return gray[:, :, np.newaxis] * tint
+
+
+def _render(layers, textures, width, height):
+    """[内部辅助函数] 按层从远到近绘制左右图像，并计算真值视差和可见性。"""
+    xs = np.arange(width, dtype=np.float32)[np.newaxis, :]
+    ys = np.arange(height, dtype=np.float32)[:, np.newaxis]
+    grid_y = np.broadcast_to(ys, (height, width)).astype(np.float32)
+
+    left = np.zeros((height, width, 3), dtype=np.float32)
+    right = np.zeros((height, width, 3), dtype=np.float32)
+    disparity = np.zeros((height, width), dtype=np.float32)
+    owner_left = np.zeros((height, width), dtype=np.int32)
+    owner_right = np.full((height, width), -1, dtype=np.int32)
+
+    for index, ((x0, y0, x1, y1, a, b, c), texture) in enumerate(zip(layers, textures)):
+        # 左图：纹理直接按左图坐标绘制
+        region = (slice(y0, y1), slice(x0, x1))
+        left[region] = texture[region]
+        disparity[region] = (a + b * xs + c * ys)[region]
+        owner_left[region] = index
+
+        # 右图：x_r = x - (a + b*x + c*y)  =>  x = (x_r + a + c*y) / (1 - b)
+        map_x = ((xs + a + c * ys) / (1.0 - b)).astype(np.float32)
+        inside = (map_x >= x0) & (map_x <= x1 - 1) & (grid_y >= y0) & (grid_y < y1)
+        sampled = cv2.remap(texture, map_x, grid_y, cv2.INTER_LINEAR)
+        right[inside] = sampled[inside]
+        owner_right[inside] = index
+
+    # 左图像素在右图中的位置被同一层覆盖时才是可见的
+    match_x = np.rint(xs - disparity).astype(np.int64)
+    in_frame = (match_x >= 0) & (match_x < width)
+    rows = np.broadcast_to(np.arange(height)[:, np.newaxis], (height, width))
+    valid = in_frame & (owner_right[rows, np.clip(match_x, 0, width - 1)] == owner_left)
+
+    to_uint8 = lambda image: np.clip(np.rint(image), 0, 255).astype(np.uint8)
+    return SyntheticPair(to_uint8(left), to_uint8(right), disparity, valid)
@@ -1,5 +1,10 @@
+import logging
 import cv2
 import numpy as np
+import config
+from utils import image_utils, ply_io
+
+logger = logging.getLogger(__name__)
 
 def display_chessboard_corners(image_left, ret_left, corners_left,
                                image_right, ret_right, corners_right,
@@ -24,7 +29,7 @@ def display_chessboard_corners(image_left, ret_left, corners_left,
     cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
     cv2.imshow(window_name, display_image)
 
-    print("Press any key to continue to the next pair, or 'q' to quit.")
+    logger.info("Press any key to continue to the next pair, or 'q' to quit.")
     key = _wait_for_key_or_window_close(window_name)
 
     return key
@@ -38,13 +43,8 @@ def show_disparity_map(disparity_map, min_disp, num_disp):
         min_disp (int): SGBM的最小视差。
         num_disp (int): SGBM的视差范围。
     """
-    # 将视差图转换为0-255范围的8位图像
-    # 注意：disparity_map 的值是 16 * 真实视差，所以要除以 16
-    disp_to_show = (disparity_map.astype(np.float32) / 16.0 - min_disp) / num_disp
-    disp_to_show = cv2.normalize(disp_to_show, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-
-    # 应用伪彩色映射，使其更易于观察
-    colormap_disp = cv2.applyColorMap(disp_to_show, cv2.COLORMAP_JET)
+    # 将视差图转换为0-255范围的8位图像，并应用伪彩色映射，使其更易于观察
+    colormap_disp = image_utils.colorize_disparity(disparity_map, min_disp, num_disp)
 
     window_name = "Disparity Map"
     cv2.imshow(window_name, colormap_disp)
@@ -78,16 +78,26 @@ def show_point_cloud(ply_file_path):
     try:
         import open3d as o3d
     except ImportError:
-        print("\n[Error] Open3D is not installed, but is required for 3D visualization.")
-        print("To install, run: pip install open3d")
+        logger.error("Open3D is not installed, but is required for 3D visualization.")
+        logger.info("To install, run: pip install open3d")
         return
 
-    print(f"Visualizing point cloud from {ply_file_path}...")
-    pcd = o3d.io.read_point_cloud(ply_file_path)
-    if not pcd.has_points():
-        print("Could not read point cloud or point cloud is empty.")
+    logger.info("Visualizing point cloud from %s...", ply_file_path)
+    try:
+        points, colors = ply_io.read_ply(ply_file_path)
+    except (OSError, ValueError) as e:
+        logger.error("Could not read point cloud: %s", e)
+        return
+    if len(points) == 0:
+        logger.warning("Point cloud is empty.")
         return
 
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points.astype(np.float64))
+    if colors is not None:
+        # Open3D 需要的颜色值是 0-1 范围的浮点数
+        pcd.colors = o3d.utility.Vector3dVector(colors / 255.0)
+
     # 创建一个可视化窗口并显示点云
     o3d.visualization.draw_geometries([pcd])
 
@@ -95,78 +105,91 @@ def show_point_cloud(ply_file_path):
 def show_interactive_depth_map(
         disparity_map,
         left_image_for_display,
-        points_3D,
+        depth_source,
         min_disp,
         num_disp
 ):
     """
     创建一个交互式窗口，显示伪彩色的视差图，并在鼠标悬停处显示Z轴深度。
 
+    窗口只在鼠标位置变化时重绘：文字只画在画布上很小的区域里，重绘前把这些区域恢复原样，
+    不需要每次复制整幅拼接图像；深度直接从预先计算的深度图中读取。
+    没有鼠标移动时主循环只是阻塞等待按键，几乎不占用 CPU。
+
     Args:
         disparity_map (np.ndarray): 原始视差图 (CV_16S).
         left_image_for_display (np.ndarray): 用于在旁边显示的左相机图像。
-        points_3D (np.ndarray): HxWx3 的三维点坐标矩阵。
+        depth_source: HxW 的深度图、HxWx3 的三维点坐标矩阵，或带有 depth_map() 方法的惰性重建结果。
         min_disp (int): SGBM的最小视差。
         num_disp (int): SGBM的视差范围。
     """
-    print("\n--- Interactive Depth Map ---")
-    print("Move mouse over the depth map to see distance. Press 'q' or close window to exit.")
+    logger.info("--- Interactive Depth Map ---")
+    logger.info("Move mouse over the depth map to see distance. Press 'q' or close window to exit.")
+
+    depth_map = _as_depth_map(depth_source)
 
     # 创建一个字典来在回调函数和主循环之间共享数据
-    mouse_params = {'x': -1, 'y': -1}
+    mouse_params = {'x': -1, 'y': -1, 'moved': False}
     window_name = "Interactive Depth Map"
     cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
 
     # --- 定义鼠标回调函数 ---
     def on_mouse(event, x, y, flags, param):
-        if event == cv2.EVENT_MOUSEMOVE:
+        if event == cv2.EVENT_MOUSEMOVE and (x, y) != (param['x'], param['y']):
             param['x'] = x
             param['y'] = y
+            param['moved'] = True
 
     cv2.setMouseCallback(window_name, on_mouse, mouse_params)
 
     # --- 准备用于显示的伪彩色视差图 ---
-    disp_to_show = (disparity_map.astype(np.float32) / 16.0 - min_disp) / num_disp
-    disp_to_show = cv2.normalize(disp_to_show, None, alpha=0, beta=255, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-    colormap_disp = cv2.applyColorMap(disp_to_show, cv2.COLORMAP_JET)
+    colormap_disp = image_utils.colorize_disparity(disparity_map, min_disp, num_disp)
 
     # 将左图和视差图拼接在一起显示
     h, w = left_image_for_display.shape[:2]
-    combined_display = np.zeros((h, w * 2, 3), dtype=np.uint8)
-    combined_display[:, :w] = left_image_for_display
-    combined_display[:, w:] = colormap_disp
-
+    canvas = np.zeros((h, w * 2, 3), dtype=np.uint8)
+    canvas[:, :w] = left_image_for_display
+    canvas[:, w:] = colormap_disp
+
+    # 顶部信息条：缓存一份原始内容用于恢复，以及一份黑色背景用于绘制文字
+    bar_height = min(30, h)
+    bar_original = canvas[:bar_height].copy()
+    bar_background = np.zeros_like(bar_original)
+    # 被文字覆盖的区域及其原始内容，下次重绘前恢复
+    dirty_regions = []
+
+    cv2.imshow(window_name, canvas)
     while True:
-        # 复制一份显示图像，以免永久地在上面画字
-        display_copy = combined_display.copy()
-
-        x, y = mouse_params['x'], mouse_params['y']
-
-        # 检查鼠标是否在右侧的视差图区域内
-        if w < x < w * 2 and 0 < y < h:
-            # 获取对应的3D点
-            point_3d = points_3D[y, x - w]
-            px, py, pz = point_3d[0], point_3d[1], point_3d[2]
-
-            # 我们只显示Z值（深度），单位是毫米(mm)
-            # 过滤掉无效的深度值
-            if pz < 10000 and pz > 10:  # 过滤掉10米以外的点和10mm以内的点
-                distance_text = f"Dist: {int(pz)} mm"
-            else:
-                distance_text = "Distance: inf"
-
-            # 在图像上绘制文本
-            # 在鼠标位置附近显示
-            cv2.putText(display_copy, distance_text, (x + 10, y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255),
-                        2)
-            # 也可以在固定位置显示
-            cv2.rectangle(display_copy, (0, 0), (w * 2, 30), (0, 0, 0), -1)  # 创建一个黑色背景条
-            cv2.putText(display_copy, f"({x - w}, {y}) -> {distance_text}", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7,
-                        (255, 255, 255), 2)
-
-        cv2.imshow(window_name, display_copy)
-
-        key = cv2.waitKey(1) & 0xFF
+        if mouse_params['moved']:
+            mouse_params['moved'] = False
+            for (y0, y1, x0, x1), patch in reversed(dirty_regions):
+                canvas[y0:y1, x0:x1] = patch
+            dirty_regions = []
+
+            x, y = mouse_params['x'], mouse_params['y']
+            # 检查鼠标是否在右侧的视差图区域内
+            if w < x < w * 2 and 0 < y < h:
+                # 我们只显示Z值（深度），单位是毫米(mm)
+                pz = depth_map[y, x - w]
+                # 过滤掉无效的深度值
+                if pz < 10000 and pz > 10:  # 过滤掉10米以外的点和10mm以内的点
+                    distance_text = f"Dist: {int(pz)} mm"
+                else:
+                    distance_text = "Distance: inf"
+
+                # 在鼠标位置附近显示
+                dirty_regions.append(_draw_text_with_backup(canvas, distance_text, (x + 10, y + 20)))
+                # 也在顶部固定位置显示
+                bar = bar_background.copy()
+                cv2.putText(bar, f"({x - w}, {y}) -> {distance_text}", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7,
+                            (255, 255, 255), 2)
+                canvas[:bar_height] = bar
+                dirty_regions.append(((0, bar_height, 0, w * 2), bar_original))
+
+            cv2.imshow(window_name, canvas)
+
+        # 阻塞等待按键或鼠标事件，期间不占用 CPU
+        key = cv2.waitKey(config.VIEWER_POLL_INTERVAL_MS) & 0xFF
         if key == ord('q') or key == 27:  # 按 'q' 或 'ESC' 退出
             break
 
@@ -184,7 +207,7 @@ def _wait_for_key_or_window_close(window_name):
     """
     [内部辅助函数] 等待用户按键或关闭指定窗口。
     """
-    print(f"Displaying window '{window_name}'. Press any key or close the window to continue.")
+    logger.info("Displaying window '%s'. Press any key or close the window to continue.", window_name)
 
     key_pressed = -1 # 默认值，表示没有有效按键
 
@@ -206,4 +229,29 @@ def _wait_for_key_or_window_close(window_name):
             break
 
     cv2.destroyWindow(window_name)
-    return key_pressed
\ No newline at end of file
+    return key_pressed
+
+def _as_depth_map(depth_source):
+    """[内部辅助函数] 把深度图、三维点矩阵或惰性重建结果统一转换为 HxW 的深度图。"""
+    if hasattr(depth_source, "depth_map"):
+        return depth_source.depth_map()
+    depth_source = np.asarray(depth_source)
+    if depth_source.ndim == 3:
+        return depth_source[:, :, 2]
+    return depth_source
+
+
+def _draw_text_with_backup(canvas, text, origin):
+    """
+    [内部辅助函数] 在画布上绘制白色文字，返回 (文字所在区域, 区域原来的内容)，用于下次重绘前恢复。
+    """
+    font, scale, thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2
+    (text_width, text_height), baseline = cv2.getTextSize(text, font, scale, thickness)
+    x, y = origin
+    height, width = canvas.shape[:2]
+    y0, y1 = max(y - text_height - thickness, 0), min(y + baseline + thickness, height)
+    x0, x1 = max(x - thickness, 0), min(x + text_width + thickness, width)
+    region = (y0, y1, x0, x1)
+    patch = canvas[y0:y1, x0:x1].copy()
+    cv2.putText(canvas, text, origin, font, scale, (255, 255, 255), thickness)
+    return region, patch